@@ -2,12 +2,17 @@ package main
 
 import (
 	"encoding/json"
+	"errors"
 	"fmt"
+	"io"
 	"net/http"
 	"os"
 	"os/exec"
+	"path/filepath"
 	"sketchfab-forecasts/internal/ml"
 	"sketchfab-forecasts/internal/models"
+	"strconv"
+	"strings"
 
 	"github.com/go-chi/chi/v5"
 	"github.com/go-chi/chi/v5/middleware"
@@ -60,13 +65,19 @@ func (s *Server) setupRoutes() {
 	// Health check
 	s.router.Get("/health", s.handleHealth)
 
+	// Метрики сервера прогнозирования для Prometheus (text/plain)
+	s.router.Get("/metrics", s.handleMetrics)
+
 	// API routes
 	s.router.Route("/api", func(r chi.Router) {
 		r.Post("/predict", s.handlePredict)
+		r.Post("/what-if", s.handleWhatIf) // Лучшие изменения модели для роста прогноза
 		r.Get("/stats", s.handleStats)
 		r.Get("/model-info", s.handleModelInfo)
 		r.Get("/eda-charts", s.handleEdaCharts)
-		r.Post("/train", s.handleTrain) // Новый эндпоинт для обучения
+		r.Post("/train", s.handleTrain)     // Новый эндпоинт для обучения
+		r.Get("/shadow", s.handleShadow)    // Теневая оценка модели-кандидата
+		r.Post("/promote", s.handlePromote) // Переключение на кандидата после проверки
 	})
 
 	// Serve static files (EDA charts and other data)
@@ -97,6 +108,13 @@ func (s *Server) handlePredict(w http.ResponseWriter, r *http.Request) {
 
 	// Используем реальную ML модель (расширенную)
 	prediction, err := s.predictor.Predict(req)
+	if errors.Is(err, ml.ErrOverloaded) {
+		// Перегрузка сервера прогнозирования - клиент повторит запрос позже
+		s.logger.Warnf("Prediction rejected: %v", err)
+		w.Header().Set("Retry-After", "1")
+		respondError(w, http.StatusServiceUnavailable, "Prediction service overloaded")
+		return
+	}
 	if err != nil {
 		s.logger.Errorf("Prediction failed: %v", err)
 		// Fallback на mock если модель не обучена
@@ -108,6 +126,42 @@ func (s *Server) handlePredict(w http.ResponseWriter, r *http.Request) {
 	respondJSON(w, http.StatusOK, prediction)
 }
 
+func (s *Server) handleWhatIf(w http.ResponseWriter, r *http.Request) {
+	// Запрос передается в Python как есть: схему проверяет scripts/prediction_schema.py
+	var req json.RawMessage
+
+	if err := json.NewDecoder(r.Body).Decode(&req); err != nil {
+		s.logger.Errorf("Failed to decode request: %v", err)
+		respondError(w, http.StatusBadRequest, "Invalid request body")
+		return
+	}
+
+	topK := 5
+	if value := r.URL.Query().Get("top_k"); value != "" {
+		if n, err := strconv.Atoi(value); err == nil && n > 0 {
+			topK = n
+		}
+	}
+
+	result, err := s.predictor.WhatIf(req, topK)
+	switch {
+	case errors.Is(err, ml.ErrInvalidRequest):
+		// Одинаково для сервера прогнозирования и запуска скрипта
+		respondError(w, http.StatusBadRequest, err.Error())
+		return
+	case errors.Is(err, ml.ErrOverloaded):
+		w.Header().Set("Retry-After", "1")
+		respondError(w, http.StatusServiceUnavailable, "Prediction service overloaded")
+		return
+	case err != nil:
+		s.logger.Errorf("What-if failed: %v", err)
+		respondError(w, http.StatusInternalServerError, "What-if analysis failed")
+		return
+	}
+
+	respondJSON(w, http.StatusOK, result)
+}
+
 func (s *Server) handleStats(w http.ResponseWriter, r *http.Request) {
 	// В реальном приложении здесь бы была загрузка статистики из БД
 	stats := models.Stats{
@@ -629,30 +683,169 @@ func (s *Server) Start(port string) error {
 func (s *Server) handleModelInfo(w http.ResponseWriter, r *http.Request) {
 	// Load model metrics from advanced model
 	type ModelMetrics struct {
-		Trained         bool                   `json:"trained"`
-		TrainingDate    string                 `json:"training_date,omitempty"`
-		RMSE            float64                `json:"rmse,omitempty"`
-		MAE             float64                `json:"mae,omitempty"`
-		R2Score         float64                `json:"r2_score,omitempty"`
-		TrainingSamples int                    `json:"training_samples,omitempty"`
-		ModelType       string                 `json:"model_type,omitempty"`
-		Features        map[string]interface{} `json:"features,omitempty"`
+		Trained         bool                     `json:"trained"`
+		TrainingDate    string                   `json:"training_date,omitempty"`
+		RMSE            float64                  `json:"rmse,omitempty"`
+		MAE             float64                  `json:"mae,omitempty"`
+		R2Score         float64                  `json:"r2_score,omitempty"`
+		TrainingSamples int                      `json:"training_samples,omitempty"`
+		ModelType       string                   `json:"model_type,omitempty"`
+		Version         string                   `json:"version,omitempty"`
+		Candidate       string                   `json:"candidate,omitempty"`
+		Features        map[string]interface{}   `json:"features,omitempty"`
+		TrainingReport  map[string]interface{}   `json:"training_report,omitempty"`
+		TrainingHistory []map[string]interface{} `json:"training_history,omitempty"`
 	}
 
 	metrics := ModelMetrics{Trained: false}
 
-	// Try to load advanced model metrics
-	if data, err := os.ReadFile("models/model_metrics_advanced.json"); err == nil {
+	// Метрики обслуживаемой версии (CURRENT реестра), а не последнего запуска обучения;
+	// без реестра - копия текущей версии в models/ (обновляется только при переключении)
+	metrics.Version = registryPointer("advanced", "CURRENT")
+	metrics.Candidate = registryPointer("advanced", "CANDIDATE")
+	if data, err := os.ReadFile(registryFile("advanced", metrics.Version, "model_metrics_advanced.json")); err == nil {
 		json.Unmarshal(data, &metrics)
 		metrics.Trained = true
 	}
 
+	// Отчет о последнем запуске обучения - только если он относится к обслуживаемой версии
+	if data, err := os.ReadFile("models/training_report_advanced.json"); err == nil {
+		var report map[string]interface{}
+		if json.Unmarshal(data, &report) == nil {
+			if version, _ := report["registry_version"].(string); metrics.Version == "" || version == metrics.Version {
+				metrics.TrainingReport = report
+			}
+		}
+	}
+	metrics.TrainingHistory = loadTrainingHistory("models/training_history.jsonl", 20)
+
 	respondJSON(w, http.StatusOK, metrics)
 }
 
+// registryPointer возвращает версию по указателю реестра (CURRENT, CANDIDATE); пусто - указателя нет
+func registryPointer(name, pointer string) string {
+	data, err := os.ReadFile(filepath.Join("models", "registry", name, pointer))
+	if err != nil {
+		return ""
+	}
+	return strings.TrimSpace(string(data))
+}
+
+// registryFile возвращает путь к файлу версии модели в реестре; без реестра - к файлу в models/
+func registryFile(name, version, filename string) string {
+	if version != "" {
+		path := filepath.Join("models", "registry", name, version, filename)
+		if _, err := os.Stat(path); err == nil {
+			return path
+		}
+	}
+	return filepath.Join("models", filename)
+}
+
+func (s *Server) handleMetrics(w http.ResponseWriter, r *http.Request) {
+	result, err := s.predictor.ServerOp("metrics", nil)
+	if err != nil {
+		s.respondServerError(w, err)
+		return
+	}
+
+	var metrics struct {
+		ContentType string `json:"content_type"`
+		Metrics     string `json:"metrics"`
+	}
+	if err := json.Unmarshal(result, &metrics); err != nil {
+		s.logger.Errorf("Failed to parse metrics response: %v", err)
+		respondError(w, http.StatusBadGateway, "Prediction server operation failed")
+		return
+	}
+	if metrics.ContentType == "" {
+		metrics.ContentType = "text/plain; version=0.0.4"
+	}
+
+	w.Header().Set("Content-Type", metrics.ContentType)
+	w.WriteHeader(http.StatusOK)
+	io.WriteString(w, metrics.Metrics)
+}
+
+func (s *Server) handleShadow(w http.ResponseWriter, r *http.Request) {
+	result, err := s.predictor.ServerOp("shadow", nil)
+	if err != nil {
+		s.respondServerError(w, err)
+		return
+	}
+
+	respondJSON(w, http.StatusOK, result)
+}
+
+func (s *Server) handlePromote(w http.ResponseWriter, r *http.Request) {
+	var req struct {
+		Force bool `json:"force"` // переключить без проверки теневой оценки
+	}
+	// Пустое тело - переключение с проверкой
+	json.NewDecoder(r.Body).Decode(&req)
+
+	result, err := s.predictor.ServerOp("promote", map[string]interface{}{"force": req.Force})
+	if err != nil {
+		s.respondServerError(w, err)
+		return
+	}
+
+	// Проверка не пройдена или кандидата нет - 409 с причинами
+	var decision struct {
+		Promoted map[string]string `json:"promoted"`
+	}
+	status := http.StatusOK
+	if json.Unmarshal(result, &decision) == nil && len(decision.Promoted) == 0 {
+		status = http.StatusConflict
+	}
+	if status == http.StatusOK {
+		s.logger.Infof("Candidate promoted: %v", decision.Promoted)
+	}
+
+	respondJSON(w, status, result)
+}
+
+// respondServerError отвечает на ошибку служебной операции сервера прогнозирования
+func (s *Server) respondServerError(w http.ResponseWriter, err error) {
+	s.logger.Errorf("Prediction server operation failed: %v", err)
+	switch {
+	case errors.Is(err, ml.ErrNoServer):
+		respondError(w, http.StatusServiceUnavailable, "Prediction server is not configured (PREDICTION_SOCKET)")
+	case errors.Is(err, ml.ErrOverloaded):
+		respondError(w, http.StatusServiceUnavailable, "Prediction service overloaded")
+	default:
+		respondError(w, http.StatusBadGateway, "Prediction server operation failed")
+	}
+}
+
+// loadTrainingHistory читает последние limit записей из истории запусков обучения
+func loadTrainingHistory(path string, limit int) []map[string]interface{} {
+	data, err := os.ReadFile(path)
+	if err != nil {
+		return nil
+	}
+
+	history := []map[string]interface{}{}
+	for _, line := range strings.Split(string(data), "\n") {
+		if strings.TrimSpace(line) == "" {
+			continue
+		}
+		var entry map[string]interface{}
+		if err := json.Unmarshal([]byte(line), &entry); err == nil {
+			history = append(history, entry)
+		}
+	}
+
+	if len(history) > limit {
+		history = history[len(history)-limit:]
+	}
+	return history
+}
+
 func (s *Server) handleTrain(w http.ResponseWriter, r *http.Request) {
 	var req struct {
-		Limit int `json:"limit"`
+		Limit  int  `json:"limit"`
+		Shadow bool `json:"shadow"` // новая модель не заменяет текущую, а проходит теневую оценку
 	}
 
 	if err := json.NewDecoder(r.Body).Decode(&req); err == nil && req.Limit > 0 {
@@ -664,12 +857,14 @@ func (s *Server) handleTrain(w http.ResponseWriter, r *http.Request) {
 
 	// Запускаем обучение в фоне
 	go func() {
-		var cmd *exec.Cmd
+		args := []string{"scripts/train_model_advanced.py"}
 		if req.Limit > 0 {
-			cmd = exec.Command("python", "scripts/train_model_advanced.py", fmt.Sprintf("%d", req.Limit))
-		} else {
-			cmd = exec.Command("python", "scripts/train_model_advanced.py")
+			args = append(args, fmt.Sprintf("%d", req.Limit))
+		}
+		if req.Shadow {
+			args = append(args, "--candidate")
 		}
+		cmd := exec.Command("python", args...)
 
 		output, err := cmd.CombinedOutput()
 		if err != nil {
@@ -683,6 +878,7 @@ func (s *Server) handleTrain(w http.ResponseWriter, r *http.Request) {
 		"status":  "started",
 		"message": "Обучение запущено в фоновом режиме",
 		"limit":   req.Limit,
+		"shadow":  req.Shadow,
 	})
 }
 
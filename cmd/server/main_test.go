@@ -0,0 +1,164 @@
+package main
+
+import (
+	"encoding/binary"
+	"io"
+	"net"
+	"net/http"
+	"net/http/httptest"
+	"os"
+	"path/filepath"
+	"strings"
+	"testing"
+
+	"github.com/sirupsen/logrus"
+)
+
+// newTestServer создает сервер, чей сервер прогнозирования (PREDICTION_SOCKET)
+// отвечает на любое сообщение ответом response
+func newTestServer(t *testing.T, response string) *Server {
+	t.Helper()
+
+	// Короткий путь: длина пути Unix сокета ограничена
+	dir, err := os.MkdirTemp("", "srv")
+	if err != nil {
+		t.Fatalf("Failed to create temp dir: %v", err)
+	}
+	socketPath := filepath.Join(dir, "predict.sock")
+	listener, err := net.Listen("unix", socketPath)
+	if err != nil {
+		t.Fatalf("Failed to listen: %v", err)
+	}
+	t.Cleanup(func() {
+		listener.Close()
+		os.RemoveAll(dir)
+	})
+
+	go func() {
+		for {
+			conn, err := listener.Accept()
+			if err != nil {
+				return
+			}
+			go func(conn net.Conn) {
+				defer conn.Close()
+				header := make([]byte, 4)
+				if _, err := io.ReadFull(conn, header); err != nil {
+					return
+				}
+				if _, err := io.CopyN(io.Discard, conn, int64(binary.BigEndian.Uint32(header))); err != nil {
+					return
+				}
+				binary.BigEndian.PutUint32(header, uint32(len(response)))
+				conn.Write(append(header, response...))
+			}(conn)
+		}
+	}()
+
+	t.Setenv("PREDICTION_SOCKET", socketPath)
+	logger := logrus.New()
+	logger.SetOutput(io.Discard)
+	return NewServer(logger)
+}
+
+func TestPredictionServerStatusCodes(t *testing.T) {
+	tests := []struct {
+		name       string
+		response   string
+		method     string
+		path       string
+		body       string
+		wantStatus int
+		retryAfter bool
+	}{
+		{
+			name: "Predict overloaded", response: `{"error":"overloaded"}`,
+			method: http.MethodPost, path: "/api/predict", body: `{"face_count":1000}`,
+			wantStatus: http.StatusServiceUnavailable, retryAfter: true,
+		},
+		{
+			name: "Predict shutting down", response: `{"error":"shutting down"}`,
+			method: http.MethodPost, path: "/api/predict", body: `{"face_count":1000}`,
+			wantStatus: http.StatusServiceUnavailable, retryAfter: true,
+		},
+		{
+			name: "What-if invalid request", response: `{"error":"invalid request: Expected ` + "`int`" + `"}`,
+			method: http.MethodPost, path: "/api/what-if", body: `{"face_count":"many"}`,
+			wantStatus: http.StatusBadRequest,
+		},
+		{
+			name: "What-if overloaded", response: `{"error":"overloaded"}`,
+			method: http.MethodPost, path: "/api/what-if?top_k=3", body: `{"face_count":1000}`,
+			wantStatus: http.StatusServiceUnavailable, retryAfter: true,
+		},
+		{
+			name: "What-if result", response: `{"best":[],"variants":432}`,
+			method: http.MethodPost, path: "/api/what-if", body: `{"face_count":1000}`,
+			wantStatus: http.StatusOK,
+		},
+		{
+			name: "Promote rejected", response: `{"promote":false,"promoted":{},"reasons":["no candidate"]}`,
+			method: http.MethodPost, path: "/api/promote", body: `{}`,
+			wantStatus: http.StatusConflict,
+		},
+		{
+			name: "Promote done", response: `{"promote":true,"promoted":{"advanced":"abc"}}`,
+			method: http.MethodPost, path: "/api/promote", body: `{"force":true}`,
+			wantStatus: http.StatusOK,
+		},
+		{
+			name: "Shadow overloaded", response: `{"error":"overloaded"}`,
+			method: http.MethodGet, path: "/api/shadow",
+			wantStatus: http.StatusServiceUnavailable,
+		},
+	}
+
+	for _, tt := range tests {
+		t.Run(tt.name, func(t *testing.T) {
+			server := newTestServer(t, tt.response)
+			recorder := httptest.NewRecorder()
+			request := httptest.NewRequest(tt.method, tt.path, strings.NewReader(tt.body))
+
+			server.router.ServeHTTP(recorder, request)
+
+			if recorder.Code != tt.wantStatus {
+				t.Fatalf("Status %d, expected %d (body: %s)", recorder.Code, tt.wantStatus, recorder.Body.String())
+			}
+			if tt.retryAfter && recorder.Header().Get("Retry-After") == "" {
+				t.Error("Retry-After header should be set")
+			}
+		})
+	}
+}
+
+func TestMetricsEndpoint(t *testing.T) {
+	server := newTestServer(t,
+		`{"content_type":"text/plain; version=0.0.4","metrics":"sketchfab_prediction_requests_total 7\n"}`)
+	recorder := httptest.NewRecorder()
+
+	server.router.ServeHTTP(recorder, httptest.NewRequest(http.MethodGet, "/metrics", nil))
+
+	if recorder.Code != http.StatusOK {
+		t.Fatalf("Status %d, expected 200", recorder.Code)
+	}
+	if contentType := recorder.Header().Get("Content-Type"); contentType != "text/plain; version=0.0.4" {
+		t.Errorf("Content-Type %q, expected Prometheus text format", contentType)
+	}
+	if body := recorder.Body.String(); body != "sketchfab_prediction_requests_total 7\n" {
+		t.Errorf("Unexpected body %q", body)
+	}
+}
+
+func TestMetricsWithoutPredictionServer(t *testing.T) {
+	t.Setenv("PREDICTION_SOCKET", "")
+	logger := logrus.New()
+	logger.SetOutput(io.Discard)
+	server := NewServer(logger)
+	recorder := httptest.NewRecorder()
+
+	server.router.ServeHTTP(recorder, httptest.NewRequest(http.MethodGet, "/metrics", nil))
+
+	if recorder.Code != http.StatusServiceUnavailable {
+		t.Fatalf("Status %d, expected 503", recorder.Code)
+	}
+}
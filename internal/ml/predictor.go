@@ -1,24 +1,44 @@
 package ml
 
 import (
+	"encoding/binary"
 	"encoding/json"
+	"errors"
 	"fmt"
+	"io"
+	"net"
+	"os"
 	"os/exec"
 	"sketchfab-forecasts/internal/models"
 	"strings"
+	"time"
 
 	"github.com/sirupsen/logrus"
 )
 
+// ErrOverloaded сервер прогнозирования отклонил запрос: очередь переполнена или сервер останавливается.
+// Запасной путь через скрипты при этом не используется - перегрузка передается клиенту.
+var ErrOverloaded = errors.New("prediction server overloaded")
+
+// ErrInvalidRequest запрос не прошел проверку схемы (scripts/prediction_schema.py)
+var ErrInvalidRequest = errors.New("invalid request")
+
+// ErrNoServer служебные операции требуют долгоживущего сервера прогнозирования (PREDICTION_SOCKET)
+var ErrNoServer = errors.New("prediction server is not configured")
+
 // Predictor интерфейс для прогнозирования
 type Predictor struct {
 	logger *logrus.Logger
+
+	// socketPath путь к Unix сокету scripts/prediction_server.py (пусто - запуск скриптов)
+	socketPath string
 }
 
 // NewPredictor создает новый предиктор
 func NewPredictor(logger *logrus.Logger) *Predictor {
 	return &Predictor{
-		logger: logger,
+		logger:     logger,
+		socketPath: os.Getenv("PREDICTION_SOCKET"),
 	}
 }
 
@@ -30,6 +50,21 @@ func (p *Predictor) Predict(req models.PredictionRequest) (*models.PredictionRes
 		return nil, fmt.Errorf("failed to marshal request: %w", err)
 	}
 
+	// Долгоживущий Python сервер, если настроен
+	if p.socketPath != "" {
+		output, err := p.predictViaSocket(inputData)
+		if errors.Is(err, ErrOverloaded) {
+			return nil, err
+		}
+		if err == nil {
+			var response models.PredictionResponse
+			if err = json.Unmarshal(output, &response); err == nil {
+				return &response, nil
+			}
+		}
+		p.logger.Warnf("Prediction server unavailable, falling back to scripts: %v", err)
+	}
+
 	// Используем расширенный скрипт predict_advanced.py
 	scriptPath := "scripts/predict_advanced.py"
 
@@ -44,7 +79,8 @@ func (p *Predictor) Predict(req models.PredictionRequest) (*models.PredictionRes
 	if err != nil {
 		p.logger.Warnf("Advanced script failed: %v, output: %s", err, string(output))
 		// Fallback на стандартный скрипт
-		cmd = exec.Command("python", "scripts/predict.py", string(inputData))
+		cmd = exec.Command("python", "scripts/predict.py")
+		cmd.Stdin = strings.NewReader(string(inputData))
 		output, err = cmd.CombinedOutput()
 		if err != nil {
 			p.logger.Errorf("Standard script also failed: %v", err)
@@ -62,6 +98,104 @@ func (p *Predictor) Predict(req models.PredictionRequest) (*models.PredictionRes
 	return &response, nil
 }
 
+// WhatIf возвращает лучшие изменения модели для роста прогноза (scripts/what_if.py).
+// Все варианты сетки прогнозируются в Python одним пакетом.
+func (p *Predictor) WhatIf(req json.RawMessage, topK int) (json.RawMessage, error) {
+	// Долгоживущий Python сервер, если настроен
+	if p.socketPath != "" {
+		message, err := json.Marshal(struct {
+			Op   string          `json:"op"`
+			Data json.RawMessage `json:"data"`
+			TopK int             `json:"top_k"`
+		}{Op: "what_if", Data: req, TopK: topK})
+		if err != nil {
+			return nil, fmt.Errorf("failed to marshal request: %w", err)
+		}
+		output, err := p.predictViaSocket(message)
+		if err == nil || errors.Is(err, ErrInvalidRequest) || errors.Is(err, ErrOverloaded) {
+			return output, err
+		}
+		p.logger.Warnf("Prediction server unavailable, falling back to scripts: %v", err)
+	}
+
+	cmd := exec.Command("python", "scripts/what_if.py", "--top-k", fmt.Sprintf("%d", topK))
+	cmd.Stdin = strings.NewReader(string(req))
+
+	// Только stdout: предупреждения Python в stderr не должны портить JSON
+	output, err := cmd.Output()
+	// Ошибка в ответе скрипта (код выхода 1) - та же, что ответил бы сервер
+	if respErr := responseError(output); respErr != nil {
+		return nil, respErr
+	}
+	if err != nil {
+		return nil, fmt.Errorf("what-if failed: %w, output: %s", err, string(output))
+	}
+	return output, nil
+}
+
+// ServerOp отправляет служебную операцию prediction_server.py ({"op": op, ...params})
+func (p *Predictor) ServerOp(op string, params map[string]interface{}) (json.RawMessage, error) {
+	if p.socketPath == "" {
+		return nil, ErrNoServer
+	}
+
+	message := map[string]interface{}{"op": op}
+	for key, value := range params {
+		message[key] = value
+	}
+	data, err := json.Marshal(message)
+	if err != nil {
+		return nil, fmt.Errorf("failed to marshal request: %w", err)
+	}
+	return p.predictViaSocket(data)
+}
+
+// predictViaSocket отправляет запрос в prediction_server.py (JSON с префиксом длины)
+func (p *Predictor) predictViaSocket(inputData []byte) ([]byte, error) {
+	conn, err := net.DialTimeout("unix", p.socketPath, time.Second)
+	if err != nil {
+		return nil, fmt.Errorf("failed to connect: %w", err)
+	}
+	defer conn.Close()
+	conn.SetDeadline(time.Now().Add(30 * time.Second))
+
+	header := make([]byte, 4)
+	binary.BigEndian.PutUint32(header, uint32(len(inputData)))
+	if _, err := conn.Write(append(header, inputData...)); err != nil {
+		return nil, fmt.Errorf("failed to send request: %w", err)
+	}
+
+	if _, err := io.ReadFull(conn, header); err != nil {
+		return nil, fmt.Errorf("failed to read response: %w", err)
+	}
+	output := make([]byte, binary.BigEndian.Uint32(header))
+	if _, err := io.ReadFull(conn, output); err != nil {
+		return nil, fmt.Errorf("failed to read response: %w", err)
+	}
+
+	if err := responseError(output); err != nil {
+		return nil, err
+	}
+	return output, nil
+}
+
+// responseError возвращает ошибку из ответа Python ({"error": ...}); nil - ответ без ошибки
+func responseError(output []byte) error {
+	var status struct {
+		Error string `json:"error"`
+	}
+	if err := json.Unmarshal(output, &status); err != nil || status.Error == "" {
+		return nil
+	}
+	switch {
+	case status.Error == "overloaded" || status.Error == "shutting down":
+		return fmt.Errorf("%w: %s", ErrOverloaded, status.Error)
+	case strings.HasPrefix(status.Error, "invalid request"):
+		return fmt.Errorf("%w: %s", ErrInvalidRequest, strings.TrimPrefix(status.Error, "invalid request: "))
+	}
+	return fmt.Errorf("prediction error: %s", status.Error)
+}
+
 // categorizePopularity категоризирует показатель популярности
 func categorizePopularity(score float64) string {
 	if score < 2.0 {
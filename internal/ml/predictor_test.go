@@ -1,7 +1,15 @@
 package ml
 
 import (
+	"encoding/binary"
+	"encoding/json"
+	"errors"
+	"io"
+	"net"
+	"os"
+	"path/filepath"
 	"sketchfab-forecasts/internal/models"
+	"strings"
 	"testing"
 
 	"github.com/sirupsen/logrus"
@@ -104,3 +112,230 @@ func TestCategorizePopularity(t *testing.T) {
 		}
 	}
 }
+
+// fakePredictionServer отвечает на одно сообщение ответом response по протоколу
+// scripts/prediction_server.py (JSON с префиксом длины) и передает полученное сообщение в канал
+func fakePredictionServer(t *testing.T, response string) (string, <-chan []byte) {
+	t.Helper()
+
+	// Короткий путь: длина пути Unix сокета ограничена
+	dir, err := os.MkdirTemp("", "ml")
+	if err != nil {
+		t.Fatalf("Failed to create temp dir: %v", err)
+	}
+	socketPath := filepath.Join(dir, "predict.sock")
+	listener, err := net.Listen("unix", socketPath)
+	if err != nil {
+		t.Fatalf("Failed to listen: %v", err)
+	}
+	t.Cleanup(func() {
+		listener.Close()
+		os.RemoveAll(dir)
+	})
+
+	received := make(chan []byte, 1)
+	go func() {
+		conn, err := listener.Accept()
+		if err != nil {
+			return
+		}
+		defer conn.Close()
+
+		header := make([]byte, 4)
+		if _, err := io.ReadFull(conn, header); err != nil {
+			return
+		}
+		payload := make([]byte, binary.BigEndian.Uint32(header))
+		if _, err := io.ReadFull(conn, payload); err != nil {
+			return
+		}
+		received <- payload
+
+		binary.BigEndian.PutUint32(header, uint32(len(response)))
+		conn.Write(append(header, response...))
+	}()
+
+	return socketPath, received
+}
+
+func newSocketPredictor(socketPath string) *Predictor {
+	return &Predictor{logger: logrus.New(), socketPath: socketPath}
+}
+
+func TestPredictViaSocket(t *testing.T) {
+	tests := []struct {
+		name     string
+		response string
+		wantErr  error
+		anyErr   bool
+		errText  string
+	}{
+		{name: "Prediction", response: `{"popularity_score":4.2,"popularity_category":"medium"}`},
+		{name: "Batch", response: `[{"popularity_score":1.0},{"error":"prediction failed: boom"}]`},
+		{name: "Overloaded", response: `{"error":"overloaded"}`, wantErr: ErrOverloaded},
+		{name: "Shutting down", response: `{"error":"shutting down"}`, wantErr: ErrOverloaded},
+		{
+			name:     "Invalid request",
+			response: `{"error":"invalid request: Expected ` + "`int`" + `, got ` + "`str`" + `"}`,
+			wantErr:  ErrInvalidRequest,
+			errText:  "Expected `int`",
+		},
+		{name: "Prediction failed", response: `{"error":"prediction failed: boom"}`, anyErr: true, errText: "boom"},
+	}
+
+	for _, tt := range tests {
+		t.Run(tt.name, func(t *testing.T) {
+			socketPath, received := fakePredictionServer(t, tt.response)
+			predictor := newSocketPredictor(socketPath)
+
+			request := []byte(`{"face_count":1000}`)
+			output, err := predictor.predictViaSocket(request)
+
+			// Сообщение передано целиком, префикс длины снят сервером
+			if got := string(<-received); got != string(request) {
+				t.Errorf("Server received %q, expected %q", got, request)
+			}
+
+			switch {
+			case tt.wantErr != nil:
+				if !errors.Is(err, tt.wantErr) {
+					t.Fatalf("Expected %v, got %v", tt.wantErr, err)
+				}
+			case tt.anyErr:
+				if err == nil || errors.Is(err, ErrOverloaded) || errors.Is(err, ErrInvalidRequest) {
+					t.Fatalf("Expected a generic prediction error, got %v", err)
+				}
+			default:
+				if err != nil {
+					t.Fatalf("Unexpected error: %v", err)
+				}
+				if string(output) != tt.response {
+					t.Errorf("Output %q, expected %q", output, tt.response)
+				}
+			}
+			if tt.errText != "" && !strings.Contains(err.Error(), tt.errText) {
+				t.Errorf("Error %q should contain %q", err, tt.errText)
+			}
+		})
+	}
+}
+
+func TestPredictViaSocketNoServer(t *testing.T) {
+	predictor := newSocketPredictor(filepath.Join(t.TempDir(), "missing.sock"))
+
+	if _, err := predictor.predictViaSocket([]byte(`{}`)); err == nil {
+		t.Fatal("Expected connection error")
+	}
+}
+
+func TestResponseError(t *testing.T) {
+	tests := []struct {
+		name    string
+		output  string
+		wantErr error
+		isNil   bool
+	}{
+		{name: "Result", output: `{"popularity_score":3.1}`, isNil: true},
+		{name: "Array", output: `[{"error":"overloaded"}]`, isNil: true},
+		{name: "Not JSON", output: "metric 1\n", isNil: true},
+		{name: "Empty error", output: `{"error":""}`, isNil: true},
+		{name: "Overloaded", output: `{"error":"overloaded"}`, wantErr: ErrOverloaded},
+		{name: "Invalid request", output: `{"error":"invalid request: top_k must be a positive integer"}`, wantErr: ErrInvalidRequest},
+		{name: "Other", output: `{"error":"No models available"}`},
+	}
+
+	for _, tt := range tests {
+		t.Run(tt.name, func(t *testing.T) {
+			err := responseError([]byte(tt.output))
+			if tt.isNil {
+				if err != nil {
+					t.Fatalf("Expected nil, got %v", err)
+				}
+				return
+			}
+			if err == nil {
+				t.Fatal("Expected error")
+			}
+			if tt.wantErr != nil && !errors.Is(err, tt.wantErr) {
+				t.Errorf("Expected %v, got %v", tt.wantErr, err)
+			}
+			if tt.wantErr == nil && (errors.Is(err, ErrOverloaded) || errors.Is(err, ErrInvalidRequest)) {
+				t.Errorf("Unexpected sentinel error: %v", err)
+			}
+		})
+	}
+}
+
+func TestPredictOverloadedSkipsFallback(t *testing.T) {
+	socketPath, received := fakePredictionServer(t, `{"error":"overloaded"}`)
+	predictor := newSocketPredictor(socketPath)
+
+	_, err := predictor.Predict(models.PredictionRequest{FaceCount: 1000, TagCount: 5})
+	if !errors.Is(err, ErrOverloaded) {
+		t.Fatalf("Expected ErrOverloaded, got %v", err)
+	}
+
+	var request map[string]interface{}
+	if err := json.Unmarshal(<-received, &request); err != nil {
+		t.Fatalf("Server received invalid JSON: %v", err)
+	}
+}
+
+func TestWhatIfServerErrors(t *testing.T) {
+	tests := []struct {
+		name     string
+		response string
+		wantErr  error
+	}{
+		{"Overloaded", `{"error":"overloaded"}`, ErrOverloaded},
+		{"Invalid request", `{"error":"invalid request: what-if accepts a single request object"}`, ErrInvalidRequest},
+	}
+
+	for _, tt := range tests {
+		t.Run(tt.name, func(t *testing.T) {
+			socketPath, received := fakePredictionServer(t, tt.response)
+			predictor := newSocketPredictor(socketPath)
+
+			// Ошибка сервера возвращается как есть, без запуска scripts/what_if.py
+			_, err := predictor.WhatIf(json.RawMessage(`{"face_count":1000}`), 3)
+			if !errors.Is(err, tt.wantErr) {
+				t.Fatalf("Expected %v, got %v", tt.wantErr, err)
+			}
+
+			var message struct {
+				Op   string          `json:"op"`
+				Data json.RawMessage `json:"data"`
+				TopK int             `json:"top_k"`
+			}
+			if err := json.Unmarshal(<-received, &message); err != nil {
+				t.Fatalf("Server received invalid JSON: %v", err)
+			}
+			if message.Op != "what_if" || message.TopK != 3 || string(message.Data) != `{"face_count":1000}` {
+				t.Errorf("Unexpected message: %+v", message)
+			}
+		})
+	}
+}
+
+func TestServerOp(t *testing.T) {
+	if _, err := newSocketPredictor("").ServerOp("shadow", nil); !errors.Is(err, ErrNoServer) {
+		t.Fatalf("Expected ErrNoServer, got %v", err)
+	}
+
+	socketPath, received := fakePredictionServer(t, `{"promoted":{"advanced":"abc"}}`)
+	output, err := newSocketPredictor(socketPath).ServerOp("promote", map[string]interface{}{"force": true})
+	if err != nil {
+		t.Fatalf("Unexpected error: %v", err)
+	}
+	if string(output) != `{"promoted":{"advanced":"abc"}}` {
+		t.Errorf("Unexpected output: %s", output)
+	}
+
+	var message map[string]interface{}
+	if err := json.Unmarshal(<-received, &message); err != nil {
+		t.Fatalf("Server received invalid JSON: %v", err)
+	}
+	if message["op"] != "promote" || message["force"] != true {
+		t.Errorf("Unexpected message: %v", message)
+	}
+}
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Адаптивный планировщик micro-batching для онлайн прогнозов
+
+Собирает параллельные запросы в пакет (до max_batch штук или до истечения
+окна ожидания), обрабатывает пакет одним вызовом и раздает результаты.
+Окно ожидания подстраивается под целевую задержку (latency SLO):
+- p95 задержки выше SLO - окно уменьшается вдвое
+- есть параллельные запросы и запас по задержке - окно растет
+- запросы приходят по одному - окно сбрасывается (ожидание бесполезно)
+"""
+
+import asyncio
+import time
+from collections import deque
+
+
+def percentile(values, q):
+    """Перцентиль q (0-100) по списку значений"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, int(round(q / 100.0 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+class AdaptiveBatcher:
+    """Очередь с пакетной обработкой и автоподстройкой окна ожидания"""
+
+    def __init__(self, process_batch, max_batch=32, max_queue=256,
+                 latency_slo_ms=50.0, max_wait_ms=10.0, initial_wait_ms=2.0,
+                 wait_step_ms=0.5, adapt_every=16, history=256, concurrency=1):
+        """
+        Args:
+            process_batch: синхронная функция list -> list результатов того же размера
+            max_batch: максимальный размер пакета
+            max_queue: емкость очереди (при переполнении enqueue бросает asyncio.QueueFull)
+            latency_slo_ms: целевой p95 задержки запроса (ожидание + обработка)
+            max_wait_ms: верхняя граница окна ожидания
+            initial_wait_ms: начальное окно ожидания
+            wait_step_ms: шаг увеличения окна
+            adapt_every: пересчет окна каждые N обработанных запросов
+            history: сколько последних задержек учитывать
+            concurrency: сколько пакетов может обрабатываться одновременно
+                (например, по числу процессов в PredictionPool)
+        """
+        self.process_batch = process_batch
+        self.max_batch = max_batch
+        self.latency_slo = latency_slo_ms / 1000.0
+        self.max_wait = max_wait_ms / 1000.0
+        self.wait = min(initial_wait_ms / 1000.0, self.max_wait)
+        self.wait_step = wait_step_ms / 1000.0
+        self.adapt_every = adapt_every
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.latencies = deque(maxlen=history)
+        self.batch_sizes = deque(maxlen=max(1, history // 8))
+        self.stats = {'batches': 0, 'items': 0, 'errors': 0}
+        self.concurrency = concurrency
+        self._slots = asyncio.Semaphore(concurrency)
+        self._tasks = set()
+        self._since_adapt = 0
+        self._worker = None
+
+    def start(self):
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Дожидается обработки принятых запросов и останавливает обработчик"""
+        await self.queue.join()
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    def enqueue(self, item):
+        """Постановка в очередь; возвращает future с результатом (или asyncio.QueueFull)"""
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((item, future, time.perf_counter()))
+        return future
+
+    async def submit(self, item):
+        """Постановка в очередь и ожидание результата"""
+        return await self.enqueue(item)
+
+    def snapshot(self):
+        """Текущее состояние планировщика"""
+        latencies = list(self.latencies)
+        batches = self.stats['batches']
+        return {
+            'queue_depth': self.queue.qsize(),
+            'queue_capacity': self.queue.maxsize,
+            'max_batch': self.max_batch,
+            'concurrency': self.concurrency,
+            'batches_in_flight': len(self._tasks),
+            'batch_wait_ms': round(self.wait * 1000.0, 3),
+            'latency_slo_ms': round(self.latency_slo * 1000.0, 3),
+            'latency_p50_ms': round(percentile(latencies, 50) * 1000.0, 3),
+            'latency_p95_ms': round(percentile(latencies, 95) * 1000.0, 3),
+            'avg_batch_size': round(self.stats['items'] / batches, 3) if batches else 0.0,
+            'batches': batches,
+            'items': self.stats['items'],
+            'errors': self.stats['errors']
+        }
+
+    async def _collect(self):
+        """Первый запрос ждем без ограничения, остальные - не дольше окна"""
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.wait
+        while len(batch) < self.max_batch:
+            # Уже ожидающие запросы забираем без задержки
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            # Пока все слоты заняты, запросы копятся в очереди и следующий пакет будет больше
+            await self._slots.acquire()
+            try:
+                batch = await self._collect()
+            except asyncio.CancelledError:
+                self._slots.release()
+                raise
+            task = asyncio.create_task(self._process(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _process(self, batch):
+        loop = asyncio.get_running_loop()
+        items = [item for item, _, _ in batch]
+        try:
+            # Обработка вне event loop, чтобы прием запросов не блокировался
+            results = await loop.run_in_executor(None, self.process_batch, items)
+        except Exception as e:
+            self.stats['errors'] += 1
+            results = [{'error': str(e)}] * len(batch)
+        finally:
+            self._slots.release()
+
+        done_at = time.perf_counter()
+        for (_, future, enqueued_at), result in zip(batch, results):
+            self.latencies.append(done_at - enqueued_at)
+            if not future.done():
+                future.set_result(result)
+            self.queue.task_done()
+
+        self.stats['batches'] += 1
+        self.stats['items'] += len(batch)
+        self.batch_sizes.append(len(batch))
+        self._since_adapt += len(batch)
+        if self._since_adapt >= self.adapt_every:
+            self._since_adapt = 0
+            self._adapt()
+
+    def _adapt(self):
+        """Подстройка окна ожидания под SLO"""
+        p95 = percentile(list(self.latencies), 95)
+        avg_batch = sum(self.batch_sizes) / len(self.batch_sizes)
+        if p95 > self.latency_slo:
+            self.wait /= 2.0
+        elif avg_batch <= 1.05:
+            # Запросы не пересекаются во времени - ожидание только добавляет задержку
+            self.wait = 0.0
+        elif p95 < 0.5 * self.latency_slo and avg_batch < self.max_batch:
+            self.wait = min(self.wait + self.wait_step, self.max_wait)
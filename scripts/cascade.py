@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Каскад моделей: сначала быстрая модель-ученик, расширенная - только при необходимости
+
+Для категории популярности (low/medium/high, границы 5 и 8) точное значение
+важно только рядом с границами. Ученик (distillation.py) повторяет
+расширенную модель с ошибкой, распределение которой калибруется на
+отложенной выборке (конформные остатки прогноз учителя - прогноз ученика,
+prediction_intervals.py). Если интервал [ученик + q_low, ученик + q_high]
+целиком лежит внутри одной категории, ответ ученика принимается; если
+интервал пересекает границу - запрос передается расширенной модели.
+Покрытие интервала (по умолчанию 98%) ограничивает долю запросов, у
+которых каскад меняет категорию относительно расширенной модели.
+
+Путь запроса зависит только от самого запроса и моделей, но не от того,
+с какими запросами он попал в один пакет: одинаковые запросы получают
+одинаковый ответ и под нагрузкой. Каскад выгоден для одиночных запросов и
+маленьких пакетов: ученик считает текст построчно, а расширенная модель
+обрабатывает пакет векторно, и в больших пакетах каскад дороже прямого
+вызова расширенной модели. Пакетные задачи, которым важна пропускная
+способность (score_catalog.py), отключают каскад в самих запросах
+(cascade: false), серверу под постоянной нагрузкой - PREDICT_CASCADE=0.
+"""
+
+import numpy as np
+
+from prediction_intervals import ConformalIntervals
+
+# Покрытие интервала ошибки ученика относительно учителя
+CASCADE_COVERAGE = 0.98
+
+
+def category_index(scores, thresholds):
+    """Номер категории популярности (0 - low, 1 - medium, 2 - high), как categorize_score"""
+    return np.searchsorted(np.asarray(thresholds, dtype=np.float64), np.asarray(scores, dtype=np.float64),
+                           side='right')
+
+
+def fit_cascade_bound(teacher_predictions, student_predictions, coverage=CASCADE_COVERAGE):
+    """Калибровка ошибки ученика относительно учителя на отложенной выборке"""
+    return ConformalIntervals(coverage=coverage).fit(teacher_predictions, student_predictions)
+
+
+def cascade_accepts(bound, student_predictions, thresholds):
+    """Маска запросов, для которых прогноз ученика принимается без расширенной модели"""
+    lower, upper = bound.interval(student_predictions)
+    return category_index(lower, thresholds) == category_index(upper, thresholds)
+
+
+def evaluate_cascade(bound, teacher_predictions, student_predictions, thresholds, latency_ms=None):
+    """
+    Качество каскада на выборке, не участвовавшей в калибровке
+
+    Returns:
+        доля переданных расширенной модели запросов, совпадение категорий
+        с расширенной моделью и (при latency_ms) ожидаемая задержка
+    """
+    teacher_predictions = np.asarray(teacher_predictions, dtype=np.float64)
+    student_predictions = np.asarray(student_predictions, dtype=np.float64)
+    accepted = cascade_accepts(bound, student_predictions, thresholds)
+    cascaded = np.where(accepted, student_predictions, teacher_predictions)
+    teacher_categories = category_index(teacher_predictions, thresholds)
+    metrics = {
+        'coverage': bound.coverage,
+        'n': int(len(accepted)),
+        'escalation_rate': float(1.0 - accepted.mean()),
+        'category_agreement': float(np.mean(category_index(cascaded, thresholds) == teacher_categories)),
+        'student_category_agreement': float(np.mean(
+            category_index(student_predictions, thresholds) == teacher_categories
+        ))
+    }
+    if latency_ms is not None:
+        # Запрос, переданный дальше, платит и за ученика, и за учителя
+        metrics['expected_latency_ms'] = float(
+            latency_ms['student'] + metrics['escalation_rate'] * latency_ms['teacher']
+        )
+    return metrics
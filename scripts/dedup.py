@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Удаление дубликатов каталога перед обучением
+
+Скрапер возвращает одну и ту же модель на разных страницах и в разных
+запусках, а модели из одного набора ассетов имеют почти одинаковые
+описания. Дубликаты увеличивают время обучения и попадают одновременно
+в обучающую и тестовую выборки, завышая метрики.
+
+Три проверки (остается первая встреченная запись):
+- точные дубликаты по uid;
+- точные дубликаты по хешу содержимого (текст, полигоны, анимации);
+- почти дубликаты: MinHash по словесным шинглам объединенного текста
+  (теги, описание, категории) и LSH по полосам сигнатуры - сравниваются
+  только записи с общей корзиной хотя бы в одной полосе.
+"""
+
+import hashlib
+import json
+
+import numpy as np
+from sklearn.utils import murmurhash3_32
+
+from text_cache import clean_text
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def record_text(record):
+    """Объединенный очищенный текст записи (как prepare_advanced_features)"""
+    tags = record.get('tags', [])
+    categories = record.get('categories', [])
+    tags_text = ' '.join(str(tag) for tag in tags) if isinstance(tags, list) else ''
+    categories_text = ' '.join(str(cat) for cat in categories) if isinstance(categories, list) else ''
+    return clean_text(f"{tags_text} {record.get('description') or ''} {categories_text}")
+
+
+def content_hash(record, text=None):
+    """Хеш содержимого записи без uid и названия"""
+    payload = json.dumps([
+        record_text(record) if text is None else text,
+        record.get('faceCount', 0), record.get('vertexCount', 0), record.get('animationCount', 0)
+    ])
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).digest()
+
+
+def shingles(text, size=3):
+    """Словесные шинглы по size слов (короткий текст - одним шинглом)"""
+    words = text.split()
+    if len(words) <= size:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+class MinHashLSH:
+    """MinHash сигнатуры и LSH индекс по полосам"""
+
+    def __init__(self, num_perm=64, bands=8, seed=42):
+        if num_perm % bands:
+            raise ValueError("num_perm должно делиться на bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, _MAX_HASH, size=num_perm, dtype=np.uint64)[:, None]
+        self.b = rng.randint(0, _MAX_HASH, size=num_perm, dtype=np.uint64)[:, None]
+        self.buckets = {}
+        # Сигнатуры индекса построчно (емкость удваивается по мере заполнения)
+        self.signatures = np.empty((1024, num_perm), dtype=np.uint64)
+        self.size = 0
+
+    def signature(self, shingle_set):
+        hashes = np.fromiter(
+            (murmurhash3_32(shingle, positive=True) for shingle in shingle_set),
+            dtype=np.uint64, count=len(shingle_set)
+        )
+        # a, b, x < 2^32 - произведение не переполняет uint64
+        permuted = (self.a * hashes[None, :] + self.b) % np.uint64(_MERSENNE_PRIME) & np.uint64(_MAX_HASH)
+        return permuted.min(axis=1)
+
+    def _band_keys(self, signature):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def query(self, signature, threshold):
+        """Лучший кандидат из индекса с оценкой сходства >= threshold: (номер, сходство) или None"""
+        candidates = set()
+        for key in self._band_keys(signature):
+            candidates.update(self.buckets.get(key, ()))
+        if not candidates:
+            return None
+        candidates = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        similarity = (self.signatures[candidates] == signature).mean(axis=1)
+        best = int(np.argmax(similarity))
+        if similarity[best] < threshold:
+            return None
+        return int(candidates[best]), float(similarity[best])
+
+    def add(self, signature):
+        """Добавление сигнатуры в индекс; возвращает ее номер"""
+        position = self.size
+        if position == len(self.signatures):
+            self.signatures = np.concatenate([self.signatures, np.empty_like(self.signatures)])
+        self.signatures[position] = signature
+        self.size += 1
+        for key in self._band_keys(signature):
+            self.buckets.setdefault(key, []).append(position)
+        return position
+
+
+def deduplicate(records, threshold=0.9, num_perm=64, bands=8, min_shingles=5, max_examples=20):
+    """
+    Удаление точных и почти дубликатов
+
+    Args:
+        threshold: минимальное оценочное сходство Жаккара для почти дубликатов
+        min_shingles: тексты с меньшим числом шинглов проверяются только на точное совпадение
+            (короткие одинаковые тексты еще не означают одну и ту же модель)
+
+    Returns:
+        (записи без дубликатов, отчет)
+    """
+    seen_uids = set()
+    seen_content = {}
+    lsh = MinHashLSH(num_perm, bands)
+    indexed_uids = []
+    kept = []
+    counts = {'uid': 0, 'content': 0, 'near': 0}
+    examples = []
+
+    def note(kind, record, duplicate_of, similarity=1.0):
+        counts[kind] += 1
+        if len(examples) < max_examples:
+            examples.append({'kind': kind, 'uid': record.get('uid'), 'duplicate_of': duplicate_of,
+                             'similarity': round(similarity, 4)})
+
+    for record in records:
+        uid = record.get('uid')
+        if uid and uid in seen_uids:
+            note('uid', record, uid)
+            continue
+
+        text = record_text(record)
+        digest = content_hash(record, text)
+        if digest in seen_content:
+            note('content', record, seen_content[digest])
+            continue
+
+        shingle_set = shingles(text)
+        signature = lsh.signature(shingle_set) if len(shingle_set) >= min_shingles else None
+        if signature is not None:
+            match = lsh.query(signature, threshold)
+            if match is not None:
+                note('near', record, indexed_uids[match[0]], match[1])
+                continue
+            lsh.add(signature)
+            indexed_uids.append(uid)
+
+        if uid:
+            seen_uids.add(uid)
+        seen_content[digest] = uid
+        kept.append(record)
+
+    n_input = len(kept) + sum(counts.values())
+    report = {
+        'input_records': n_input,
+        'kept_records': len(kept),
+        'removed': dict(counts, total=sum(counts.values())),
+        'removed_fraction': round(sum(counts.values()) / n_input, 4) if n_input else 0.0,
+        'threshold': threshold,
+        'num_perm': num_perm,
+        'bands': bands,
+        'examples': examples
+    }
+    return kept, report
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Дистилляция расширенной модели в быструю модель-ученика
+
+Учитель - градиентный бустинг над TF-IDF, multi-hot тегов и численными
+признаками. Ученик - гребневая регрессия над хешированными признаками
+(без словарей и плотных матриц), обучаемая на прогнозах учителя:
+- численные: log1p + стандартизация и квантильные интервалы (one-hot),
+  чтобы линейная модель повторяла нелинейные зависимости учителя
+- текст: хеширование слов и биграмм (как HashingVectorizer)
+- теги/категории: хеширование токенов record_tokens (как FeatureHasher)
+
+Обучение идет через sklearn-хешеры, а прогноз считается напрямую по
+весам модели (сумма весов хешированных токенов) - без построения
+разреженных матриц и проверок sklearn, что важно для одиночных запросов.
+"""
+
+import time
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction import FeatureHasher
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import Ridge
+from sklearn.utils import murmurhash3_32
+
+from tag_vocabulary import record_tokens
+
+
+def _hash_index(token, n_features):
+    """Индекс признака для токена (та же схема, что у sklearn хешеров)"""
+    return abs(murmurhash3_32(token, seed=0)) % n_features
+
+
+class StudentModel:
+    """Линейная модель над хешированными и дискретизированными признаками"""
+
+    def __init__(self, numeric_features, text_features=2 ** 16, tag_features=2 ** 12,
+                 n_bins=32, alpha=3.0):
+        self.numeric_features = list(numeric_features)
+        self.text_features = text_features
+        self.tag_features = tag_features
+        self.n_bins = n_bins
+        self.alpha = alpha
+        self.text_hasher = HashingVectorizer(
+            n_features=text_features, ngram_range=(1, 2), alternate_sign=False, norm='l2'
+        )
+        self.mean = None
+        self.scale = None
+        self.bin_edges = None
+        self.bin_offsets = None
+        self.intercept = 0.0
+        self.numeric_weights = None
+        self.bin_weights = None
+        self.text_weights = None
+        self.tag_weights = None
+        self._analyzer = None
+
+    def _log_numeric(self, X_numeric):
+        return np.log1p(np.maximum(np.asarray(X_numeric, dtype=np.float64), 0.0))
+
+    def _bin_indices(self, X_log):
+        """Номера квантильных интервалов (со смещением по признакам)"""
+        return np.stack([
+            np.searchsorted(edges, X_log[:, j], side='right') + self.bin_offsets[j]
+            for j, edges in enumerate(self.bin_edges)
+        ], axis=1)
+
+    def features(self, X_numeric, texts, tag_records):
+        """Разреженная матрица признаков ученика (для обучения)"""
+        X_log = self._log_numeric(X_numeric)
+        bins = self._bin_indices(X_log)
+        rows = np.repeat(np.arange(len(X_log)), bins.shape[1])
+        n_bin_features = self.bin_offsets[-1] + len(self.bin_edges[-1]) + 1
+        tag_hasher = FeatureHasher(n_features=self.tag_features, input_type='string', alternate_sign=False)
+        return sparse.hstack([
+            sparse.csr_matrix((X_log - self.mean) / self.scale),
+            sparse.csr_matrix((np.ones(bins.size), (rows, bins.ravel())), shape=(len(X_log), n_bin_features)),
+            self.text_hasher.transform(texts),
+            tag_hasher.transform([record_tokens(tags, categories) for tags, categories in tag_records])
+        ], format='csr')
+
+    def fit(self, X_numeric, texts, tag_records, y_teacher):
+        """Обучение на прогнозах учителя"""
+        X_log = self._log_numeric(X_numeric)
+        self.mean = X_log.mean(axis=0)
+        self.scale = X_log.std(axis=0)
+        self.scale[self.scale == 0] = 1.0
+        levels = np.linspace(0, 1, self.n_bins + 1)[1:-1]
+        self.bin_edges = [np.unique(np.quantile(X_log[:, j], levels)) for j in range(X_log.shape[1])]
+        self.bin_offsets = np.cumsum([0] + [len(edges) + 1 for edges in self.bin_edges[:-1]])
+
+        model = Ridge(alpha=self.alpha).fit(self.features(X_numeric, texts, tag_records), y_teacher)
+
+        # Веса по блокам для прямого расчета прогноза
+        coef = model.coef_
+        n_numeric = len(self.bin_edges)
+        n_bin_features = self.bin_offsets[-1] + len(self.bin_edges[-1]) + 1
+        self.intercept = float(model.intercept_)
+        self.numeric_weights = coef[:n_numeric]
+        self.bin_weights = coef[n_numeric:n_numeric + n_bin_features]
+        self.text_weights = coef[n_numeric + n_bin_features:n_numeric + n_bin_features + self.text_features]
+        self.tag_weights = coef[n_numeric + n_bin_features + self.text_features:]
+        return self
+
+    def _text_score(self, text):
+        if self._analyzer is None:
+            self._analyzer = self.text_hasher.build_analyzer()
+        counts = {}
+        for token in self._analyzer(text):
+            index = _hash_index(token, self.text_features)
+            counts[index] = counts.get(index, 0) + 1
+        if not counts:
+            return 0.0
+        values = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+        weights = self.text_weights[np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))]
+        return float(weights @ values / np.sqrt(values @ values))
+
+    def _tag_score(self, tags, categories):
+        return float(sum(self.tag_weights[_hash_index(token, self.tag_features)]
+                         for token in record_tokens(tags, categories)))
+
+    def predict(self, X_numeric, texts, tag_records):
+        """Прогноз для пакета: численная часть векторно, токены - по весам"""
+        X_log = self._log_numeric(X_numeric)
+        scores = self.intercept + ((X_log - self.mean) / self.scale) @ self.numeric_weights
+        scores += self.bin_weights[self._bin_indices(X_log)].sum(axis=1)
+        scores += np.array([self._text_score(text) for text in texts])
+        scores += np.array([self._tag_score(tags, categories) for tags, categories in tag_records])
+        return scores
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_analyzer'] = None
+        return state
+
+
+def median_latency_ms(predict_fn, repeats=50):
+    """Медианное время одного вызова predict_fn, мс"""
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        predict_fn()
+        timings.append(time.perf_counter() - started)
+    return float(np.median(timings) * 1000.0)
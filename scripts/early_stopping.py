@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Ранняя остановка градиентного бустинга по отложенной валидационной выборке
+
+GradientBoostingRegressor обучается с monitor: после каждого дерева прогноз
+на валидации обновляется на вклад нового дерева (без повторного прохода по
+всем деревьям), обучение прекращается, если ошибка не улучшается patience
+итераций. Затем ансамбль обрезается до наименьшего числа деревьев, ошибка
+которого в пределах tolerance от лучшей - меньше деревьев означает и более
+быстрое обучение, и более быстрый прогноз. Кривая ошибки по итерациям
+сохраняется в JSON метрик.
+"""
+
+import numpy as np
+from sklearn.model_selection import train_test_split
+
+
+class ValidationMonitor:
+    """monitor для GradientBoostingRegressor.fit: MSE на валидации после каждого дерева"""
+
+    def __init__(self, X_val, y_val, patience=10):
+        self.X_val = np.ascontiguousarray(X_val, dtype=np.float32)
+        self.y_val = np.asarray(y_val, dtype=np.float64)
+        self.patience = patience
+        self.losses = []
+        self._raw = None
+
+    def __call__(self, i, model, _locals):
+        if self._raw is None:
+            self._raw = (np.zeros(len(self.y_val)) if model.init_ == 'zero'
+                         else model.init_.predict(self.X_val).astype(np.float64))
+        tree = model.estimators_[i, 0]
+        self._raw += model.learning_rate * tree.predict(self.X_val, check_input=False)
+        self.losses.append(float(np.mean((self.y_val - self._raw) ** 2)))
+        # True - остановить обучение
+        return i - int(np.argmin(self.losses)) >= self.patience
+
+
+def select_n_estimators(losses, tolerance=0.005):
+    """Наименьшее число деревьев с ошибкой не больше лучшей * (1 + tolerance)"""
+    losses = np.asarray(losses)
+    return int(np.flatnonzero(losses <= losses.min() * (1.0 + tolerance))[0]) + 1
+
+
+def truncate_ensemble(model, n_estimators):
+    """Обрезка обученного ансамбля до первых n_estimators деревьев"""
+    model.estimators_ = model.estimators_[:n_estimators]
+    model.train_score_ = model.train_score_[:n_estimators]
+    if hasattr(model, 'oob_improvement_'):
+        model.oob_improvement_ = model.oob_improvement_[:n_estimators]
+        model.oob_scores_ = model.oob_scores_[:n_estimators]
+        model.oob_score_ = model.oob_scores_[-1]
+    model.n_estimators_ = n_estimators
+    # Повторное обучение (кросс-валидация, clone) сразу строит столько же деревьев
+    model.n_estimators = n_estimators
+    return model
+
+
+def fit_with_early_stopping(model, X, y, validation_fraction=0.1, patience=10, tolerance=0.005,
+                            random_state=42):
+    """
+    Обучение GradientBoostingRegressor с ранней остановкой
+
+    Args:
+        model: необученный GradientBoostingRegressor (n_estimators - верхняя граница)
+        validation_fraction: доля обучающих данных для валидации
+        patience: итераций без улучшения до остановки
+        tolerance: допустимое относительное ухудшение MSE при выборе числа деревьев
+
+    Returns:
+        кривая обучения (dict) для JSON метрик
+    """
+    max_estimators = model.n_estimators
+    X_fit, X_val, y_fit, y_val = train_test_split(
+        np.asarray(X), np.asarray(y), test_size=validation_fraction, random_state=random_state
+    )
+    monitor = ValidationMonitor(X_val, y_val, patience)
+    model.fit(X_fit, y_fit, monitor=monitor)
+
+    n_built = len(monitor.losses)
+    train_loss = [round(float(loss), 6) for loss in model.train_score_]
+    n_kept = select_n_estimators(monitor.losses, tolerance)
+    truncate_ensemble(model, n_kept)
+    print(f"  Ранняя остановка: построено {n_built} из {max_estimators} деревьев, "
+          f"оставлено {n_kept} (MSE на валидации {monitor.losses[n_kept - 1]:.4f}, "
+          f"лучшая {min(monitor.losses):.4f})")
+    return {
+        'max_estimators': max_estimators,
+        'n_estimators_built': n_built,
+        'n_estimators': n_kept,
+        'best_iteration': int(np.argmin(monitor.losses)) + 1,
+        'validation_fraction': validation_fraction,
+        'patience': patience,
+        'tolerance': tolerance,
+        'validation_mse': [round(loss, 6) for loss in monitor.losses],
+        'train_loss': train_loss
+    }
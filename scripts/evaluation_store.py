@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Хранилище результатов оценки моделей отдельно от артефактов прогноза
+
+Прогнозы на тестовой выборке нужны для анализа (графики, интервалы,
+сравнение версий), но не для прогноза - в артефакте модели (.pkl) остаются
+только скалярные метрики. Реальные значения и прогнозы сохраняются в сжатый
+.npz рядом с моделью, сводка по остаткам - в JSON метрик.
+
+Использование:
+    data = load_evaluation('models/evaluation.npz')
+    data['y_true'], data['y_pred'], data['stats']
+"""
+
+import json
+
+import numpy as np
+
+RESIDUAL_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+
+def serving_metrics(metrics):
+    """Только скалярные метрики (без массивов прогнозов) - для артефакта модели"""
+    return {
+        key: float(value) for key, value in metrics.items()
+        if np.ndim(value) == 0 and isinstance(value, (int, float, np.number))
+    }
+
+
+def residual_stats(y_true, y_pred):
+    """Сводка по остаткам y_true - y_pred"""
+    residuals = np.asarray(y_true, dtype=np.float64) - np.asarray(y_pred, dtype=np.float64)
+    quantiles = np.quantile(residuals, RESIDUAL_QUANTILES)
+    return {
+        'n': int(len(residuals)),
+        'mean': float(residuals.mean()),
+        'std': float(residuals.std()),
+        'mae': float(np.abs(residuals).mean()),
+        'rmse': float(np.sqrt(np.mean(residuals ** 2))),
+        'quantiles': {f'q{int(q * 100):02d}': float(value) for q, value in zip(RESIDUAL_QUANTILES, quantiles)}
+    }
+
+
+def save_evaluation(path, y_true, y_pred, model_name=None):
+    """
+    Сохранение реальных значений и прогнозов тестовой выборки
+
+    Returns:
+        сводка по остаткам (residual_stats)
+    """
+    y_true = np.asarray(y_true, dtype=np.float64)
+    y_pred = np.asarray(y_pred, dtype=np.float64)
+    stats = residual_stats(y_true, y_pred)
+    meta = {'model_name': model_name, 'stats': stats}
+    with open(path, 'wb') as f:
+        np.savez_compressed(f, y_true=y_true, y_pred=y_pred, meta=np.array(json.dumps(meta)))
+    return stats
+
+
+def load_evaluation(path):
+    """Результаты оценки: dict с y_true, y_pred, model_name и stats"""
+    with np.load(path) as data:
+        meta = json.loads(str(data['meta']))
+        return {'y_true': data['y_true'], 'y_pred': data['y_pred'], **meta}
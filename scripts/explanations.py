@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Объяснения прогнозов: вклад признаков по путям в деревьях (Saabas)
+
+Для каждого листа дерева заранее считается сумма изменений значения
+вдоль пути от корня, разложенная по признакам разбиений. Все деревья
+ансамбля сводятся в одну разреженную матрицу узлов x признаков, поэтому
+вклады для пакета запросов - это один вызов model.apply (листья всех
+деревьев) и одно произведение разреженных матриц:
+
+    прогноз = bias + сумма вкладов признаков
+
+Это атрибуция Saabas, а не TreeSHAP: вклады точно складываются в прогноз
+и считаются одним произведением матриц для всего пакета, но не
+согласованы (consistency) - при коррелированных признаках вклад делится
+по порядку разбиений на пути, и признак у корня получает больше, чем по
+значениям Шепли. Path-dependent TreeSHAP требует обхода всех деревьев
+для каждого запроса (O(листья x глубина^2) на дерево) и не ложится на
+пакетный путь прогноза; для ранжирования признаков в ответе и глобальных
+важностей точности Saabas достаточно.
+
+Поддерживаются GradientBoostingRegressor, RandomForestRegressor и
+линейные модели (вклад = коэффициент * нормализованный признак).
+Объяснители и глобальные важности кешируются по версии модели
+(хеш содержимого артефакта).
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+from scipy import sparse
+
+
+def file_version(path, length=12):
+    """Версия артефакта - префикс SHA-256 его содержимого"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()[:length]
+
+
+def _leaf_paths(tree, n_features, weight):
+    """
+    Матрица (узлы x признаки): для каждого листа - сумма изменений значения
+    вдоль пути от корня, по признакам разбиений (строки внутренних узлов пустые)
+    """
+    values = tree.value[:, 0, 0]
+    rows, cols, data = [], [], []
+    stack = [(0, {})]
+    while stack:
+        node, path = stack.pop()
+        left, right = tree.children_left[node], tree.children_right[node]
+        if left == -1:
+            rows.extend([node] * len(path))
+            cols.extend(path.keys())
+            data.extend(path.values())
+            continue
+        feature = tree.feature[node]
+        for child in (left, right):
+            child_path = dict(path)
+            child_path[feature] = child_path.get(feature, 0.0) + weight * (values[child] - values[node])
+            stack.append((child, child_path))
+    return sparse.csr_matrix((data, (rows, cols)), shape=(tree.node_count, n_features))
+
+
+class TreeExplainer:
+    """Вклады признаков для ансамблей деревьев"""
+
+    def __init__(self, model, feature_names):
+        self.model = model
+        self.feature_names = list(feature_names)
+        n_features = len(self.feature_names)
+
+        if hasattr(model, 'learning_rate') and hasattr(model, 'init_'):
+            # Градиентный бустинг: init + learning_rate * сумма деревьев
+            trees = [estimator.tree_ for estimator in model.estimators_[:, 0]]
+            weight = model.learning_rate
+            init = 0.0 if model.init_ == 'zero' else float(model.init_.predict(np.zeros((1, n_features)))[0])
+        else:
+            # Случайный лес: среднее по деревьям
+            trees = [estimator.tree_ for estimator in model.estimators_]
+            weight = 1.0 / len(trees)
+            init = 0.0
+
+        self.bias = init + weight * sum(float(tree.value[0, 0, 0]) for tree in trees)
+        self.offsets = np.cumsum([0] + [tree.node_count for tree in trees[:-1]])
+        self.leaf_paths = sparse.vstack(
+            [_leaf_paths(tree, n_features, weight) for tree in trees], format='csr'
+        )
+
+    def contributions(self, X):
+        """Вклады признаков (n_samples x n_features)"""
+        # Листья всех деревьев одним вызовом apply -> строки leaf_paths
+        leaves = self.model.apply(np.asarray(X, dtype=np.float32)).reshape(len(X), -1) + self.offsets
+        n_samples, n_trees = leaves.shape
+        indicator = sparse.csr_matrix(
+            (np.ones(leaves.size), leaves.ravel(), np.arange(0, leaves.size + 1, n_trees)),
+            shape=(n_samples, self.leaf_paths.shape[0])
+        )
+        return (indicator @ self.leaf_paths).toarray()
+
+
+class LinearExplainer:
+    """Вклады признаков для линейных моделей"""
+
+    def __init__(self, model, feature_names):
+        self.feature_names = list(feature_names)
+        self.coef = np.ravel(model.coef_)
+        self.bias = float(np.ravel(model.intercept_)[0])
+
+    def contributions(self, X):
+        return np.asarray(X, dtype=np.float64) * self.coef
+
+
+def make_explainer(model, feature_names):
+    """Объяснитель для модели (None, если тип модели не поддерживается)"""
+    if hasattr(model, 'estimators_'):
+        return TreeExplainer(model, feature_names)
+    if hasattr(model, 'coef_'):
+        return LinearExplainer(model, feature_names)
+    return None
+
+
+def explain_batch(explainer, X, top_n=10):
+    """Объяснения для пакета: bias и top_n признаков по модулю вклада"""
+    contributions = explainer.contributions(X)
+    top = np.argsort(-np.abs(contributions), axis=1)[:, :top_n]
+    return [
+        {
+            'bias': round(explainer.bias, 4),
+            'contributions': [
+                {'feature': explainer.feature_names[j], 'value': round(float(row[j]), 4)}
+                for j in indices if row[j] != 0
+            ]
+        }
+        for row, indices in zip(contributions, top)
+    ]
+
+
+def global_importance(explainer, X):
+    """Средний модуль вклада каждого признака на выборке X (по убыванию)"""
+    mean_abs = np.abs(explainer.contributions(X)).mean(axis=0)
+    order = np.argsort(-mean_abs)
+    return [
+        {'feature': explainer.feature_names[j], 'mean_abs_contribution': round(float(mean_abs[j]), 6)}
+        for j in order if mean_abs[j] > 0
+    ]
+
+
+class ExplanationCache:
+    """
+    Кеш по версии модели: объяснители в памяти, глобальные важности -
+    JSON файлы models/explanations/<версия>.json
+    """
+
+    def __init__(self, cache_dir='models/explanations', max_explainers=8):
+        self.cache_dir = cache_dir
+        self.max_explainers = max_explainers
+        self._explainers = {}
+        self._importances = {}
+        self._lock = threading.Lock()
+
+    def explainer(self, version, model, feature_names):
+        with self._lock:
+            if version in self._explainers:
+                return self._explainers[version]
+            # None (модель без деревьев) тоже кешируется
+            explainer = make_explainer(model, feature_names)
+            if len(self._explainers) >= self.max_explainers:
+                self._explainers.pop(next(iter(self._explainers)))
+            self._explainers[version] = explainer
+            return explainer
+
+    def _path(self, version):
+        return os.path.join(self.cache_dir, f'{version}.json')
+
+    def save_importance(self, version, model_name, importances):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(self._path(version), 'w') as f:
+            json.dump({'version': version, 'model_name': model_name, 'importances': importances}, f, indent=2)
+        with self._lock:
+            self._importances[version] = importances
+
+    def importance(self, version):
+        """Глобальные важности версии модели (None, если не посчитаны)"""
+        with self._lock:
+            if version in self._importances:
+                return self._importances[version]
+        try:
+            with open(self._path(version)) as f:
+                importances = json.load(f)['importances']
+        except (FileNotFoundError, ValueError, KeyError):
+            importances = None
+        with self._lock:
+            self._importances[version] = importances
+        return importances
+
+
+def cache_global_importance(artifact_path, model, feature_names, X, model_name,
+                            cache_dir='models/explanations'):
+    """Глобальные важности сохраненной модели на выборке X (при обучении)"""
+    explainer = make_explainer(model, feature_names)
+    if explainer is None:
+        return None
+    importances = global_importance(explainer, X)
+    ExplanationCache(cache_dir).save_importance(file_version(artifact_path), model_name, importances)
+    return importances
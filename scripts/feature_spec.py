@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Единое описание признаков для обучения и прогнозирования
+
+FeatureSpec задает порядок, типы и значения по умолчанию численных признаков
+и за один проход переводит запросы (dict) в предвыделенную матрицу NumPy -
+без DataFrame на каждый запрос. Спецификация сохраняется в артефакт модели
+и сверяется при загрузке, чтобы обучение и прогноз использовали одинаковые
+признаки в одинаковом порядке.
+
+Тип матриц признаков задается FEATURE_DTYPE (переменная окружения, по умолчанию
+float32): деревья sklearn все равно сравнивают признаки в float32, а вдвое
+меньшие матрицы экономят память и кеш при обучении и пакетном прогнозе.
+FEATURE_DTYPE=float64 возвращает прежнее поведение.
+
+Здесь же общие функции подготовки данных (preprocess_text,
+calculate_polygon_score - копия расчета из Go кода internal/preprocessing,
+calculate_popularity - целевая переменная расширенной модели, model_matrix -
+сборка матрицы модели из плотных и разреженных блоков).
+"""
+
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+from scipy import sparse
+
+def parse_feature_dtype(value):
+    """Тип матриц признаков из значения FEATURE_DTYPE (только float32 или float64)"""
+    try:
+        dtype = np.dtype(value)
+    except TypeError:
+        dtype = None
+    if dtype not in (np.float32, np.float64):
+        raise ValueError(f"FEATURE_DTYPE должен быть float32 или float64, получено {value!r}")
+    return dtype
+
+
+FEATURE_DTYPE = parse_feature_dtype(os.environ.get('FEATURE_DTYPE') or 'float32')
+
+_NON_ALNUM = re.compile(r'[^a-zA-Z0-9\s]')
+_SPACES = re.compile(r'\s+')
+
+
+def preprocess_text(text):
+    """Предобработка текста: нижний регистр, только буквы/цифры, одиночные пробелы"""
+    if not text:
+        return ""
+    text = _NON_ALNUM.sub(' ', text.lower())
+    return _SPACES.sub(' ', text).strip()
+
+
+def calculate_polygon_score(face_count):
+    """Оценка качества по полигонам (копия из Go кода)"""
+    if face_count <= 0:
+        return 0
+
+    min_optimal = 5000.0
+    max_optimal = 50000.0
+    penalty_rate = 0.5
+
+    faces = float(face_count)
+
+    if faces >= min_optimal and faces <= max_optimal:
+        mid = (min_optimal + max_optimal) / 2
+        distance = abs(faces - mid)
+        max_distance = (max_optimal - min_optimal) / 2
+        return 10.0 * (1.0 - (distance / max_distance) * 0.2)
+
+    if faces < min_optimal:
+        ratio = faces / min_optimal
+        return np.log1p(faces) * ratio * penalty_rate
+
+    excess = (faces - max_optimal) / max_optimal
+    penalty = 1.0 / (1.0 + excess * penalty_rate)
+    return 10.0 * penalty
+
+
+def calculate_popularity(views, likes, downloads, face_count):
+    """Популярность модели (целевая переменная расширенной модели)"""
+    return (np.log1p(views) * 0.25 +
+            np.log1p(likes) * 0.35 +
+            np.log1p(downloads) * 0.25 +
+            calculate_polygon_score(face_count) * 0.15)
+
+
+def _to_float(value):
+    return float(value) if value is not None else 0.0
+
+
+def _to_flag(value):
+    return 1.0 if value else 0.0
+
+
+_CONVERTERS = {'number': _to_float, 'bool': _to_flag}
+
+
+class FeatureSpec:
+    """Упорядоченный список численных признаков с типами"""
+
+    def __init__(self, name, features):
+        """
+        Args:
+            name: имя спецификации ('standard', 'advanced')
+            features: список пар (имя признака, тип 'number' | 'bool');
+                имя признака совпадает с ключом запроса и колонкой данных
+        """
+        self.name = name
+        self.features = [(feature, kind) for feature, kind in features]
+        for feature, kind in self.features:
+            if kind not in _CONVERTERS:
+                raise ValueError(f"Неизвестный тип признака {feature}: {kind}")
+        self.names = [feature for feature, _ in self.features]
+        self._converters = [(feature, _CONVERTERS[kind]) for feature, kind in self.features]
+
+    def __len__(self):
+        return len(self.features)
+
+    def matrix(self, records, out=None):
+        """
+        Матрица признаков (n_records x n_features) для пакета запросов
+
+        Args:
+            records: список dict в формате запроса прогноза
+            out: предвыделенный массив подходящей формы (необязательно)
+        """
+        n = len(records)
+        if out is None:
+            out = np.empty((n, len(self.features)), dtype=FEATURE_DTYPE)
+        for j, (feature, convert) in enumerate(self._converters):
+            out[:n, j] = [convert(record.get(feature)) for record in records]
+        return out
+
+    def row(self, record):
+        """Признаки одного запроса (1 x n_features)"""
+        return self.matrix([record])
+
+    def frame(self, df):
+        """Признаки из DataFrame обучающих данных (bool -> 0/1, пропуски -> 0, тип FEATURE_DTYPE)"""
+        X = df[self.names].copy()
+        for feature, kind in self.features:
+            if kind == 'bool':
+                X[feature] = X[feature].fillna(False).astype(bool).astype(int)
+        return X.fillna(0).astype(FEATURE_DTYPE)
+
+    def to_dict(self):
+        return {'name': self.name, 'features': [list(pair) for pair in self.features]}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['name'], [tuple(pair) for pair in data['features']])
+
+    def fingerprint(self):
+        """Короткий хеш спецификации"""
+        payload = json.dumps(self.to_dict(), sort_keys=True).encode('utf-8')
+        return hashlib.sha256(payload).hexdigest()[:12]
+
+    def verify(self, saved_spec=None, columns=None, n_features=None, dtype=None):
+        """
+        Проверка совместимости артефакта со спецификацией кода
+
+        Args:
+            saved_spec: спецификация из артефакта (dict)
+            columns: список признаков артефакта (для артефактов без спецификации)
+            n_features: число признаков, ожидаемое scaler/моделью
+            dtype: тип матриц признаков при обучении (feature_dtype артефакта)
+
+        Raises:
+            ValueError при расхождении
+        """
+        if saved_spec is not None and FeatureSpec.from_dict(saved_spec).to_dict() != self.to_dict():
+            raise ValueError(
+                f"Спецификация признаков '{self.name}' артефакта отличается от кода: "
+                f"{saved_spec['features']} != {self.to_dict()['features']}"
+            )
+        if columns is not None and list(columns) != self.names:
+            raise ValueError(f"Признаки артефакта {list(columns)} не совпадают с {self.names}")
+        if n_features is not None and n_features != len(self.features):
+            raise ValueError(f"Ожидается {n_features} признаков, спецификация '{self.name}' - {len(self.features)}")
+        if dtype is not None and np.dtype(dtype) != FEATURE_DTYPE:
+            raise ValueError(
+                f"Модель '{self.name}' обучена на признаках {np.dtype(dtype).name}, "
+                f"FEATURE_DTYPE={FEATURE_DTYPE.name} (задайте FEATURE_DTYPE={np.dtype(dtype).name})"
+            )
+
+
+def standardize(X, scaler):
+    """StandardScaler.transform без проверок sklearn и DataFrame (на месте)"""
+    if getattr(scaler, 'with_mean', True) and scaler.mean_ is not None:
+        X -= scaler.mean_
+    if getattr(scaler, 'with_std', True) and scaler.scale_ is not None:
+        X /= scaler.scale_
+    return X
+
+
+def model_matrix(blocks):
+    """
+    Матрица признаков для модели из блоков (NumPy или CSR): разреженные блоки
+    TF-IDF и multi-hot объединяются без плотных копий каждого блока, плотная
+    матрица FEATURE_DTYPE строится один раз - деревья sklearn и ранняя остановка
+    работают с плотным float32
+    """
+    if any(sparse.issparse(block) for block in blocks):
+        return sparse.hstack(blocks, format='csr', dtype=FEATURE_DTYPE).toarray()
+    return np.hstack(blocks, dtype=FEATURE_DTYPE)
+
+
+ADVANCED_SPEC = FeatureSpec('advanced', [
+    ('category_count', 'number'),
+    ('tag_count', 'number'),
+    ('description_length', 'number'),
+    ('face_count', 'number'),
+    ('vertex_count', 'number'),
+    ('animation_count', 'number'),
+    ('is_downloadable', 'bool'),
+    ('is_premium_author', 'bool'),
+    ('author_followers', 'number')
+])
+
+STANDARD_SPEC = FeatureSpec('standard', ADVANCED_SPEC.features + [
+    ('days_since_published', 'number')
+])
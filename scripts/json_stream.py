@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Потоковое чтение больших JSON файлов без загрузки целиком в память
+
+Поддерживаются JSON массив объектов (как data/raw_models.json и
+data/preprocessed_data.json) и JSON Lines (один объект на строку).
+"""
+
+import json
+
+_WHITESPACE = ' \t\r\n'
+
+
+def iter_json_records(filename, buffer_size=1 << 20):
+    """Итератор по объектам JSON массива или JSON Lines файла"""
+    decoder = json.JSONDecoder()
+    with open(filename, 'r', encoding='utf-8') as f:
+        buf = f.read(buffer_size)
+        pos = _skip_whitespace(buf, 0)
+        if pos < len(buf) and buf[pos] != '[':
+            # JSON Lines
+            yield from _iter_json_lines(buf, f)
+            return
+        pos += 1
+        eof = False
+
+        while True:
+            pos = _skip_separators(buf, pos)
+            if pos < len(buf) and buf[pos] == ']':
+                return
+            try:
+                record, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # Объект не поместился в буфер - дочитываем
+                chunk = f.read(buffer_size)
+                eof = not chunk
+                buf = buf[pos:] + chunk
+                pos = 0
+                continue
+            yield record
+            pos = end
+            # Периодически отбрасываем прочитанную часть буфера
+            if pos > buffer_size:
+                buf = buf[pos:]
+                pos = 0
+
+
+def _iter_json_lines(head, f):
+    for line in _lines(head, f):
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def _lines(head, f):
+    lines = head.split('\n')
+    tail = lines.pop()
+    yield from lines
+    for line in f:
+        if tail:
+            line = tail + line
+            tail = ''
+        yield line
+    if tail:
+        yield tail
+
+
+def _skip_whitespace(buf, pos):
+    while pos < len(buf) and buf[pos] in _WHITESPACE:
+        pos += 1
+    return pos
+
+
+def _skip_separators(buf, pos):
+    while pos < len(buf) and (buf[pos] in _WHITESPACE or buf[pos] == ','):
+        pos += 1
+    return pos
+
+
+def iter_chunks(records, chunk_size):
+    """Группировка итератора в списки по chunk_size элементов"""
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+Реестр моделей: неизменяемые наборы артефактов с адресацией по содержимому
+
+Структура:
+    models/registry/<имя>/<версия>/        - набор файлов одного запуска обучения
+    models/registry/<имя>/<версия>/manifest.json
+    models/registry/<имя>/CURRENT          - версия, используемая для прогноза
+    models/registry/<имя>/CANDIDATE        - версия на теневой оценке (shadow.py)
+
+Версия - префикс SHA-256 по именам и хешам файлов для прогноза (модель,
+scaler, словари, индекс), поэтому одинаковые артефакты дают одну версию;
+файлы запуска (метрики с датой обучения, прогнозы теста - run_files) в
+версию не входят. Обучение пишет артефакты сразу во временный каталог
+реестра (stage), набор переименовывается целиком, указатель CURRENT
+заменяется через os.replace - читатель всегда видит либо старый, либо новый
+набор целиком. Процессам прогноза достаточно читать маленький файл CURRENT,
+чтобы заметить новую версию.
+
+Плоские копии файлов текущей версии в каталоге над реестром (models/) -
+для запуска без реестра и model-info - обновляются только при переключении
+CURRENT, поэтому кандидат на теневой оценке их не затрагивает.
+
+Использование:
+    python scripts/model_registry.py list advanced
+    python scripts/model_registry.py promote advanced <версия>
+    python scripts/model_registry.py candidate advanced <версия>   # теневая оценка
+    python scripts/model_registry.py candidate advanced --clear
+    python scripts/model_registry.py prune advanced --keep 5
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime
+
+REGISTRY_ROOT = 'models/registry'
+POINTER = 'CURRENT'
+CANDIDATE = 'CANDIDATE'
+MANIFEST = 'manifest.json'
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _atomic_write(path, text):
+    """Запись файла через временный файл и os.replace"""
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _atomic_copy(source, path):
+    """Копия файла через временный файл и os.replace"""
+    fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', dir=os.path.dirname(path))
+    os.close(fd)
+    try:
+        shutil.copy2(source, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class ModelRegistry:
+    """Версионированные наборы артефактов моделей"""
+
+    def __init__(self, root=REGISTRY_ROOT, mirror_dir=None):
+        """
+        Args:
+            root: каталог реестра
+            mirror_dir: каталог плоских копий текущей версии (по умолчанию - над реестром)
+        """
+        self.root = root
+        self.mirror_dir = mirror_dir or os.path.dirname(os.path.abspath(root))
+
+    def _model_dir(self, name):
+        return os.path.join(self.root, name)
+
+    def bundle_dir(self, name, version):
+        return os.path.join(self.root, name, version)
+
+    def stage(self, name):
+        """Временный каталог для артефактов нового набора (см. publish_staged)"""
+        model_dir = self._model_dir(name)
+        os.makedirs(model_dir, exist_ok=True)
+        return tempfile.mkdtemp(prefix='.staging-', dir=model_dir)
+
+    def discard(self, staging):
+        """Удаление неопубликованного временного каталога"""
+        shutil.rmtree(staging, ignore_errors=True)
+
+    @contextmanager
+    def staging(self, name):
+        """stage(name), удаляемый при ошибке до публикации (publish_staged)"""
+        staging = self.stage(name)
+        try:
+            yield staging
+        except BaseException:
+            self.discard(staging)
+            raise
+
+    def publish(self, name, paths, metadata=None, promote=True, run_files=()):
+        """
+        Публикация набора файлов (копии paths) как новой версии
+
+        Args:
+            name: имя модели ('standard', 'advanced')
+            paths: пути к артефактам; в наборе хранятся под своими именами файлов
+            metadata: дополнительные поля manifest.json (метрики и т.п.)
+            promote: сразу сделать версию текущей (иначе - см. propose)
+            run_files: имена файлов запуска, не входящих в версию
+
+        Returns:
+            версия набора
+        """
+        staging = self.stage(name)
+        try:
+            for path in paths:
+                if os.path.exists(path):
+                    shutil.copy2(path, os.path.join(staging, os.path.basename(path)))
+        except BaseException:
+            self.discard(staging)
+            raise
+        return self.publish_staged(name, staging, metadata, promote, run_files)
+
+    def publish_staged(self, name, staging, metadata=None, promote=True, run_files=()):
+        """
+        Публикация временного каталога stage(name) как новой версии
+
+        Каталог переименовывается в каталог версии (или удаляется, если
+        такой набор уже опубликован). Аргументы - как у publish.
+        """
+        try:
+            files = {}
+            for filename in sorted(os.listdir(staging)):
+                path = os.path.join(staging, filename)
+                files[filename] = {'sha256': file_sha256(path), 'bytes': os.path.getsize(path)}
+            if not files:
+                raise ValueError(f"Нет артефактов для публикации модели {name}")
+
+            hashed = sorted((f, info['sha256']) for f, info in files.items() if f not in run_files)
+            if not hashed:
+                raise ValueError(f"Нет артефактов прогноза для публикации модели {name}")
+            version = hashlib.sha256(json.dumps(hashed).encode('utf-8')).hexdigest()[:16]
+            manifest = {
+                'name': name,
+                'version': version,
+                'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'files': files,
+                'run_files': sorted(f for f in files if f in run_files)
+            }
+            manifest.update(metadata or {})
+            with open(os.path.join(staging, MANIFEST), 'w') as f:
+                json.dump(manifest, f, indent=2)
+
+            target = self.bundle_dir(name, version)
+            if os.path.exists(target):
+                # Такой же набор уже опубликован
+                self.discard(staging)
+            else:
+                os.rename(staging, target)
+        except BaseException:
+            self.discard(staging)
+            raise
+
+        if promote:
+            self.promote(name, version)
+        return version
+
+    def promote(self, name, version):
+        """Атомарное переключение текущей версии (кандидат с этой версией снимается)"""
+        self._check_version(name, version)
+        _atomic_write(os.path.join(self._model_dir(name), POINTER), version + '\n')
+        if self.candidate_version(name) == version:
+            self.clear_candidate(name)
+        self._mirror(name, version)
+
+    def _mirror(self, name, version):
+        """Плоские копии файлов текущей версии (каждый файл заменяется атомарно)"""
+        bundle = self.bundle_dir(name, version)
+        os.makedirs(self.mirror_dir, exist_ok=True)
+        for filename in self.manifest(name, version)['files']:
+            _atomic_copy(os.path.join(bundle, filename), os.path.join(self.mirror_dir, filename))
+
+    def propose(self, name, version):
+        """
+        Версия-кандидат для теневой оценки перед переключением
+
+        Returns:
+            True - версия стала кандидатом; False - текущей версии еще нет
+            (или это она же), версия сразу становится текущей
+        """
+        self._check_version(name, version)
+        if self.current_version(name) in (None, version):
+            self.promote(name, version)
+            return False
+        _atomic_write(os.path.join(self._model_dir(name), CANDIDATE), version + '\n')
+        return True
+
+    def clear_candidate(self, name):
+        try:
+            os.remove(os.path.join(self._model_dir(name), CANDIDATE))
+        except FileNotFoundError:
+            pass
+
+    def _check_version(self, name, version):
+        if not os.path.exists(os.path.join(self.bundle_dir(name, version), MANIFEST)):
+            raise ValueError(f"Версия {version} модели {name} не найдена")
+
+    def pointer(self, name, pointer=POINTER):
+        """Версия из файла указателя; None, если указателя нет"""
+        try:
+            with open(os.path.join(self._model_dir(name), pointer)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def current_version(self, name):
+        """Текущая версия (чтение только указателя); None, если реестр пуст"""
+        return self.pointer(name, POINTER)
+
+    def candidate_version(self, name):
+        """Версия на теневой оценке; None, если кандидата нет"""
+        return self.pointer(name, CANDIDATE)
+
+    def manifest(self, name, version):
+        with open(os.path.join(self.bundle_dir(name, version), MANIFEST)) as f:
+            return json.load(f)
+
+    def resolve(self, name, version=None):
+        """
+        Каталог и манифест версии (по умолчанию - текущей)
+
+        Returns:
+            (bundle_dir, manifest) или (None, None), если версии нет
+        """
+        version = version or self.current_version(name)
+        if version is None:
+            return None, None
+        try:
+            return self.bundle_dir(name, version), self.manifest(name, version)
+        except FileNotFoundError:
+            return None, None
+
+    def versions(self, name):
+        """Опубликованные версии (от новых к старым)"""
+        model_dir = self._model_dir(name)
+        if not os.path.isdir(model_dir):
+            return []
+        manifests = []
+        for entry in os.listdir(model_dir):
+            if entry.startswith('.') or entry in (POINTER, CANDIDATE):
+                continue
+            try:
+                manifests.append(self.manifest(name, entry))
+            except (FileNotFoundError, ValueError):
+                continue
+        return sorted(manifests, key=lambda m: m.get('created_at', ''), reverse=True)
+
+    def prune(self, name, keep=5):
+        """Удаление старых версий (текущая версия и кандидат сохраняются всегда)"""
+        protected = {self.current_version(name), self.candidate_version(name)}
+        removed = []
+        for manifest in self.versions(name)[keep:]:
+            if manifest['version'] not in protected:
+                shutil.rmtree(self.bundle_dir(name, manifest['version']), ignore_errors=True)
+                removed.append(manifest['version'])
+        return removed
+
+
+class RegistryWatcher:
+    """Отслеживание смены версий по указателям CURRENT (или CANDIDATE)"""
+
+    def __init__(self, registry, names, pointer=POINTER):
+        self.registry = registry
+        self.names = list(names)
+        self.pointer = pointer
+        self.versions = {name: registry.pointer(name, pointer) for name in self.names}
+
+    def changed(self):
+        """Имена моделей, текущая версия которых изменилась с прошлой проверки"""
+        changed = []
+        for name in self.names:
+            version = self.registry.pointer(name, self.pointer)
+            if version != self.versions[name]:
+                self.versions[name] = version
+                changed.append(name)
+        return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Реестр моделей')
+    sub = parser.add_subparsers(dest='command', required=True)
+    list_parser = sub.add_parser('list', help='версии модели')
+    list_parser.add_argument('name')
+    promote_parser = sub.add_parser('promote', help='сделать версию текущей')
+    promote_parser.add_argument('name')
+    promote_parser.add_argument('version')
+    candidate_parser = sub.add_parser('candidate', help='отправить версию на теневую оценку')
+    candidate_parser.add_argument('name')
+    candidate_parser.add_argument('version', nargs='?')
+    candidate_parser.add_argument('--clear', action='store_true', help='снять кандидата')
+    prune_parser = sub.add_parser('prune', help='удалить старые версии')
+    prune_parser.add_argument('name')
+    prune_parser.add_argument('--keep', type=int, default=5)
+    parser.add_argument('--root', default=REGISTRY_ROOT)
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.root)
+    if args.command == 'list':
+        current = registry.current_version(args.name)
+        candidate = registry.candidate_version(args.name)
+        for manifest in registry.versions(args.name):
+            marker = '*' if manifest['version'] == current else 'c' if manifest['version'] == candidate else ' '
+            size = sum(info['bytes'] for info in manifest['files'].values())
+            print(f"{marker} {manifest['version']}  {manifest['created_at']}  {size} bytes")
+    elif args.command == 'promote':
+        try:
+            registry.promote(args.name, args.version)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            sys.exit(1)
+        print(f"{args.name}: текущая версия {args.version}")
+    elif args.command == 'candidate':
+        if args.clear:
+            registry.clear_candidate(args.name)
+            print(f"{args.name}: кандидат снят")
+            return
+        if not args.version:
+            parser.error('нужна версия или --clear')
+        try:
+            staged = registry.propose(args.name, args.version)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            sys.exit(1)
+        print(f"{args.name}: {'кандидат' if staged else 'текущая версия'} {args.version}")
+    elif args.command == 'prune':
+        for version in registry.prune(args.name, args.keep):
+            print(f"Удалена версия {version}")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,19 +2,29 @@
 """
 Скрипт для прогнозирования популярности модели
 Используется обученная ML модель
+
+Запрос (JSON объект или массив) - в stdin или первым аргументом
 """
 
+import os
 import sys
-import json
 import joblib
-import numpy as np
-import pandas as pd
+from prediction_intervals import interval_fields
+from model_registry import ModelRegistry
+from feature_spec import STANDARD_SPEC, standardize
+from prediction_schema import decode_requests, dumps
 
 def load_model():
-    """Загрузка обученной модели"""
+    """Загрузка обученной модели (модель и scaler из одной версии реестра)"""
+    directory, _ = ModelRegistry().resolve('standard')
+    directory = directory or 'models'
     try:
-        model_data = joblib.load('models/popularity_model.pkl')
-        scaler = joblib.load('models/scaler.pkl')
+        model_data = joblib.load(os.path.join(directory, 'popularity_model.pkl'))
+        scaler = joblib.load(os.path.join(directory, 'scaler.pkl'))
+        STANDARD_SPEC.verify(
+            model_data.get('feature_spec'), model_data['feature_columns'], scaler.n_features_in_,
+            model_data.get('feature_dtype')
+        )
         return model_data, scaler
     except FileNotFoundError:
         # Если модель не найдена, возвращаем None
@@ -22,27 +32,8 @@ def load_model():
 
 def predict(input_data, model_data, scaler):
     """Выполнение предсказания"""
-    # Подготовка признаков в правильном порядке
-    feature_columns = model_data['feature_columns']
-    
-    # Создаем DataFrame с одной строкой
-    features = {}
-    features['category_count'] = input_data.get('category_count', 0)
-    features['tag_count'] = input_data.get('tag_count', 0)
-    features['description_length'] = input_data.get('description_length', 0)
-    features['face_count'] = input_data.get('face_count', 0)
-    features['vertex_count'] = input_data.get('vertex_count', 0)
-    features['animation_count'] = input_data.get('animation_count', 0)
-    features['is_downloadable'] = 1 if input_data.get('is_downloadable', False) else 0
-    features['is_premium_author'] = 1 if input_data.get('is_premium_author', False) else 0
-    features['author_followers'] = input_data.get('author_followers', 0)
-    features['days_since_published'] = input_data.get('days_since_published', 0)
-    
-    # Создаем DataFrame
-    X = pd.DataFrame([features], columns=feature_columns)
-    
-    # Нормализация
-    X_scaled = scaler.transform(X)
+    # Признаки в порядке обучения (feature_spec.STANDARD_SPEC) без DataFrame
+    X_scaled = standardize(STANDARD_SPEC.row(input_data), scaler)
     
     # Предсказание
     model = model_data['model']
@@ -59,38 +50,51 @@ def predict(input_data, model_data, scaler):
         category = "high"
         confidence = 0.85
     
-    return {
+    result = {
         'popularity_score': float(prediction),
         'category': category,
         'confidence': confidence
     }
+    
+    # Уверенность по откалиброванным интервалам (если модель их содержит)
+    fields = interval_fields(model_data.get('intervals'), [prediction], (2.0, 4.0))
+    if fields is not None:
+        result['confidence'], result['prediction_interval'] = fields[0]
+    
+    return result
+
+def read_input():
+    """JSON запроса: аргумент командной строки или stdin (без ограничения размера)"""
+    if len(sys.argv) > 1:
+        return sys.argv[1]
+    return sys.stdin.buffer.read()
 
 def main():
     """Основная функция"""
-    if len(sys.argv) < 2:
-        print(json.dumps({'error': 'No input data provided'}))
+    raw = read_input()
+    if not raw.strip():
+        sys.stdout.buffer.write(dumps({'error': 'No input data provided'}) + b'\n')
         sys.exit(1)
     
     try:
-        # Парсим входные данные
-        input_json = sys.argv[1]
-        input_data = json.loads(input_json)
+        # Парсим и проверяем входные данные (объект или массив запросов)
+        inputs, is_batch = decode_requests(raw)
         
         # Загружаем модель
         model_data, scaler = load_model()
         
         if model_data is None or scaler is None:
             # Если модель не найдена, используем простую эвристику
-            result = simple_predict(input_data)
+            results = [simple_predict(input_data) for input_data in inputs]
         else:
             # Используем обученную модель
-            result = predict(input_data, model_data, scaler)
+            results = [predict(input_data, model_data, scaler) for input_data in inputs]
         
         # Выводим результат в JSON
-        print(json.dumps(result))
+        sys.stdout.buffer.write(dumps(results if is_batch else results[0]) + b'\n')
         
     except Exception as e:
-        print(json.dumps({'error': str(e)}))
+        sys.stdout.buffer.write(dumps({'error': str(e)}) + b'\n')
         sys.exit(1)
 
 def simple_predict(input_data):
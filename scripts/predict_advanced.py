@@ -3,130 +3,321 @@
 Расширенный скрипт прогнозирования с поддержкой:
 - Текстовых признаков (теги, описание)
 - Оценки качества модели
+- Пакетного прогнозирования (используется сервером prediction_server.py)
+- Поиска похожих моделей каталога (similarity_index.py)
+- Объяснений прогноза по вкладам признаков (поле explain запроса, explanations.py)
+- Быстрой модели-ученика при малом бюджете задержки (distillation.py):
+  поле latency_budget_ms запроса или PREDICT_LATENCY_BUDGET_MS
+- Каскада (cascade.py): сначала ученик, расширенная модель - только если
+  прогноз ученика может оказаться в другой категории; путь - в поле cascade
+  ответа, отключение - поле cascade: false или PREDICT_CASCADE=0
+- Замера этапов (--profile или PREDICT_PROFILE=1, см. profiling.py)
+- Пакета запросов в stdin (JSON массив -> массив ответов); запрос проверяется
+  по схеме prediction_schema.py, ответ - компактный JSON (--pretty - с отступами)
+
+Модели загружаются из текущих версий реестра (model_registry.py),
+без реестра - из models/.
 """
 
 import sys
-import json
 import joblib
 import numpy as np
-import pandas as pd
 import os
+from scipy import sparse
 
 # Добавляем путь к модулю quality_rating
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from quality_rating import QualityRater
+from profiling import StageTimer, stage, profiling_enabled, profile_call
+from similarity_index import index_features
+from prediction_intervals import interval_fields
+from explanations import ExplanationCache, explain_batch, file_version
+from model_registry import ModelRegistry
+from feature_spec import ADVANCED_SPEC, STANDARD_SPEC, model_matrix, standardize
+from text_cache import clean_text, tfidf_transform
+from cascade import cascade_accepts
+from prediction_schema import RequestError, decode_requests, dumps
+
+# Реестр моделей: прогноз использует текущие версии
+REGISTRY = ModelRegistry()
+
+# Объяснители и глобальные важности по версиям моделей
+EXPLANATIONS = ExplanationCache()
+
+# Рейтер качества без состояния - один на процесс
+QUALITY_RATER = QualityRater()
+
+# Границы категорий популярности (см. categorize_score)
+CATEGORY_THRESHOLDS = (5, 8)
+
+def _env_latency_budget():
+    """PREDICT_LATENCY_BUDGET_MS: некорректное значение игнорируется с предупреждением"""
+    value = os.environ.get('PREDICT_LATENCY_BUDGET_MS', '').strip()
+    if not value:
+        return None
+    try:
+        budget = float(value)
+    except ValueError:
+        budget = float('nan')
+    if not np.isfinite(budget) or budget < 0:
+        print(f"Warning: ignoring invalid PREDICT_LATENCY_BUDGET_MS={value!r}", file=sys.stderr)
+        return None
+    return budget
+
+# Бюджет задержки для запросов без поля latency_budget_ms, мс (None - без ограничения)
+DEFAULT_LATENCY_BUDGET_MS = _env_latency_budget()
 
-def load_models():
-    """Загрузка всех доступных моделей"""
+def resolve_artifacts(name, version=None):
+    """
+    Каталог артефактов версии (по умолчанию - текущей) из реестра
+    (models/registry/<name>) или models/, если модель еще не публиковалась в реестре
+    
+    Returns:
+        (каталог, манифест или None)
+    """
+    directory, manifest = REGISTRY.resolve(name, version)
+    if directory is None:
+        return 'models', None
+    return directory, manifest
+
+def artifact_version(directory, manifest, filename):
+    """Версия файла модели (для кеша объяснений): хеш из манифеста или файла"""
+    if manifest is not None and filename in manifest['files']:
+        return manifest['files'][filename]['sha256'][:12]
+    return file_version(os.path.join(directory, filename))
+
+def load_models(versions=None):
+    """
+    Загрузка всех доступных моделей
+    
+    versions - версии реестра по именам ('standard', 'advanced'), по умолчанию текущие
+    (кандидаты для теневой оценки, см. shadow.py)
+    """
+    versions = versions or {}
     models = {}
     
     # Стандартная модель
+    directory, manifest = resolve_artifacts('standard', versions.get('standard'))
     try:
-        standard_model = joblib.load('models/popularity_model.pkl')
-        standard_scaler = joblib.load('models/scaler.pkl')
+        standard_model = joblib.load(os.path.join(directory, 'popularity_model.pkl'))
+        standard_scaler = joblib.load(os.path.join(directory, 'scaler.pkl'))
+        STANDARD_SPEC.verify(
+            standard_model.get('feature_spec'), standard_model['feature_columns'], standard_scaler.n_features_in_,
+            standard_model.get('feature_dtype')
+        )
+        standard_model['version'] = artifact_version(directory, manifest, 'popularity_model.pkl')
         models['standard'] = {
             'model_data': standard_model,
-            'scaler': standard_scaler
+            'scaler': standard_scaler,
+            'registry_version': manifest['version'] if manifest else None
         }
     except FileNotFoundError:
         models['standard'] = None
+    except ValueError as e:
+        print(f"Warning: standard model rejected: {e}", file=sys.stderr)
+        models['standard'] = None
     
     # Расширенная модель с текстом
+    directory, manifest = resolve_artifacts('advanced', versions.get('advanced'))
     try:
-        advanced_model = joblib.load('models/popularity_model_advanced.pkl')
+        advanced_model = joblib.load(os.path.join(directory, 'popularity_model_advanced.pkl'))
+        ADVANCED_SPEC.verify(
+            advanced_model.get('feature_spec'), advanced_model['numeric_features'],
+            advanced_model['scaler'].n_features_in_, advanced_model.get('feature_dtype')
+        )
+        advanced_model['version'] = artifact_version(directory, manifest, 'popularity_model_advanced.pkl')
+        advanced_model['registry_version'] = manifest['version'] if manifest else None
         models['advanced'] = advanced_model
     except FileNotFoundError:
         models['advanced'] = None
+    except ValueError as e:
+        print(f"Warning: advanced model rejected: {e}", file=sys.stderr)
+        models['advanced'] = None
+    
+    # Модель-ученик (дистилляция расширенной модели, та же версия)
+    try:
+        models['student'] = joblib.load(os.path.join(directory, 'popularity_model_student.pkl'))
+        ADVANCED_SPEC.verify(columns=models['student']['model'].numeric_features)
+    except FileNotFoundError:
+        models['student'] = None
+    except ValueError as e:
+        print(f"Warning: student model rejected: {e}", file=sys.stderr)
+        models['student'] = None
+    
+    # Индекс похожих моделей (строится вместе с расширенной моделью)
+    try:
+        models['similarity'] = joblib.load(os.path.join(directory, 'similarity_index.pkl'))
+    except FileNotFoundError:
+        models['similarity'] = None
     
     return models
 
-def predict_popularity_standard(input_data, model_data, scaler):
-    """Стандартное прогнозирование без текста"""
-    feature_columns = model_data['feature_columns']
-    
-    # Подготовка признаков
-    features = {}
-    features['category_count'] = input_data.get('category_count', 0)
-    features['tag_count'] = input_data.get('tag_count', 0)
-    features['description_length'] = input_data.get('description_length', 0)
-    features['face_count'] = input_data.get('face_count', 0)
-    features['vertex_count'] = input_data.get('vertex_count', 0)
-    features['animation_count'] = input_data.get('animation_count', 0)
-    features['is_downloadable'] = 1 if input_data.get('is_downloadable', False) else 0
-    features['is_premium_author'] = 1 if input_data.get('is_premium_author', False) else 0
-    features['author_followers'] = input_data.get('author_followers', 0)
-    features['days_since_published'] = input_data.get('days_since_published', 0)
-    
-    # Создаем DataFrame
-    X = pd.DataFrame([features], columns=feature_columns)
+def registry_versions(models):
+    """Версии загруженных моделей в реестре"""
+    return {
+        'standard': models['standard'].get('registry_version') if models.get('standard') else None,
+        'advanced': models['advanced'].get('registry_version') if models.get('advanced') else None
+    }
+
+def standard_feature_matrix(inputs, model_data, scaler, timer=None):
+    """Нормализованные признаки стандартной модели для пакета запросов"""
+    # Одна матрица на весь пакет (порядок признаков сверен при загрузке)
+    with stage(timer, 'features'):
+        X = STANDARD_SPEC.matrix(inputs)
     
     # Нормализация
-    X_scaled = scaler.transform(X)
+    with stage(timer, 'scaler_transform'):
+        return standardize(X, scaler)
+
+def predict_popularity_standard_batch(inputs, model_data, scaler, timer=None):
+    """Стандартное прогнозирование без текста для пакета запросов"""
+    X_scaled = standard_feature_matrix(inputs, model_data, scaler, timer)
     
     # Предсказание
     model = model_data['model']
-    prediction = model.predict(X_scaled)[0]
+    with stage(timer, 'model_predict'):
+        return model.predict(X_scaled)
+
+def predict_popularity_standard(input_data, model_data, scaler, timer=None):
+    """Стандартное прогнозирование без текста"""
+    return predict_popularity_standard_batch([input_data], model_data, scaler, timer)[0]
+
+def combined_text(input_data):
+    """Объединенный текст запроса: теги, описание, категории"""
+    tags = input_data.get('tags', [])
+    description = input_data.get('description', '')
+    categories = input_data.get('categories', [])
     
-    return prediction
+    tags_text = ' '.join([str(tag) for tag in tags]) if isinstance(tags, list) else ''
+    categories_text = ' '.join([str(cat) for cat in categories]) if isinstance(categories, list) else ''
+    return clean_text(f"{tags_text} {description} {categories_text}")
 
-def preprocess_text(text):
-    """Предобработка текста"""
-    import re
-    if not text:
-        return ""
-    text = text.lower()
-    text = re.sub(r'[^a-zA-Z0-9\s]', ' ', text)
-    text = re.sub(r'\s+', ' ', text).strip()
-    return text
+def model_text(input_data, model_data):
+    """
+    Текст запроса для TF-IDF/хеширования модели: модели со словарем тегов
+    (text_source='description') получают теги и категории multi-hot блоком,
+    в текст идет только описание; модели, обученные раньше, - объединенный текст
+    """
+    if model_data.get('text_source') == 'description':
+        return clean_text(input_data.get('description', ''))
+    return combined_text(input_data)
 
-def predict_popularity_advanced(input_data, model_data):
-    """Расширенное прогнозирование с текстом"""
+def advanced_feature_blocks(inputs, model_data, timer=None):
+    """Блоки признаков расширенной модели: численные, TF-IDF и multi-hot тегов"""
     # Извлекаем компоненты модели
-    model = model_data['model']
     tfidf = model_data['tfidf']
     scaler = model_data['scaler']
-    numeric_features = model_data['numeric_features']
     
     # Численные признаки
-    features = {}
-    features['category_count'] = input_data.get('category_count', 0)
-    features['tag_count'] = input_data.get('tag_count', 0)
-    features['description_length'] = input_data.get('description_length', 0)
-    features['face_count'] = input_data.get('face_count', 0)
-    features['vertex_count'] = input_data.get('vertex_count', 0)
-    features['animation_count'] = input_data.get('animation_count', 0)
-    features['is_downloadable'] = 1 if input_data.get('is_downloadable', False) else 0
-    features['is_premium_author'] = 1 if input_data.get('is_premium_author', False) else 0
-    features['author_followers'] = input_data.get('author_followers', 0)
-    
-    X_numeric = pd.DataFrame([features], columns=numeric_features)
-    X_numeric_scaled = scaler.transform(X_numeric)
-    
-    # Текстовые признаки
-    tags = input_data.get('tags', [])
-    description = input_data.get('description', '')
-    categories = input_data.get('categories', [])
+    with stage(timer, 'features'):
+        X_numeric = ADVANCED_SPEC.matrix(inputs)
+        texts = [model_text(d, model_data) for d in inputs]
+    with stage(timer, 'scaler_transform'):
+        X_numeric_scaled = standardize(X_numeric, scaler)
     
-    # Объединяем текст
-    tags_text = ' '.join([str(tag) for tag in tags]) if isinstance(tags, list) else ''
-    categories_text = ' '.join([str(cat) for cat in categories]) if isinstance(categories, list) else ''
-    combined_text = preprocess_text(f"{tags_text} {description} {categories_text}")
+    # Векторизация текста (CSR до model_matrix)
+    with stage(timer, 'tfidf_transform'):
+        X_text_vec = tfidf_transform(tfidf, texts)
     
-    # Векторизация текста
-    X_text_vec = tfidf.transform([combined_text]).toarray()
+    # Multi-hot тегов, если модель обучена со словарем
+    with stage(timer, 'features'):
+        blocks = [X_numeric_scaled, X_text_vec]
+        vocabulary = model_data.get('tag_vocabulary')
+        if vocabulary is not None:
+            tag_records = [(d.get('tags', []), d.get('categories', [])) for d in inputs]
+            blocks.append(vocabulary.transform(tag_records))
+    return blocks
+
+def stack_rows(rows):
+    """Строки одного блока признаков в матрицу (CSR строки - в CSR)"""
+    if sparse.issparse(rows[0]):
+        return sparse.vstack(rows, format='csr')
+    return np.vstack(rows)
+
+def remember_feature_rows(inputs, blocks, feature_rows):
+    """Строки блоков признаков по запросам (ключ - id запроса) для поиска похожих моделей"""
+    if feature_rows is not None:
+        for row, input_data in enumerate(inputs):
+            feature_rows[id(input_data)] = [block[row] for block in blocks]
+
+def cached_feature_blocks(inputs, model_data, feature_rows=None, timer=None):
+    """
+    Блоки признаков расширенной модели для пакета: строки, построенные при
+    прогнозе (feature_rows), используются повторно, недостающие строятся
+    """
+    rows = {} if feature_rows is None else feature_rows
+    missing = [input_data for input_data in inputs if id(input_data) not in rows]
+    if missing:
+        remember_feature_rows(missing, advanced_feature_blocks(missing, model_data, timer), rows)
+    batch = [rows[id(input_data)] for input_data in inputs]
+    return [stack_rows([row[j] for row in batch]) for j in range(len(batch[0]))]
+
+def predict_popularity_advanced_batch(inputs, model_data, timer=None, feature_rows=None):
+    """
+    Расширенное прогнозирование с текстом для пакета запросов
     
-    # Объединяем признаки
-    X_combined = np.hstack([X_numeric_scaled, X_text_vec])
+    Args:
+        feature_rows: dict для строк блоков признаков (см. find_similar) или None
+    """
+    blocks = advanced_feature_blocks(inputs, model_data, timer)
+    remember_feature_rows(inputs, blocks, feature_rows)
+    with stage(timer, 'features'):
+        X_combined = model_matrix(blocks)
     
     # Предсказание
-    prediction = model.predict(X_combined)[0]
-    
-    return prediction
+    with stage(timer, 'model_predict'):
+        return model_data['model'].predict(X_combined)
+
+def predict_popularity_advanced(input_data, model_data, timer=None):
+    """Расширенное прогнозирование с текстом"""
+    return predict_popularity_advanced_batch([input_data], model_data, timer)[0]
+
+def predict_popularity_student_batch(inputs, student_data, timer=None):
+    """Прогноз модели-ученика для пакета запросов"""
+    student = student_data['model']
+    with stage(timer, 'features'):
+        X_numeric = ADVANCED_SPEC.matrix(inputs)
+        texts = [model_text(d, student_data) for d in inputs]
+        tag_records = [(d.get('tags', []), d.get('categories', [])) for d in inputs]
+    with stage(timer, 'model_predict'):
+        return student.predict(X_numeric, texts, tag_records)
+
+def latency_budget_ms(input_data):
+    """Бюджет задержки запроса, мс (None - без ограничения)"""
+    budget = input_data.get('latency_budget_ms')
+    # Тип поля запроса проверен схемой (prediction_schema.py)
+    return float(budget) if budget is not None else DEFAULT_LATENCY_BUDGET_MS
+
+def wants_student(input_data, models):
+    """
+    Нужна ли модель-ученик: расширенной модели нет или бюджет задержки
+    меньше измеренной при обучении задержки учителя, а объяснение не запрошено
+    (объяснения строятся по деревьям расширенной модели)
+    """
+    student = models.get('student')
+    if student is None:
+        return False
+    if not models['advanced']:
+        return True
+    if explain_top_n(input_data) > 0:
+        return False
+    budget = latency_budget_ms(input_data)
+    return budget is not None and budget < student['latency_ms']['teacher']
+
+def wants_cascade(input_data, models):
+    """
+    Нужен ли каскад: есть ученик с калиброванной границей ошибки и расширенная модель,
+    каскад не отключен, объяснение не запрошено (объяснения строятся по деревьям расширенной модели)
+    """
+    student = models.get('student')
+    if student is None or student.get('cascade') is None or not models['advanced']:
+        return False
+    if os.environ.get('PREDICT_CASCADE', '1') == '0' or input_data.get('cascade', True) is False:
+        return False
+    return explain_top_n(input_data) == 0
 
 def calculate_quality(input_data):
     """Расчет рейтинга качества модели"""
-    rater = QualityRater()
-    
     # Подготовка данных для рейтера
     quality_data = {
         'tags': input_data.get('tags', []),
@@ -142,67 +333,312 @@ def calculate_quality(input_data):
         'is_animated': input_data.get('is_animated', False)
     }
     
-    return rater.calculate_quality_score(quality_data)
+    return QUALITY_RATER.calculate_quality_score(quality_data)
 
 def categorize_score(score):
     """Категоризация оценки популярности"""
-    if score >= 8:
+    if score >= CATEGORY_THRESHOLDS[1]:
         return "high"
-    elif score >= 5:
+    elif score >= CATEGORY_THRESHOLDS[0]:
         return "medium"
     else:
         return "low"
 
-def main():
-    """Основная функция"""
-    # Читаем входные данные из stdin
-    input_data = json.loads(sys.stdin.read())
+def wants_advanced(input_data):
+    """Нужна ли расширенная модель (есть теги или описание)"""
+    return 'tags' in input_data or 'description' in input_data
+
+def _error_reason(error):
+    """Краткая причина ошибки для ответа (первая строка сообщения)"""
+    lines = str(error).strip().splitlines()
+    return lines[0] if lines else type(error).__name__
+
+def _predict_group(indices, inputs, predict_fn, failures):
+    """
+    Прогноз для группы запросов одним вызовом model.predict.
+    Если пакет падает, запросы повторяются по одному, чтобы
+    ошибка одного запроса не ломала остальные; причина ошибки
+    запроса записывается в failures (индекс -> текст).
+    """
+    try:
+        predictions = predict_fn([inputs[i] for i in indices])
+        return dict(zip(indices, predictions))
+    except Exception as e:
+        if len(indices) == 1:
+            print(f"Warning: prediction failed: {e}", file=sys.stderr)
+            failures[indices[0]] = _error_reason(e)
+            return {}
+        print(f"Warning: batch prediction failed, retrying one by one: {e}", file=sys.stderr)
     
-    # Загружаем модели
-    models = load_models()
+    results = {}
+    for i in indices:
+        try:
+            results[i] = predict_fn([inputs[i]])[0]
+        except Exception as e:
+            print(f"Warning: prediction failed: {e}", file=sys.stderr)
+            failures[i] = _error_reason(e)
+    return results
+
+def predict_scores(inputs, models, timer=None, routes=None, feature_rows=None, errors=None):
+    """
+    Прогноз популярности для пакета запросов
     
-    result = {}
+    Args:
+        routes: список длины inputs - заполняется путем каскада
+            ('accepted' - ответ ученика, 'escalated' - передан расширенной модели)
+        feature_rows: dict - заполняется блоками признаков расширенной модели
+            (повторно используются в find_similar)
+        errors: список длины inputs - заполняется причиной ошибки для запросов
+            без прогноза (None - моделей нет)
     
-    # Пытаемся использовать расширенную модель
-    if models['advanced'] and ('tags' in input_data or 'description' in input_data):
+    Returns:
+        список пар (popularity_score, model_used); (None, None) если прогноза нет
+    """
+    scores = [(None, None)] * len(inputs)
+    failures = {}
+    if routes is None:
+        routes = [None] * len(inputs)
+    
+    # Модель-ученик для запросов с малым бюджетом задержки
+    student_idx = [i for i, d in enumerate(inputs) if wants_advanced(d) and wants_student(d, models)]
+    if student_idx:
         try:
-            popularity_score = predict_popularity_advanced(input_data, models['advanced'])
-            result['model_used'] = 'advanced'
+            predicted = _predict_group(
+                student_idx, inputs,
+                lambda batch: predict_popularity_student_batch(batch, models['student'], timer),
+                failures
+            )
         except Exception as e:
-            print(f"Warning: Advanced model failed: {e}", file=sys.stderr)
-            # Fallback на стандартную модель
-            if models['standard']:
-                popularity_score = predict_popularity_standard(
-                    input_data, 
-                    models['standard']['model_data'],
-                    models['standard']['scaler']
+            print(f"Warning: Student model failed: {e}", file=sys.stderr)
+            predicted = {}
+        for i, score in predicted.items():
+            scores[i] = (score, 'student')
+    
+    # Каскад: ответ ученика принимается, если его интервал ошибки не пересекает границу категории.
+    # Путь определяется только запросом (не размером пакета), поэтому ответ не зависит от нагрузки
+    cascade_idx = [i for i, d in enumerate(inputs)
+                   if scores[i][0] is None and wants_advanced(d) and wants_cascade(d, models)]
+    if cascade_idx:
+        try:
+            predicted = _predict_group(
+                cascade_idx, inputs,
+                lambda batch: predict_popularity_student_batch(batch, models['student'], timer),
+                failures
+            )
+        except Exception as e:
+            print(f"Warning: Student model failed: {e}", file=sys.stderr)
+            predicted = {}
+        indices = list(predicted)
+        if indices:
+            accepted = cascade_accepts(
+                models['student']['cascade'], [predicted[i] for i in indices], CATEGORY_THRESHOLDS
+            )
+            for i, ok in zip(indices, accepted):
+                routes[i] = 'accepted' if ok else 'escalated'
+                if ok:
+                    scores[i] = (predicted[i], 'student')
+    
+    # Пытаемся использовать расширенную модель
+    if models['advanced']:
+        advanced_idx = [i for i, d in enumerate(inputs) if wants_advanced(d) and scores[i][0] is None]
+        if advanced_idx:
+            try:
+                predicted = _predict_group(
+                    advanced_idx, inputs,
+                    lambda batch: predict_popularity_advanced_batch(
+                        batch, models['advanced'], timer, feature_rows
+                    ),
+                    failures
                 )
-                result['model_used'] = 'standard'
+            except Exception as e:
+                print(f"Warning: Advanced model failed: {e}", file=sys.stderr)
+                predicted = {}
+            for i, score in predicted.items():
+                scores[i] = (score, 'advanced')
+    
+    # Стандартная модель для остальных запросов (и как fallback)
+    if models['standard']:
+        standard_idx = [i for i, (score, _) in enumerate(scores) if score is None]
+        if standard_idx:
+            standard = models['standard']
+            predicted = _predict_group(
+                standard_idx, inputs,
+                lambda batch: predict_popularity_standard_batch(
+                    batch, standard['model_data'], standard['scaler'], timer
+                ),
+                failures
+            )
+            for i, score in predicted.items():
+                scores[i] = (score, 'standard')
+    
+    if errors is not None:
+        for i, (score, _) in enumerate(scores):
+            if score is None:
+                errors[i] = failures.get(i)
+    return scores
+
+def model_intervals(models, model_used):
+    """Откалиброванные интервалы модели (None для моделей без калибровки)"""
+    if model_used == 'advanced':
+        return models['advanced'].get('intervals')
+    if model_used == 'student':
+        return models['student'].get('intervals')
+    if model_used == 'standard':
+        return models['standard']['model_data'].get('intervals')
+    return None
+
+def score_uncertainty(scores, models, timer=None):
+    """
+    Уверенность и интервал прогноза для пакета (векторно по каждой модели)
+    
+    Returns:
+        список пар (confidence, prediction_interval) или None для запросов
+        без откалиброванных интервалов
+    """
+    uncertainty = [None] * len(scores)
+    with stage(timer, 'intervals'):
+        for model_used in ('student', 'advanced', 'standard'):
+            indices = [i for i, (score, used) in enumerate(scores) if used == model_used]
+            if not indices:
+                continue
+            fields = interval_fields(
+                model_intervals(models, model_used),
+                [scores[i][0] for i in indices], CATEGORY_THRESHOLDS
+            )
+            if fields is not None:
+                for i, value in zip(indices, fields):
+                    uncertainty[i] = value
+    return uncertainty
+
+def explain_top_n(input_data):
+    """Число признаков в объяснении (поле explain: true или число; 0 - без объяснения)"""
+    explain = input_data.get('explain', False)
+    if explain is True:
+        return 10
+    try:
+        return max(int(explain or 0), 0)
+    except (TypeError, ValueError):
+        return 0
+
+def explain_predictions(inputs, scores, models, timer=None, feature_rows=None):
+    """
+    Вклады признаков для запросов с полем explain (пакетно по каждой модели)
+    
+    feature_rows - блоки признаков расширенной модели, уже построенные в predict_scores
+    
+    Returns:
+        список объяснений или None для запросов без объяснения
+    """
+    explanations = [None] * len(inputs)
+    # Ученик (единственная загруженная модель для текста) объяснений не строит
+    for i, (score, used) in enumerate(scores):
+        if used == 'student' and explain_top_n(inputs[i]) > 0:
+            explanations[i] = {'error': 'explanations are not available for the student model'}
+    for model_used in ('advanced', 'standard'):
+        indices = [i for i, (score, used) in enumerate(scores)
+                   if used == model_used and explain_top_n(inputs[i]) > 0]
+        if not indices:
+            continue
+        batch = [inputs[i] for i in indices]
+        try:
+            if model_used == 'advanced':
+                model_data = models['advanced']
+                blocks = cached_feature_blocks(batch, model_data, feature_rows, timer)
+                with stage(timer, 'features'):
+                    X = model_matrix(blocks)
+                feature_names = model_data['numeric_features'] + list(model_data['tfidf'].get_feature_names_out())
+                if model_data.get('tag_vocabulary') is not None:
+                    feature_names += model_data['tag_vocabulary'].feature_names()
             else:
-                result['error'] = 'No models available'
-                print(json.dumps(result))
-                return
-    # Используем стандартную модель
-    elif models['standard']:
-        popularity_score = predict_popularity_standard(
-            input_data, 
-            models['standard']['model_data'],
-            models['standard']['scaler']
-        )
-        result['model_used'] = 'standard'
-    else:
-        result['error'] = 'No models available'
-        print(json.dumps(result))
-        return
+                model_data = models['standard']['model_data']
+                X = standard_feature_matrix(batch, model_data, models['standard']['scaler'], timer)
+                feature_names = model_data['feature_columns']
+            
+            with stage(timer, 'explain'):
+                explainer = EXPLANATIONS.explainer(model_data['version'], model_data['model'], feature_names)
+                if explainer is None:
+                    continue
+                found = explain_batch(explainer, X, max(explain_top_n(d) for d in batch))
+        except Exception as e:
+            print(f"Warning: Explanation failed: {e}", file=sys.stderr)
+            continue
+        for i, explanation in zip(indices, found):
+            explanation['contributions'] = explanation['contributions'][:explain_top_n(inputs[i])]
+            explanation['model_version'] = model_data['version']
+            explanations[i] = explanation
+    return explanations
+
+def global_importances(models):
+    """Закешированные глобальные важности загруженных моделей"""
+    importances = {}
+    for name in ('advanced', 'standard'):
+        if not models.get(name):
+            continue
+        model_data = models[name] if name == 'advanced' else models[name]['model_data']
+        importances[name] = {
+            'model_version': model_data['version'],
+            'importances': EXPLANATIONS.importance(model_data['version'])
+        }
+    return importances
+
+def find_similar(inputs, models, timer=None, feature_rows=None):
+    """
+    Похожие модели каталога для пакета запросов (только по полю similar_k
+    запроса: поиск стоит дороже самого прогноза)
+    
+    Args:
+        feature_rows: блоки признаков, уже построенные в predict_scores;
+            для остальных запросов блоки строятся здесь
+    
+    Returns:
+        список результатов поиска или None для запросов без поиска
+    """
+    similar = [None] * len(inputs)
+    index = models.get('similarity')
+    if index is None or not models.get('advanced'):
+        return similar
+    
+    ks = [int(d.get('similar_k', 0) or 0) for d in inputs]
+    indices = [i for i, k in enumerate(ks) if k > 0]
+    if not indices:
+        return similar
+    
+    try:
+        blocks = cached_feature_blocks([inputs[i] for i in indices], models['advanced'], feature_rows, timer)
+        with stage(timer, 'similarity_search'):
+            found = index.query_batch(index_features(blocks), k=max(ks))
+    except Exception as e:
+        print(f"Warning: Similarity search failed: {e}", file=sys.stderr)
+        return similar
+    for i, neighbours in zip(indices, found):
+        similar[i] = neighbours[:ks[i]]
+    return similar
+
+def build_result(input_data, popularity_score, model_used, timer=None, similar=None, uncertainty=None,
+                 route=None, error=None):
+    """Формирование ответа для одного запроса (error - причина, если прогноза нет)"""
+    if popularity_score is None:
+        return {'error': f'prediction failed: {error}' if error else 'No models available'}
+    
+    result = {'model_used': model_used}
+    if route is not None:
+        result['cascade'] = route
+    if similar is not None:
+        result['similar_models'] = similar
     
     # Прогноз популярности
     result['popularity_score'] = float(popularity_score)
     result['popularity_category'] = categorize_score(popularity_score)
-    result['confidence'] = 0.85  # Можно улучшить с помощью prediction intervals
+    if uncertainty is not None:
+        result['confidence'], result['prediction_interval'] = uncertainty
+    else:
+        # Модель обучена без калибровки интервалов
+        result['confidence'] = 0.85
     
     # Рейтинг качества
     try:
-        quality_result = calculate_quality(input_data)
+        with stage(timer, 'quality_rating'):
+            quality_result = calculate_quality(input_data)
         result['quality_rating'] = {
             'score': quality_result['total_score'],
             'grade': quality_result['grade'],
@@ -213,8 +649,81 @@ def main():
         print(f"Warning: Quality rating failed: {e}", file=sys.stderr)
         result['quality_rating'] = None
     
-    # Выводим результат
-    print(json.dumps(result, indent=2))
+    return result
+
+def predict_batch(inputs, models, timer=None, include_timings=None):
+    """
+    Полный прогноз (популярность + качество) для пакета запросов
+    
+    Args:
+        timer: StageTimer для замера этапов (по умолчанию - только при PREDICT_PROFILE=1)
+        include_timings: добавить timings_ms в ответы (по умолчанию - PREDICT_PROFILE)
+    """
+    if include_timings is None:
+        include_timings = profiling_enabled()
+    if timer is None and include_timings:
+        timer = StageTimer()
+    
+    routes = [None] * len(inputs)
+    feature_rows = {}
+    errors = [None] * len(inputs)
+    scores = predict_scores(inputs, models, timer, routes, feature_rows, errors)
+    uncertainty = score_uncertainty(scores, models, timer)
+    similar = find_similar(inputs, models, timer, feature_rows)
+    results = [
+        build_result(input_data, score, model_used, timer, neighbours, interval, route, error)
+        for input_data, (score, model_used), neighbours, interval, route, error
+        in zip(inputs, scores, similar, uncertainty, routes, errors)
+    ]
+    
+    # Объяснения только для запросов, которые их просят
+    for result, explanation in zip(results, explain_predictions(inputs, scores, models, timer, feature_rows)):
+        if explanation is not None and 'error' not in result:
+            result['explanation'] = explanation
+    
+    # Длительности этапов общие для всего пакета
+    if include_timings and timer is not None:
+        timings = timer.as_ms()
+        for result in results:
+            result['timings_ms'] = timings
+            result['batch_size'] = len(inputs)
+    return results
+
+def run(inputs, include_timings):
+    """Загрузка моделей и прогноз для пакета запросов"""
+    timer = StageTimer() if include_timings else None
+    
+    # Загружаем модели
+    with stage(timer, 'load_models'):
+        models = load_models()
+    
+    return predict_batch(inputs, models, timer, include_timings)
+
+def write_json(result, pretty=False):
+    """Вывод ответа в stdout (компактный JSON, --pretty - с отступами)"""
+    sys.stdout.buffer.write(dumps(result, pretty) + b'\n')
+    sys.stdout.flush()
+
+def main():
+    """Основная функция"""
+    include_timings = '--profile' in sys.argv[1:] or profiling_enabled()
+    pretty = '--pretty' in sys.argv[1:]
+    
+    # Читаем из stdin запрос (объект) или пакет запросов (массив) и проверяем схему
+    try:
+        inputs, is_batch = decode_requests(sys.stdin.buffer.read())
+    except RequestError as e:
+        write_json({'error': f'invalid request: {e}'})
+        sys.exit(1)
+    
+    dump_path = os.environ.get('PREDICT_PROFILE_DUMP')
+    if dump_path:
+        results = profile_call(run, dump_path, inputs, include_timings)
+    else:
+        results = run(inputs, include_timings)
+    
+    # Выводим результат: массив для пакета, объект для одного запроса
+    write_json(results if is_batch else results[0], pretty)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+"""
+Пул процессов прогнозирования с общими (только для чтения) моделями
+
+Модели загружаются один раз в родительском процессе, затем создаются
+N рабочих процессов через fork - загруженные оценщики разделяются
+между ними по copy-on-write. Пакеты запросов распределяются на наименее
+загруженный процесс (или по кругу), упавшие процессы перезапускаются.
+Каждый процесс (и перезапущенный тоже) прогревается синтетическими
+запросами (warmup.py) и только после этого принимает пакеты. Кроме пакетов
+прогноза процессы считают сетки вариантов what-if (what_if.py), чтобы
+тяжелые запросы не занимали GIL процесса сервера.
+
+Процессы создаются fork из любого потока (перезагрузка моделей идет в
+потоке executor), поэтому дочерний процесс может унаследовать захваченную
+другим потоком блокировку и зависнуть. Отчет о прогреве ожидается не
+дольше ready_timeout: зависший процесс завершается, а новый пул, в котором
+не все процессы готовы, не создается (перезагрузка оставляет прежний пул).
+Ответ на задачу ожидается не дольше call_timeout: зависший на запросе
+процесс завершается и перезапускается, а запросы пакета получают ошибку.
+
+Дочерний процесс наследует дескрипторы и обработчики сигналов сервера.
+Поэтому рабочий процесс сразу закрывает чужие концы каналов и дескрипторы,
+зарегистрированные через register_parent_fd (слушающий сокет сервера),
+возвращает SIGTERM обработчик по умолчанию и завершается, если родительский
+процесс умер. gc.freeze() не снимается при закрытии пула: после замены пула
+сервер вызывает refreeze(), чтобы собрать мусор прежнего поколения моделей.
+"""
+
+import gc
+import itertools
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from predict_advanced import predict_batch
+from text_cache import cache_stats
+from warmup import warm_up
+from what_if import what_if
+
+# Период проверки родительского процесса рабочим процессом, сек
+PARENT_CHECK_INTERVAL = 1.0
+
+# Дескрипторы родительского процесса, которые рабочие процессы закрывают после fork
+_PARENT_FDS = set()
+_PARENT_FDS_LOCK = threading.Lock()
+
+
+def register_parent_fd(fd):
+    """Дескриптор (например, слушающий сокет), который не должен оставаться открытым в рабочих процессах"""
+    with _PARENT_FDS_LOCK:
+        _PARENT_FDS.add(fd)
+
+
+def unregister_parent_fd(fd):
+    with _PARENT_FDS_LOCK:
+        _PARENT_FDS.discard(fd)
+
+
+def refreeze():
+    """
+    Пересборка замороженного поколения после закрытия прежнего пула:
+    мусор прежних моделей собирается, текущие модели снова замораживаются
+    """
+    gc.unfreeze()
+    gc.collect()
+    gc.freeze()
+
+
+def _detach_from_parent(close_fds):
+    """Сброс унаследованного от сервера состояния в рабочем процессе"""
+    # Обработчики asyncio (add_signal_handler) пишут в wakeup fd event loop сервера
+    try:
+        signal.set_wakeup_fd(-1)
+    except ValueError:
+        pass
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    # Завершением управляет родительский процесс
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for fd in close_fds:
+        try:
+            os.close(fd)
+        except OSError:
+            pass
+
+
+def _run_task(task, args, models):
+    """Задача рабочего процесса: 'predict' (пакет запросов) или 'what_if' (один запрос)"""
+    if task == 'what_if':
+        input_data, top_k = args
+        return what_if(input_data, models, top_k)
+    inputs, include_timings = args
+    return predict_batch(inputs, models, include_timings=include_timings)
+
+
+def _task_error(task, args, error):
+    """Ответ на задачу, завершившуюся ошибкой, в формате ее результата"""
+    if task == 'what_if':
+        return {'error': f'prediction failed: {error}'}
+    return [{'error': str(error)}] * len(args[0])
+
+
+def _worker_main(conn, models, parent_pid, close_fds):
+    """
+    Цикл рабочего процесса: задача (пакет запросов или what-if) -> результат
+
+    models наследуются при fork (аргументы процесса не сериализуются).
+    close_fds - унаследованные дескрипторы родителя и других процессов пула.
+    """
+    _detach_from_parent(close_fds)
+    # Готовность сообщается после прогрева
+    conn.send(warm_up(models))
+    while True:
+        try:
+            if not conn.poll(PARENT_CHECK_INTERVAL):
+                if os.getppid() != parent_pid:
+                    break
+                continue
+            message = conn.recv()
+        except (EOFError, OSError):
+            break
+        if message is None:
+            break
+        task, args = message
+        try:
+            results = _run_task(task, args, models)
+        except Exception as e:
+            results = _task_error(task, args, e)
+        # Статистика кешей процесса возвращается вместе с результатами
+        conn.send((results, cache_stats()))
+
+
+class WorkerCrashed(Exception):
+    """Рабочий процесс завершился во время обработки пакета"""
+
+
+class WorkerTimeout(WorkerCrashed):
+    """Рабочий процесс не ответил на задачу за call_timeout и был завершен"""
+
+
+class _Worker:
+    """Рабочий процесс и его статистика"""
+
+    def __init__(self, index, context, models, ready_timeout, call_timeout):
+        self.index = index
+        self.context = context
+        self.models = models
+        self.ready_timeout = ready_timeout
+        self.call_timeout = call_timeout
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.restarts = 0
+        self.latency_ewma = None
+        self.last_latency = None
+        self.text_cache = None
+        self.warmup = None
+        self.process = None
+        self.conn = None
+
+    def start(self, wait=True):
+        parent_conn, child_conn = self.context.Pipe()
+        self.warmup = None
+        with _PARENT_FDS_LOCK:
+            close_fds = sorted(_PARENT_FDS | {parent_conn.fileno()})
+            _PARENT_FDS.add(parent_conn.fileno())
+        self.process = self.context.Process(
+            target=_worker_main, args=(child_conn, self.models, os.getpid(), close_fds),
+            name=f'prediction-worker-{self.index}', daemon=True
+        )
+        try:
+            self.process.start()
+        except BaseException:
+            unregister_parent_fd(parent_conn.fileno())
+            parent_conn.close()
+            raise
+        finally:
+            child_conn.close()
+        self.conn = parent_conn
+        if wait:
+            self.wait_ready()
+
+    def wait_ready(self, timeout=None):
+        """
+        Ожидание отчета о прогреве процесса (не дольше timeout, по умолчанию ready_timeout)
+
+        Returns:
+            True, если процесс прогрет и принимает пакеты
+        """
+        timeout = self.ready_timeout if timeout is None else timeout
+        try:
+            if not self.conn.poll(timeout):
+                # Зависший после fork процесс завершается - его перезапустит монитор пула
+                print(f"Warning: worker {self.index} not ready after {timeout:.1f}s, killing",
+                      file=sys.stderr)
+                self.process.kill()
+                self.process.join()
+                return False
+            self.warmup = self.conn.recv()
+        except (EOFError, OSError) as e:
+            # Упавший процесс перезапустит монитор пула
+            print(f"Warning: worker {self.index} died during warm-up: {e}", file=sys.stderr)
+        return self.warmup is not None
+
+    def restart(self):
+        self.stop(timeout=0.1)
+        self.restarts += 1
+        self.start()
+
+    def stop(self, timeout=5.0):
+        if self.process is None:
+            return
+        try:
+            self.conn.send(None)
+        except (OSError, BrokenPipeError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(1.0)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        if not self.conn.closed:
+            unregister_parent_fd(self.conn.fileno())
+            self.conn.close()
+
+    def call(self, task, args):
+        """Отправка задачи и ожидание ответа (вызывается под self.lock)"""
+        started = time.perf_counter()
+        try:
+            self.conn.send((task, args))
+            if not self.conn.poll(self.call_timeout):
+                # Живой, но зависший процесс иначе держал бы self.lock бесконечно
+                self.process.kill()
+                self.process.join()
+                raise WorkerTimeout(f'worker {self.index} did not answer within {self.call_timeout:.1f}s')
+            results, self.text_cache = self.conn.recv()
+        except (EOFError, OSError, BrokenPipeError) as e:
+            raise WorkerCrashed(f'worker {self.index} crashed: {e}')
+        elapsed = time.perf_counter() - started
+        self.completed += 1
+        self.last_latency = elapsed
+        self.latency_ewma = elapsed if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * elapsed
+        return results
+
+    def snapshot(self):
+        return {
+            'index': self.index,
+            'pid': self.process.pid if self.process else None,
+            'alive': bool(self.process and self.process.is_alive()),
+            'in_flight': self.in_flight,
+            'completed_batches': self.completed,
+            'restarts': self.restarts,
+            'latency_ewma_ms': round(self.latency_ewma * 1000.0, 3) if self.latency_ewma is not None else None,
+            'last_latency_ms': round(self.last_latency * 1000.0, 3) if self.last_latency is not None else None,
+            'ready': self.warmup is not None,
+            'warmup_ms': self.warmup['duration_ms'] if self.warmup is not None else None,
+            'text_cache': self.text_cache
+        }
+
+
+class PredictionPool:
+    """Пул рабочих процессов с общими моделями"""
+
+    STRATEGIES = ('least_loaded', 'round_robin')
+
+    def __init__(self, models, workers=None, strategy='least_loaded', monitor_interval=1.0,
+                 ready_timeout=60.0, call_timeout=30.0):
+        """
+        Args:
+            models: результат predict_advanced.load_models()
+            workers: число процессов (по умолчанию - число CPU)
+            strategy: 'least_loaded' или 'round_robin'
+            monitor_interval: период проверки и перезапуска упавших процессов, сек
+            ready_timeout: максимальное время прогрева процесса, сек
+            call_timeout: максимальное время ответа процесса на задачу, сек
+
+        Raises:
+            RuntimeError: не все процессы прогрелись за ready_timeout
+        """
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            raise RuntimeError('PredictionPool requires the fork start method (Linux/macOS)')
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f'unknown strategy: {strategy}')
+
+        self.size = workers or os.cpu_count() or 1
+        self.strategy = strategy
+        self._lock = threading.Lock()
+        self._round_robin = itertools.cycle(range(self.size))
+        self._closed = False
+
+        # Объекты, созданные до fork, не должны попадать под сборку мусора в
+        # дочерних процессах - иначе страницы с моделями будут скопированы.
+        # gc.unfreeze() при закрытии пула не вызывается: заморозка общая для
+        # процесса, и она снялась бы и с моделей нового пула - перезапущенные
+        # процессы потеряли бы copy-on-write. Мусор прежних моделей собирает
+        # refreeze() после закрытия прежнего пула
+        gc.collect()
+        gc.freeze()
+
+        context = multiprocessing.get_context('fork')
+        self.workers = [_Worker(i, context, models, ready_timeout, call_timeout) for i in range(self.size)]
+        # Процессы прогреваются параллельно, пул готов после прогрева всех
+        for worker in self.workers:
+            worker.start(wait=False)
+        deadline = time.monotonic() + ready_timeout
+        ready = [worker.wait_ready(max(deadline - time.monotonic(), 0.0)) for worker in self.workers]
+        if not all(ready):
+            self._closed = True
+            for worker in self.workers:
+                worker.stop(timeout=0.1)
+            raise RuntimeError(
+                f'prediction pool: {ready.count(False)} of {self.size} workers '
+                f'not ready within {ready_timeout:.1f}s'
+            )
+
+        self._monitor = threading.Thread(
+            target=self._monitor_loop, args=(monitor_interval,),
+            name='prediction-pool-monitor', daemon=True
+        )
+        self._monitor.start()
+
+    def _pick(self):
+        with self._lock:
+            if self.strategy == 'round_robin':
+                worker = self.workers[next(self._round_robin)]
+            else:
+                worker = min(
+                    self.workers,
+                    key=lambda w: (w.in_flight, w.latency_ewma or 0.0)
+                )
+            worker.in_flight += 1
+        return worker
+
+    def _submit(self, task, args):
+        """Задача в одном из рабочих процессов (потокобезопасно)"""
+        if self._closed:
+            raise RuntimeError('prediction pool is closed')
+        worker = self._pick()
+        try:
+            with worker.lock:
+                try:
+                    return worker.call(task, args)
+                except WorkerTimeout as e:
+                    # Повтор завис бы так же - запросы пакета получают ошибку
+                    print(f"Warning: {e}, restarting", file=sys.stderr)
+                    worker.restart()
+                    return _task_error(task, args, e)
+                except WorkerCrashed as e:
+                    # Один повтор на перезапущенном процессе
+                    print(f"Warning: {e}, restarting", file=sys.stderr)
+                    worker.restart()
+                    try:
+                        return worker.call(task, args)
+                    except WorkerCrashed as e:
+                        worker.restart()
+                        return _task_error(task, args, e)
+        finally:
+            with self._lock:
+                worker.in_flight -= 1
+
+    def predict(self, inputs, include_timings=False):
+        """Прогноз для пакета запросов в одном из рабочих процессов"""
+        return self._submit('predict', (inputs, include_timings))
+
+    def what_if(self, input_data, top_k=5):
+        """Сетка вариантов what-if (what_if.py) в одном из рабочих процессов"""
+        return self._submit('what_if', (input_data, top_k))
+
+    def _monitor_loop(self, interval):
+        while not self._closed:
+            time.sleep(interval)
+            for worker in self.workers:
+                if self._closed:
+                    break
+                if worker.process.is_alive() or not worker.lock.acquire(blocking=False):
+                    continue
+                try:
+                    if not self._closed and not worker.process.is_alive():
+                        print(f"Warning: worker {worker.index} died, restarting", file=sys.stderr)
+                        worker.restart()
+                finally:
+                    worker.lock.release()
+
+    def snapshot(self):
+        """Размер пула, глубина очереди и задержки по процессам"""
+        workers = [worker.snapshot() for worker in self.workers]
+        in_flight = sum(w['in_flight'] for w in workers)
+        return {
+            'size': self.size,
+            'strategy': self.strategy,
+            # Пакеты, ожидающие или обрабатываемые процессами пула
+            'queue_depth': max(in_flight - sum(1 for w in workers if w['in_flight'] > 0), 0),
+            'in_flight': in_flight,
+            'workers': workers
+        }
+
+    def close(self):
+        """Остановка всех рабочих процессов"""
+        self._closed = True
+        for worker in self.workers:
+            with worker.lock:
+                worker.stop()
+                # Прежнее поколение моделей освобождается для refreeze()
+                worker.models = None
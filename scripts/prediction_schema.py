@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Схема запроса прогноза и быстрое кодирование JSON
+
+Запрос прогноза (predict_advanced.py, predict.py, prediction_server.py)
+проверяется один раз при разборе: типы полей, отсутствующие поля и null.
+Дальше код прогноза работает с обычным dict, в котором есть только
+переданные клиентом поля (наличие tags/description выбирает расширенную
+модель, поэтому отсутствующие поля не заполняются значениями по умолчанию).
+Неизвестные поля игнорируются, null равнозначен отсутствию поля.
+
+JSON кодируется самой быстрой доступной библиотекой:
+- msgspec: разбор сразу в типизированную структуру с проверкой типов;
+- orjson: быстрый разбор и кодирование, проверка типов - в Python;
+- json стандартной библиотеки, если ни одной из них нет.
+Ответ кодируется компактно (без отступов), dumps(..., pretty=True) -
+с отступами для чтения человеком.
+"""
+
+import math
+from typing import List, Union
+
+import numpy as np
+
+from feature_spec import STANDARD_SPEC
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if msgspec is not None:
+    JSON_BACKEND = 'msgspec'
+elif orjson is not None:
+    JSON_BACKEND = 'orjson'
+else:
+    import json
+    JSON_BACKEND = 'json'
+
+# Поля запроса и допустимые типы значений (bool не считается числом)
+REQUEST_FIELDS = {
+    'tags': List[str],
+    'categories': List[str],
+    'description': str,
+    'category': str,
+    'account_type': str,
+}
+for _name, _kind in STANDARD_SPEC.features:
+    REQUEST_FIELDS[_name] = Union[int, float] if _kind == 'number' else Union[bool, int]
+REQUEST_FIELDS.update({
+    'is_animated': Union[bool, int],
+    'has_textures': Union[bool, int],
+    'has_pbr': Union[bool, int],
+    'is_rigged': Union[bool, int],
+    # Параметры ответа: объяснение (true или число признаков), похожие модели,
+    # бюджет задержки и каскад (predict_advanced.py)
+    'explain': Union[bool, int],
+    'similar_k': int,
+    'latency_budget_ms': Union[int, float],
+    'cascade': bool,
+})
+
+# Проверка типов без msgspec: допустимые классы Python и описание для ошибок
+_PYTHON_TYPES = {
+    List[str]: ((list,), 'array'),
+    str: ((str,), 'str'),
+    int: ((int,), 'int'),
+    bool: ((bool,), 'bool'),
+    Union[int, float]: ((int, float), 'int | float'),
+    Union[bool, int]: ((bool, int), 'bool | int'),
+}
+
+
+class RequestError(ValueError):
+    """Некорректный JSON или запрос, не соответствующий схеме"""
+
+
+def _default(value):
+    """Типы NumPy, которые могут попасть в ответ"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+if msgspec is not None:
+    PredictionRequest = msgspec.defstruct('PredictionRequest', [
+        (name, Union[kind, None, msgspec.UnsetType], msgspec.UNSET)
+        for name, kind in REQUEST_FIELDS.items()
+    ])
+    _REQUESTS = Union[PredictionRequest, List[PredictionRequest]]
+    _encoder = msgspec.json.Encoder(enc_hook=_default)
+    _decoder = msgspec.json.Decoder()
+    _request_decoder = msgspec.json.Decoder(_REQUESTS)
+    _UNSET = msgspec.UNSET
+
+
+def _request_dict(request):
+    """Структура msgspec -> dict только с переданными полями"""
+    values = {}
+    for name in REQUEST_FIELDS:
+        value = getattr(request, name)
+        if value is not _UNSET and value is not None:
+            values[name] = value
+    return values
+
+
+def _check_value(name, value, kind, where):
+    classes, expected = _PYTHON_TYPES[kind]
+    if isinstance(value, bool) and bool not in classes:
+        valid = False
+    else:
+        valid = isinstance(value, classes)
+    if valid and kind == List[str]:
+        for i, item in enumerate(value):
+            if not isinstance(item, str):
+                raise RequestError(
+                    f"Expected `str`, got `{type(item).__name__}` - at `{where}.{name}[{i}]`"
+                )
+    if not valid:
+        raise RequestError(f"Expected `{expected}`, got `{type(value).__name__}` - at `{where}.{name}`")
+    # NaN, Infinity и 1e400 json принимает, а msgspec и orjson - нет
+    if isinstance(value, float) and not math.isfinite(value):
+        raise RequestError(f"Expected a finite number, got `{value}` - at `{where}.{name}`")
+
+
+def _validate(obj, where='$'):
+    """Проверка уже разобранного объекта без msgspec"""
+    if not isinstance(obj, dict):
+        raise RequestError(f"Expected `object`, got `{type(obj).__name__}` - at `{where}`")
+    values = {}
+    for name, kind in REQUEST_FIELDS.items():
+        value = obj.get(name)
+        if value is None:
+            continue
+        _check_value(name, value, kind, where)
+        values[name] = value
+    return values
+
+
+def loads(data):
+    """Разбор JSON (bytes или str) без проверки схемы"""
+    try:
+        if msgspec is not None:
+            return _decoder.decode(data)
+        if orjson is not None:
+            return orjson.loads(data)
+        return json.loads(data)
+    except ValueError as e:
+        # msgspec.DecodeError, orjson.JSONDecodeError и json.JSONDecodeError - подклассы ValueError
+        raise RequestError(f"invalid JSON: {e}") from None
+
+
+def dumps(obj, pretty=False):
+    """Кодирование в JSON (bytes, UTF-8): компактно или с отступами"""
+    if msgspec is not None:
+        encoded = _encoder.encode(obj)
+        return msgspec.json.format(encoded, indent=2) if pretty else encoded
+    if orjson is not None:
+        option = orjson.OPT_INDENT_2 if pretty else 0
+        return orjson.dumps(obj, default=_default, option=option)
+    if pretty:
+        return json.dumps(obj, indent=2, ensure_ascii=False, default=_default).encode('utf-8')
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False, default=_default).encode('utf-8')
+
+
+def parse_request(obj):
+    """
+    Проверка разобранного запроса (dict) по схеме
+
+    Returns:
+        dict только с известными и переданными полями
+    """
+    if msgspec is not None:
+        try:
+            return _request_dict(msgspec.convert(obj, PredictionRequest))
+        except msgspec.ValidationError as e:
+            raise RequestError(str(e)) from None
+    return _validate(obj)
+
+
+def parse_requests(obj):
+    """
+    Проверка запроса или массива запросов
+
+    Returns:
+        (список dict, True если передан массив)
+    """
+    if isinstance(obj, list):
+        return [parse_request(item) for item in obj], True
+    return [parse_request(obj)], False
+
+
+def decode_requests(data):
+    """
+    Разбор и проверка JSON запроса (объект) или пакета (массив) за один проход
+
+    Returns:
+        (список dict, True если передан массив)
+    """
+    if msgspec is None:
+        obj = loads(data)
+        if isinstance(obj, list):
+            return [_validate(item, f'$[{i}]') for i, item in enumerate(obj)], True
+        return [_validate(obj)], False
+    try:
+        decoded = _request_decoder.decode(data)
+    except msgspec.ValidationError as e:
+        raise RequestError(str(e)) from None
+    except msgspec.DecodeError as e:
+        raise RequestError(f"invalid JSON: {e}") from None
+    if isinstance(decoded, list):
+        return [_request_dict(request) for request in decoded], True
+    return [_request_dict(decoded)], False
@@ -0,0 +1,474 @@
+#!/usr/bin/env python3
+"""
+Asyncio сервер прогнозирования поверх predict_advanced.py
+
+Протокол: JSON с префиксом длины (4 байта, big-endian) через Unix сокет
+или TCP. Одно соединение может отправлять запросы последовательно.
+
+Сообщение:
+    {"op": "predict", "data": {...}}  - прогноз (как predict_advanced.py)
+    {"op": "predict", "data": [...]}  - пакет запросов, ответ - массив
+    {"op": "health"}                  - состояние сервера
+    {"op": "metrics"}                 - гистограммы этапов в формате Prometheus
+    {"op": "importances"}             - глобальные важности признаков по версиям моделей
+    {"op": "shadow"}                  - теневая оценка кандидата и решение о переключении
+    {"op": "promote", "force": false} - переключение на кандидата после проверки (shadow.py)
+    {"op": "what_if", "data": {...}, "top_k": 5} - лучшие изменения модели (what_if.py)
+    {...}                             - без "op" трактуется как данные прогноза
+
+Возможности:
+- ограниченная очередь запросов (при переполнении - ответ "overloaded")
+- объединение параллельных запросов в один вызов model.predict
+  (окно ожидания подстраивается под целевую задержку, см. batching.py)
+- пул рабочих процессов с общими моделями (--workers, см. prediction_pool.py)
+- корректное завершение по SIGTERM/SIGINT с обработкой уже принятых запросов
+- перезагрузка моделей при переключении версии в реестре (--reload-interval,
+  проверяется только указатель CURRENT, см. model_registry.py)
+- прогрев синтетическими запросами при запуске и перед подменой моделей
+  (warmup.py): health отвечает "warming", принятые запросы ждут в очереди
+- проверка запросов по схеме и быстрый JSON (prediction_schema.py)
+- теневая оценка версии-кандидата реестра на доле запросов (--shadow-rate,
+  фоновый поток, см. shadow.py)
+- what-if (сетка ~500 вариантов) - не больше --max-what-if одновременно,
+  сверх лимита ответ "overloaded"; с пулом сетка считается в рабочем процессе
+"""
+
+import argparse
+import asyncio
+import os
+import signal
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from predict_advanced import load_models, predict_batch, global_importances, registry_versions, REGISTRY
+from model_registry import RegistryWatcher, CANDIDATE
+from text_cache import cache_stats
+from batching import AdaptiveBatcher
+from prediction_pool import PredictionPool, refreeze, register_parent_fd, unregister_parent_fd
+from warmup import warm_up
+from shadow import SHADOWED, ShadowEvaluator, load_candidate
+from profiling import StageHistograms, profiling_enabled
+from prediction_schema import RequestError, dumps, loads, parse_request, parse_requests
+from what_if import what_if
+
+HEADER = struct.Struct('>I')
+MAX_MESSAGE_SIZE = 16 * 1024 * 1024
+
+
+async def read_message(reader):
+    """Чтение одного сообщения; None при закрытии соединения"""
+    try:
+        header = await reader.readexactly(HEADER.size)
+    except asyncio.IncompleteReadError:
+        return None
+    (length,) = HEADER.unpack(header)
+    if length > MAX_MESSAGE_SIZE:
+        raise ValueError(f"message too large: {length} bytes")
+    payload = await reader.readexactly(length)
+    return loads(payload)
+
+
+def encode_message(message):
+    """Кодирование сообщения с префиксом длины"""
+    payload = dumps(message)
+    return HEADER.pack(len(payload)) + payload
+
+
+class PredictionServer:
+    """Сервер с очередью и адаптивной пакетной обработкой запросов"""
+
+    def __init__(self, models, max_queue=256, max_batch=32, batch_wait_ms=5.0,
+                 latency_slo_ms=50.0, pool=None, profile=False, pool_factory=None, shadow_rate=0.0,
+                 max_what_if=2):
+        self.models = models
+        self.pool = pool
+        # Создание пула для новых моделей при перезагрузке
+        self.pool_factory = pool_factory
+        # Этапы замеряются всегда (для гистограмм), в ответ попадают только при profile
+        self.profile = profile
+        self.histograms = StageHistograms()
+        self.batcher = AdaptiveBatcher(
+            self._process_batch,
+            max_batch=max_batch,
+            max_queue=max_queue,
+            latency_slo_ms=latency_slo_ms,
+            max_wait_ms=batch_wait_ms,
+            initial_wait_ms=batch_wait_ms / 2.0,
+            concurrency=pool.size if pool else 1
+        )
+        self.started_at = time.time()
+        self.stats = {'requests': 0, 'rejected': 0, 'reloads': 0, 'what_if': 0}
+        # Ограничение одновременных what-if: сетка не проходит через очередь прогнозов
+        self.max_what_if = max_what_if
+        self._what_if_active = 0
+        self.warmup = None
+        # Теневая оценка кандидата (None - кандидата нет или отключена)
+        self.shadow_rate = shadow_rate
+        self.shadow = None
+        self._ready = False
+        self._server = None
+        self._closing = False
+
+    def _process_batch(self, inputs):
+        started = time.perf_counter()
+        pool = self.pool
+        if pool is not None:
+            try:
+                results = pool.predict(inputs, include_timings=True)
+            except RuntimeError:
+                # Пул закрыт при перезагрузке моделей - повтор на новом пуле
+                results = self.pool.predict(inputs, include_timings=True)
+        else:
+            results = predict_batch(inputs, self.models, include_timings=True)
+        self.histograms.observe('batch_total', time.perf_counter() - started)
+        shadow = self.shadow
+        if shadow is not None:
+            shadow.offer(inputs, self.models)
+
+        timings = next((r['timings_ms'] for r in results if 'timings_ms' in r), {})
+        for name, ms in timings.items():
+            self.histograms.observe(name, ms / 1000.0)
+        if not self.profile:
+            for result in results:
+                result.pop('timings_ms', None)
+                result.pop('batch_size', None)
+        return results
+
+    async def start(self, socket_path=None, host=None, port=None):
+        """Запуск сервера; обработчик очереди стартует после прогрева (warm_up)"""
+        if self._ready:
+            self.batcher.start()
+        if socket_path:
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+            self._server = await asyncio.start_unix_server(
+                self._handle_client, path=socket_path, backlog=1024
+            )
+        else:
+            self._server = await asyncio.start_server(
+                self._handle_client, host=host, port=port, backlog=1024
+            )
+        # Рабочие процессы пулов, созданных после запуска (перезагрузка), закрывают слушающий сокет
+        for sock in self._server.sockets:
+            register_parent_fd(sock.fileno())
+
+    async def warm_up(self):
+        """Прогрев моделей; после него сервер готов и начинает обрабатывать очередь"""
+        loop = asyncio.get_running_loop()
+        if self.pool is None:
+            self.warmup = await loop.run_in_executor(None, warm_up, self.models)
+        else:
+            # Рабочие процессы прогреваются сами при создании пула
+            self.warmup = {'workers': [worker.warmup for worker in self.pool.workers]}
+        self._ready = True
+        self.batcher.start()
+        print(f"Warm-up done: {self.warmup}", file=sys.stderr)
+
+    async def shutdown(self):
+        """Корректное завершение: перестаем принимать, дорабатываем очередь"""
+        if self._closing:
+            return
+        self._closing = True
+        for sock in self._server.sockets:
+            unregister_parent_fd(sock.fileno())
+        self._server.close()
+        await self._server.wait_closed()
+        # Запросы, принятые во время прогрева, тоже обрабатываются
+        self.batcher.start()
+        await self.batcher.stop()
+        if self.shadow is not None:
+            self.shadow.close()
+        if self.pool is not None:
+            self.pool.close()
+
+    async def reload(self):
+        """Загрузка текущих версий моделей и замена без остановки приема запросов"""
+        loop = asyncio.get_running_loop()
+        models = await loop.run_in_executor(None, load_models)
+        # Новые модели прогреваются до подмены: первые запросы после перезагрузки без всплесков
+        old_pool = self.pool
+        if old_pool is not None and self.pool_factory is not None:
+            self.pool = await loop.run_in_executor(None, self.pool_factory, models)
+            self.warmup = {'workers': [worker.warmup for worker in self.pool.workers]}
+        else:
+            self.warmup = await loop.run_in_executor(None, warm_up, models)
+        self.models = models
+        self.stats['reloads'] += 1
+        if old_pool is not None and old_pool is not self.pool:
+            await loop.run_in_executor(None, old_pool.close)
+            del old_pool
+            # Прежние модели больше не нужны: замороженное поколение собирается заново
+            await loop.run_in_executor(None, refreeze)
+        print(f"Models reloaded: {registry_versions(models)}", file=sys.stderr)
+        # Сравнение шло с прежними моделями - начинается заново
+        await self.load_shadow()
+
+    async def load_shadow(self):
+        """Запуск (или перезапуск) теневой оценки для текущих кандидатов реестра"""
+        if self.shadow_rate <= 0:
+            return
+        loop = asyncio.get_running_loop()
+        candidate_models, versions = await loop.run_in_executor(None, load_candidate)
+        old_shadow = self.shadow
+        self.shadow = (
+            ShadowEvaluator(candidate_models, versions, sample_rate=self.shadow_rate)
+            if candidate_models is not None else None
+        )
+        if old_shadow is not None:
+            await loop.run_in_executor(None, old_shadow.close)
+        if versions:
+            print(f"Shadow evaluation of candidates: {versions}", file=sys.stderr)
+
+    async def watch_registry(self, interval):
+        """Периодическая проверка указателей CURRENT и CANDIDATE реестра"""
+        watcher = RegistryWatcher(REGISTRY, ['standard', 'advanced'])
+        candidates = RegistryWatcher(REGISTRY, SHADOWED, pointer=CANDIDATE)
+        while not self._closing:
+            await asyncio.sleep(interval)
+            if self._closing:
+                break
+            changed = watcher.changed()
+            candidates_changed = candidates.changed()
+            if changed:
+                print(f"Registry promotion detected: {', '.join(changed)}", file=sys.stderr)
+                try:
+                    await self.reload()
+                except Exception as e:
+                    print(f"Warning: model reload failed: {e}", file=sys.stderr)
+            elif candidates_changed:
+                print(f"Registry candidate changed: {', '.join(candidates_changed)}", file=sys.stderr)
+                try:
+                    await self.load_shadow()
+                except Exception as e:
+                    print(f"Warning: candidate load failed: {e}", file=sys.stderr)
+
+    def shadow_decision(self):
+        """Результат теневой оценки и решение о переключении на кандидата"""
+        if self.shadow is None:
+            return {'promote': False, 'reasons': ['нет модели-кандидата на теневой оценке'], 'report': None}
+        return self.shadow.gate()
+
+    async def promote_candidate(self, force=False):
+        """
+        Переключение реестра на кандидата; отказ, если проверка не пройдена (без force).
+        Новые модели загружает watch_registry по смене указателя CURRENT.
+        """
+        shadow = self.shadow
+        if shadow is None:
+            return {'promote': False, 'promoted': {}, 'reasons': ['нет модели-кандидата на теневой оценке']}
+        decision = shadow.promote(REGISTRY, force=force)
+        if decision['promoted']:
+            print(f"Candidate promoted: {decision['promoted']}", file=sys.stderr)
+            self.shadow = None
+            await asyncio.get_running_loop().run_in_executor(None, shadow.close)
+        return decision
+
+    async def what_if(self, data, top_k=5):
+        """
+        Сетка вариантов запроса (what_if.py): в рабочем процессе пула или в потоке
+        сервера; сверх max_what_if одновременных запросов - "overloaded"
+        """
+        if self._closing:
+            return {'error': 'shutting down'}
+        if not isinstance(top_k, int) or isinstance(top_k, bool) or top_k < 1:
+            return {'error': 'invalid request: top_k must be a positive integer'}
+        try:
+            input_data = parse_request(data)
+        except RequestError as e:
+            return {'error': f'invalid request: {e}'}
+        if self._what_if_active >= self.max_what_if:
+            self.stats['rejected'] += 1
+            return {'error': 'overloaded'}
+        self._what_if_active += 1
+        self.stats['what_if'] += 1
+        loop = asyncio.get_running_loop()
+        try:
+            pool = self.pool
+            if pool is None:
+                return await loop.run_in_executor(None, what_if, input_data, self.models, top_k)
+            try:
+                return await loop.run_in_executor(None, pool.what_if, input_data, top_k)
+            except RuntimeError:
+                # Пул закрыт при перезагрузке моделей - повтор на новом пуле
+                return await loop.run_in_executor(None, self.pool.what_if, input_data, top_k)
+        finally:
+            self._what_if_active -= 1
+
+    def health(self):
+        """Состояние сервера"""
+        return {
+            'status': 'closing' if self._closing else 'ready' if self._ready else 'warming',
+            'uptime_seconds': round(time.time() - self.started_at, 3),
+            'models': {name: model is not None for name, model in self.models.items()},
+            'versions': registry_versions(self.models),
+            'stats': dict(self.stats),
+            'what_if': {'active': self._what_if_active, 'max': self.max_what_if},
+            'warmup': self.warmup,
+            'shadow': self.shadow.snapshot() if self.shadow is not None else None,
+            'batching': self.batcher.snapshot(),
+            'pool': self.pool.snapshot() if self.pool is not None else None,
+            # С пулом процессов кеши у каждого процесса свои (см. pool.workers)
+            'text_cache': cache_stats() if self.pool is None else None
+        }
+
+    def metrics(self):
+        """Метрики в текстовом формате Prometheus"""
+        batching = self.batcher.snapshot()
+        lines = [
+            '# TYPE sketchfab_prediction_requests_total counter',
+            f"sketchfab_prediction_requests_total {self.stats['requests']}",
+            '# TYPE sketchfab_prediction_rejected_total counter',
+            f"sketchfab_prediction_rejected_total {self.stats['rejected']}",
+            '# TYPE sketchfab_prediction_queue_depth gauge',
+            f"sketchfab_prediction_queue_depth {batching['queue_depth']}",
+            '# TYPE sketchfab_prediction_batch_wait_ms gauge',
+            f"sketchfab_prediction_batch_wait_ms {batching['batch_wait_ms']}",
+            '# TYPE sketchfab_what_if_in_flight gauge',
+            f"sketchfab_what_if_in_flight {self._what_if_active}",
+        ]
+        return '\n'.join(lines) + '\n' + self.histograms.render_prometheus()
+
+    async def submit(self, input_data):
+        """Постановка запроса в очередь; ошибка при переполнении"""
+        if self._closing:
+            return {'error': 'shutting down'}
+        try:
+            future = self.batcher.enqueue(input_data)
+        except asyncio.QueueFull:
+            self.stats['rejected'] += 1
+            return {'error': 'overloaded'}
+        self.stats['requests'] += 1
+        return await future
+
+    async def _handle_client(self, reader, writer):
+        try:
+            while True:
+                try:
+                    message = await read_message(reader)
+                except ValueError as e:
+                    writer.write(encode_message({'error': f'invalid message: {e}'}))
+                    await writer.drain()
+                    break
+                if message is None:
+                    break
+                writer.write(encode_message(await self._dispatch(message)))
+                await writer.drain()
+        except (ConnectionResetError, BrokenPipeError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, message):
+        if not isinstance(message, dict):
+            return {'error': 'message must be a JSON object'}
+        op = message.get('op', 'predict')
+        if op == 'health':
+            return self.health()
+        if op == 'metrics':
+            return {'content_type': 'text/plain; version=0.0.4', 'metrics': self.metrics()}
+        if op == 'importances':
+            return global_importances(self.models)
+        if op == 'shadow':
+            return self.shadow_decision()
+        if op == 'promote':
+            return await self.promote_candidate(force=bool(message.get('force', False)))
+        if op == 'what_if':
+            return await self.what_if(message.get('data', {}), top_k=message.get('top_k', 5))
+        if op == 'predict':
+            try:
+                inputs, is_batch = parse_requests(message.get('data', message))
+            except RequestError as e:
+                return {'error': f'invalid request: {e}'}
+            if is_batch:
+                return await asyncio.gather(*(self.submit(input_data) for input_data in inputs))
+            return await self.submit(inputs[0])
+        return {'error': f'unknown op: {op}'}
+
+
+async def serve(args):
+    models = load_models()
+    # Рабочие процессы создаются после загрузки моделей и до запуска event loop потоков
+    def pool_factory(loaded):
+        return PredictionPool(loaded, workers=args.workers, strategy=args.strategy,
+                              ready_timeout=args.worker_ready_timeout,
+                              call_timeout=args.worker_call_timeout)
+
+    pool = pool_factory(models) if args.workers else None
+    server = PredictionServer(
+        models,
+        max_queue=args.max_queue,
+        max_batch=args.max_batch,
+        batch_wait_ms=args.batch_wait_ms,
+        latency_slo_ms=args.latency_slo_ms,
+        pool=pool,
+        profile=args.profile or profiling_enabled(),
+        pool_factory=pool_factory if args.workers else None,
+        shadow_rate=args.shadow_rate,
+        max_what_if=args.max_what_if
+    )
+    await server.start(socket_path=args.socket, host=args.host, port=args.port)
+    await server.warm_up()
+    await server.load_shadow()
+    watcher = None
+    if args.reload_interval > 0:
+        watcher = asyncio.create_task(server.watch_registry(args.reload_interval))
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    where = args.socket or f"{args.host}:{args.port}"
+    print(f"Prediction server listening on {where}", file=sys.stderr)
+    await stop.wait()
+
+    print("Shutting down, draining queue...", file=sys.stderr)
+    if watcher is not None:
+        watcher.cancel()
+    await server.shutdown()
+    if args.socket and os.path.exists(args.socket):
+        os.unlink(args.socket)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Asyncio сервер прогнозирования популярности')
+    parser.add_argument('--socket', default=None,
+                        help='путь к Unix сокету (по умолчанию /tmp/sketchfab-predict.sock)')
+    parser.add_argument('--host', default=None, help='TCP хост (вместо Unix сокета)')
+    parser.add_argument('--port', type=int, default=None, help='TCP порт (вместо Unix сокета)')
+    parser.add_argument('--max-queue', type=int, default=256, help='максимальная длина очереди')
+    parser.add_argument('--max-batch', type=int, default=32, help='максимальный размер пакета')
+    parser.add_argument('--batch-wait-ms', type=float, default=5.0,
+                        help='максимальное окно добора пакета, мс (подстраивается под SLO)')
+    parser.add_argument('--latency-slo-ms', type=float, default=50.0,
+                        help='целевой p95 задержки запроса, мс')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='число рабочих процессов (0 - прогноз в процессе сервера)')
+    parser.add_argument('--strategy', choices=PredictionPool.STRATEGIES, default='least_loaded',
+                        help='распределение пакетов по рабочим процессам')
+    parser.add_argument('--worker-ready-timeout', type=float, default=60.0,
+                        help='максимальное время прогрева рабочего процесса, сек '
+                             '(зависший процесс завершается, перезагрузка оставляет прежний пул)')
+    parser.add_argument('--worker-call-timeout', type=float, default=30.0,
+                        help='максимальное время ответа рабочего процесса на пакет, сек '
+                             '(зависший процесс перезапускается, запросы пакета получают ошибку)')
+    parser.add_argument('--max-what-if', type=int, default=2,
+                        help='максимум одновременных what-if запросов (сверх лимита - overloaded)')
+    parser.add_argument('--profile', action='store_true',
+                        help='добавлять timings_ms в ответы (также PREDICT_PROFILE=1)')
+    parser.add_argument('--shadow-rate', type=float, default=0.05,
+                        help='доля запросов для теневой оценки модели-кандидата (0 - отключить)')
+    parser.add_argument('--reload-interval', type=float, default=5.0,
+                        help='период проверки новой версии моделей в реестре, сек (0 - отключить)')
+    args = parser.parse_args(argv)
+    if args.port is None and args.socket is None:
+        args.socket = '/tmp/sketchfab-predict.sock'
+    if args.port is not None and args.host is None:
+        args.host = '127.0.0.1'
+    return args
+
+
+if __name__ == "__main__":
+    asyncio.run(serve(parse_args()))
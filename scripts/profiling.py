@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Инструменты профилирования пути прогнозирования
+
+- StageTimer: длительности этапов (загрузка моделей, признаки,
+  scaler.transform, tfidf.transform, model.predict, рейтинг качества)
+- StageHistograms: агрегированные гистограммы в формате Prometheus
+- profile_call: дамп cProfile/pyinstrument для одного вызова
+
+Включение:
+    PREDICT_PROFILE=1            - добавить timings_ms в JSON ответ
+    PREDICT_PROFILE_DUMP=путь    - сохранить профиль вызова в файл
+    PREDICT_PROFILER=pyinstrument - использовать pyinstrument вместо cProfile
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# Границы бакетов гистограмм, секунды
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def env_flag(name):
+    """Переменная окружения как флаг"""
+    return os.environ.get(name, '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def profiling_enabled():
+    return env_flag('PREDICT_PROFILE')
+
+
+class StageTimer:
+    """Накопитель длительностей этапов для одного запроса или пакета"""
+
+    def __init__(self, histograms=None):
+        self.durations = {}
+        self.histograms = histograms
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.durations[name] = self.durations.get(name, 0.0) + elapsed
+            if self.histograms is not None:
+                self.histograms.observe(name, elapsed)
+
+    def as_ms(self):
+        """Длительности этапов в миллисекундах"""
+        return {name: round(seconds * 1000.0, 3) for name, seconds in self.durations.items()}
+
+
+def stage(timer, name):
+    """Контекст этапа; без таймера ничего не измеряет"""
+    return timer.stage(name) if timer is not None else nullcontext()
+
+
+class StageHistograms:
+    """Гистограммы длительностей этапов (потокобезопасно)"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, metric='sketchfab_prediction_stage_seconds'):
+        self.buckets = tuple(buckets)
+        self.metric = metric
+        self._lock = threading.Lock()
+        self._counts = {}
+        self._sums = {}
+
+    def observe(self, name, seconds):
+        with self._lock:
+            counts = self._counts.get(name)
+            if counts is None:
+                counts = self._counts[name] = [0] * (len(self.buckets) + 1)
+                self._sums[name] = 0.0
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            self._sums[name] += seconds
+
+    def render_prometheus(self):
+        """Текстовый формат экспозиции Prometheus"""
+        lines = [
+            f'# HELP {self.metric} Duration of prediction path stages.',
+            f'# TYPE {self.metric} histogram'
+        ]
+        with self._lock:
+            for name in sorted(self._counts):
+                cumulative = 0
+                for bound, count in zip(self.buckets, self._counts[name]):
+                    cumulative += count
+                    lines.append(f'{self.metric}_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+                cumulative += self._counts[name][-1]
+                lines.append(f'{self.metric}_bucket{{stage="{name}",le="+Inf"}} {cumulative}')
+                lines.append(f'{self.metric}_sum{{stage="{name}"}} {self._sums[name]:.6f}')
+                lines.append(f'{self.metric}_count{{stage="{name}"}} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+def profile_call(func, dump_path, *args, **kwargs):
+    """
+    Вызов func под профилировщиком с сохранением результата в dump_path.
+    PREDICT_PROFILER=pyinstrument - HTML отчет pyinstrument (если установлен),
+    иначе - статистика cProfile (pstats).
+    """
+    if os.environ.get('PREDICT_PROFILER', 'cprofile').lower() == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            Profiler = None
+        if Profiler is not None:
+            profiler = Profiler()
+            profiler.start()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.stop()
+                with open(dump_path, 'w', encoding='utf-8') as f:
+                    f.write(profiler.output_html())
+
+    import cProfile
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args, **kwargs)
+    finally:
+        profiler.dump_stats(dump_path)
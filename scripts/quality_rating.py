@@ -7,6 +7,12 @@
 import re
 import numpy as np
 
+# Шаблоны оценки описания (компилируются один раз при импорте)
+_PUNCTUATION = re.compile(r'[.!?;:]')
+_LIST_MARKERS = re.compile(r'[-*•\n]')
+_DIGITS = re.compile(r'\d+')
+_WORDS = re.compile(r'\b\w+\b')
+
 class QualityRater:
     """Оценивает качество модели для Sketchfab"""
     
@@ -30,6 +36,16 @@ class QualityRater:
             'prop': ['prop', 'asset', 'object', '3d', 'model']
         }
         
+        # Рекомендованный тег засчитывается, если входит в тег как подстрока (точное
+        # совпадение - частный случай): все теги категории ищутся одним регулярным выражением
+        self.recommended_tag_patterns = {
+            cat_key: re.compile('|'.join(re.escape(tag) for tag in cat_tags))
+            for cat_key, cat_tags in self.recommended_tags.items()
+        }
+        # Множества для O(1) проверок вхождения
+        self.generic_tags = frozenset(['3d', 'model', 'object', 'asset'])
+        self.popular_tags = frozenset(['pbr', 'lowpoly', 'game', 'realtime', 'blender', 'maya'])
+        
     def calculate_quality_score(self, model_data):
         """
         Вычисляет общий рейтинг качества модели (0-100%)
@@ -124,20 +140,20 @@ class QualityRater:
         score += min(found_keywords * 5, 25)
         
         # Структурированность (наличие пунктуации, списков)
-        has_punctuation = bool(re.search(r'[.!?;:]', description))
-        has_lists = bool(re.search(r'[-*•\n]', description))
+        has_punctuation = bool(_PUNCTUATION.search(description))
+        has_lists = bool(_LIST_MARKERS.search(description))
         if has_punctuation:
             score += 15
         if has_lists:
             score += 10
         
         # Наличие технических деталей (числа, измерения)
-        has_numbers = bool(re.search(r'\d+', description))
+        has_numbers = bool(_DIGITS.search(description))
         if has_numbers:
             score += 10
         
         # Разнообразие слов
-        words = re.findall(r'\b\w+\b', description.lower())
+        words = _WORDS.findall(description.lower())
         unique_ratio = len(set(words)) / max(len(words), 1)
         if unique_ratio > 0.7:
             score += 10
@@ -162,30 +178,33 @@ class QualityRater:
             score += 10
         
         # Релевантность категории
-        recommended = []
-        for cat_key, cat_tags in self.recommended_tags.items():
+        pattern = None
+        for cat_key in self.recommended_tags:
             if cat_key in category.lower():
-                recommended = cat_tags
+                pattern = self.recommended_tag_patterns[cat_key]
                 break
         
-        if not recommended:
-            recommended = self.recommended_tags.get('prop', [])
+        if pattern is None:
+            pattern = self.recommended_tag_patterns['prop']
         
-        matching_tags = sum(1 for tag in tags_lower if any(rec in tag for rec in recommended))
+        # Один вызов search на тег вместо цикла Python по рекомендованным тегам. Сложность
+        # не меньше: re (с возвратами) на каждой позиции тега пробует альтернативы по очереди,
+        # т.е. O(длина тега x суммарная длина шаблонов) - выигрыш только в накладных расходах
+        # интерпретатора. Точный поиск по ID словаря тегов (TagVocabulary) не подходит:
+        # рекомендованный тег засчитывается и как подстрока ('supercar' содержит 'car')
+        matching_tags = sum(1 for tag in tags_lower if pattern.search(tag))
         relevance_score = min(matching_tags * 10, 40)
         score += relevance_score
         
         # Специфичность (не только общие теги)
-        generic_tags = ['3d', 'model', 'object', 'asset']
-        specific_tags = sum(1 for tag in tags_lower if tag not in generic_tags)
+        specific_tags = sum(1 for tag in tags_lower if tag not in self.generic_tags)
         if specific_tags >= 5:
             score += 20
         elif specific_tags >= 3:
             score += 10
         
         # Популярные теги Sketchfab
-        popular_tags = ['pbr', 'lowpoly', 'game', 'realtime', 'blender', 'maya']
-        has_popular = any(tag in tags_lower for tag in popular_tags)
+        has_popular = not self.popular_tags.isdisjoint(tags_lower)
         if has_popular:
             score += 10
         
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Отчет о запуске обучения: время и память по этапам, пропускная способность,
+размеры артефактов
+
+Отчет пишется рядом с model_metrics*.json, краткая запись добавляется
+в models/training_history.jsonl (для трендов в /api/model-info).
+Пиковый RSS (ru_maxrss) - максимум за весь процесс, поэтому по этапам
+записывается его рост за этап (peak_rss_growth_mb: сколько этап добавил к
+максимуму, 0 - этап не превысил предыдущие) и накопленное значение с явным
+именем process_peak_rss_mb. TRAIN_TRACEMALLOC=1 дополнительно включает
+пиковую память Python-кучи каждого этапа (tracemalloc замедляет обучение,
+поэтому выключен по умолчанию).
+"""
+
+import json
+import os
+import platform
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_mb():
+    """Пиковый RSS процесса в МБ (None, если недоступно)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux - килобайты, macOS - байты
+    if platform.system() == 'Darwin':
+        return round(peak / (1024.0 * 1024.0), 2)
+    return round(peak / 1024.0, 2)
+
+
+def report_stage(report, name, rows=None):
+    """Этап отчета; без отчета ничего не измеряет"""
+    return report.stage(name, rows) if report is not None else nullcontext({})
+
+
+class RunReport:
+    """Сбор метрик запуска обучения по этапам"""
+
+    def __init__(self, name, trace_memory=None):
+        self.name = name
+        self.started_at = datetime.now()
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        self.stages = []
+        self.artifacts = {}
+        self.info = {}
+        if trace_memory is None:
+            trace_memory = os.environ.get('TRAIN_TRACEMALLOC', '').lower() in ('1', 'true', 'yes')
+        self.trace_memory = trace_memory
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        """
+        Замер этапа: wall/CPU время, рост пиковой памяти, строк в секунду.
+        Возвращает dict, в котором можно задать 'rows', если число строк
+        известно только после этапа (например, после загрузки).
+        """
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        extra = {}
+        peak_before = peak_rss_mb()
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield extra
+        finally:
+            rows = extra.get('rows', rows)
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() - cpu
+            peak_after = peak_rss_mb()
+            record = {
+                'stage': name,
+                'wall_seconds': round(wall, 4),
+                'cpu_seconds': round(cpu, 4),
+                'peak_rss_growth_mb': (
+                    round(peak_after - peak_before, 2) if peak_after is not None else None
+                ),
+                'process_peak_rss_mb': peak_after
+            }
+            if rows is not None:
+                record['rows'] = int(rows)
+                record['rows_per_second'] = round(rows / wall, 2) if wall > 0 else None
+            if self.trace_memory:
+                record['python_peak_mb'] = round(tracemalloc.get_traced_memory()[1] / (1024.0 * 1024.0), 2)
+            self.stages.append(record)
+
+    def add_artifact(self, path):
+        """Размер сохраненного артефакта"""
+        if os.path.exists(path):
+            self.artifacts[path] = os.path.getsize(path)
+
+    def set(self, key, value):
+        self.info[key] = value
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'started_at': self.started_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'total_wall_seconds': round(time.perf_counter() - self._wall_start, 4),
+            'total_cpu_seconds': round(time.process_time() - self._cpu_start, 4),
+            'peak_rss_mb': peak_rss_mb(),
+            'stages': self.stages,
+            'artifacts_bytes': self.artifacts,
+            'info': self.info
+        }
+
+    def write(self, path, history_path='models/training_history.jsonl'):
+        """Сохранение отчета и добавление краткой записи в историю"""
+        report = self.to_dict()
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+        if history_path:
+            summary = {
+                'name': report['name'],
+                'started_at': report['started_at'],
+                'total_wall_seconds': report['total_wall_seconds'],
+                'peak_rss_mb': report['peak_rss_mb'],
+                'artifacts_bytes': sum(report['artifacts_bytes'].values()),
+                'stages': {s['stage']: s['wall_seconds'] for s in report['stages']}
+            }
+            summary.update({k: v for k, v in report['info'].items() if isinstance(v, (int, float, str))})
+            with open(history_path, 'a') as f:
+                f.write(json.dumps(summary) + '\n')
+        return report
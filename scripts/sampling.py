@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Представительная выборка каталога для быстрых запусков обучения
+
+Вместо первых N записей файла (порядок сбора смещает выборку) записи
+читаются потоково (json_stream.py) и раскладываются по слоям: категория
+популярности x основная категория модели. Первый проход считает размеры
+слоев, и каждый слой получает долю выборки пропорционально своему размеру;
+второй проход ведет в каждом слое reservoir sampling (алгоритм R) на эту
+долю. В памяти не больше limit записей (и счетчики слоев) независимо от
+размера файла и числа слоев; при одинаковом seed выборка воспроизводима.
+"""
+
+import random
+from collections import Counter
+
+from json_stream import iter_json_records
+from feature_spec import calculate_popularity
+
+# Границы категорий популярности (как categorize_score в predict_advanced.py)
+POPULARITY_EDGES = (5.0, 8.0)
+POPULARITY_BUCKETS = ('low', 'medium', 'high')
+
+
+def popularity_bucket(record):
+    """Категория популярности записи каталога"""
+    score = calculate_popularity(
+        record.get('viewCount', 0), record.get('likeCount', 0),
+        record.get('downloadCount', 0), record.get('faceCount', 0)
+    )
+    return POPULARITY_BUCKETS[sum(score >= edge for edge in POPULARITY_EDGES)]
+
+
+def primary_category(record):
+    """Первая категория записи ('' - без категории)"""
+    categories = record.get('categories')
+    return str(categories[0]) if isinstance(categories, list) and categories else ''
+
+
+def record_stratum(record):
+    return popularity_bucket(record), primary_category(record)
+
+
+def count_strata(records):
+    """Размеры слоев (первый проход: в памяти только счетчики)"""
+    return Counter(record_stratum(record) for record in records)
+
+
+def proportional_allocation(counts, limit):
+    """Размер выборки по слоям: пропорционально размеру слоя (метод наибольших остатков)"""
+    total = sum(counts.values())
+    if total <= limit:
+        return dict(counts)
+    quotas = {key: limit * count / total for key, count in counts.items()}
+    allocation = {key: int(quota) for key, quota in quotas.items()}
+    remainder = limit - sum(allocation.values())
+    for key in sorted(quotas, key=lambda k: (allocation[k] - quotas[k], str(k)))[:remainder]:
+        allocation[key] += 1
+    return allocation
+
+
+class StratifiedReservoir:
+    """
+    Reservoir sampling по слоям с заранее известными размерами слоев
+
+    Емкость слоя - его доля выборки (proportional_allocation), поэтому
+    в памяти одновременно не больше limit записей при любом числе слоев.
+    """
+
+    def __init__(self, limit, counts, seed=42):
+        self.limit = limit
+        self.counts = counts
+        self.capacity = proportional_allocation(counts, limit)
+        self.rng = random.Random(seed)
+        self.reservoirs = {}
+        self.stratum_seen = Counter()
+        self.seen = 0
+        self.retained = 0
+
+    def add(self, record):
+        key = record_stratum(record)
+        capacity = self.capacity.get(key, 0)
+        self.stratum_seen[key] += 1
+        self.seen += 1
+        if not capacity:
+            return
+        reservoir = self.reservoirs.setdefault(key, [])
+        if len(reservoir) < capacity:
+            reservoir.append((self.seen, record))
+            self.retained += 1
+        else:
+            # Запись заменяет случайный слот с вероятностью емкость / просмотрено в слое
+            slot = self.rng.randrange(self.stratum_seen[key])
+            if slot < capacity:
+                reservoir[slot] = (self.seen, record)
+
+    def sample(self):
+        """Выбранные записи в порядке исходного файла"""
+        chosen = [item for reservoir in self.reservoirs.values() for item in reservoir]
+        chosen.sort(key=lambda item: item[0])
+        return [record for _, record in chosen]
+
+    def summary(self):
+        by_bucket = Counter()
+        for (bucket, _), count in self.counts.items():
+            by_bucket[bucket] += count
+        return {
+            'limit': self.limit,
+            'seen': self.seen,
+            'strata': len(self.counts),
+            'popularity_buckets': dict(by_bucket)
+        }
+
+
+def sample_records(filename, limit, seed=42):
+    """
+    Стратифицированная выборка limit записей из JSON файла каталога
+
+    Returns:
+        (список записей, сводка выборки)
+    """
+    counts = count_strata(iter_json_records(filename))
+    sampler = StratifiedReservoir(limit, counts, seed=seed)
+    for record in iter_json_records(filename):
+        sampler.add(record)
+    records = sampler.sample()
+    summary = sampler.summary()
+    summary['sampled'] = len(records)
+    summary['seed'] = seed
+    return records, summary
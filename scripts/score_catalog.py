@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+Пересчет прогнозов для всего каталога (ночной пакетный запуск)
+
+Каталог (data/raw_models.json, JSON массив или JSON Lines) читается потоково,
+записи группируются в пакеты и оцениваются в пуле процессов теми же моделями
+и кодом, что и predict_advanced.py (модели загружаются один раз и наследуются
+процессами при fork). Результаты - популярность, интервал и рейтинг качества
+на каждую модель - дописываются в JSONL по порядку пакетов.
+
+После каждого записанного пакета атомарно обновляется файл контрольной точки
+<output>.checkpoint.json (число обработанных записей и размер вывода).
+Прерванный запуск продолжается с места остановки: недописанный хвост вывода
+отбрасывается, уже оцененные записи пропускаются. Продолжение возможно только
+с теми же входными данными и версиями моделей; если вывод удален или короче
+записанного в контрольной точке, оценка начинается с первой записи.
+
+Для вывода в Parquet (--output *.parquet, нужен pyarrow) результаты сначала
+пишутся в <output>.jsonl, а по окончании переводятся в Parquet. Запуск
+считается завершенным только после записи Parquet файла.
+
+Использование:
+    python scripts/score_catalog.py
+    python scripts/score_catalog.py --input data/raw_models.json --output data/catalog_scores.jsonl \\
+        --chunk-size 1000 --workers 4
+    python scripts/score_catalog.py --output data/catalog_scores.parquet
+    python scripts/score_catalog.py --restart    # начать заново, игнорируя контрольную точку
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from collections import deque
+from itertools import islice
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from predict_advanced import load_models, predict_batch, registry_versions
+from json_stream import iter_json_records, iter_chunks
+
+# Поля строки результата (одинаковые для JSONL и Parquet)
+FIELDS = (
+    'uid', 'name', 'popularity_score', 'popularity_category', 'model_used', 'cascade', 'confidence',
+    'interval_lower', 'interval_upper', 'quality_score', 'quality_grade', 'error'
+)
+
+# Модели рабочих процессов: загружаются до fork и наследуются
+_MODELS = None
+
+
+def catalog_input(record):
+    """Запрос прогноза из записи каталога (как prepare_advanced_features)"""
+    tags = record.get('tags', [])
+    tags = [str(tag) for tag in tags] if isinstance(tags, list) else []
+    categories = record.get('categories', [])
+    categories = [str(cat) for cat in categories] if isinstance(categories, list) else []
+    description = record.get('description') or ''
+    user = record.get('user') or {}
+    account = user.get('account', 'basic')
+    animation_count = record.get('animationCount', 0)
+
+    return {
+        'tags': tags,
+        'categories': categories,
+        'description': description,
+        'category_count': len(categories),
+        'tag_count': len(tags),
+        'description_length': len(description),
+        'face_count': record.get('faceCount', 0),
+        'vertex_count': record.get('vertexCount', 0),
+        'animation_count': animation_count,
+        'is_downloadable': bool(record.get('isDownloadable', False)),
+        'is_premium_author': account in ['pro', 'premium'],
+        'author_followers': user.get('followerCount', 0),
+        'account_type': account,
+        'is_animated': bool(animation_count),
+        # Похожие модели для пересчета каталога не нужны
+        'similar_k': 0,
+        # Большие пакеты расширенная модель считает быстрее каскада (cascade.py)
+        'cascade': False
+    }
+
+
+def score_row(record, result):
+    """Плоская строка результата для одной записи каталога"""
+    row = dict.fromkeys(FIELDS)
+    row['uid'] = record.get('uid')
+    row['name'] = record.get('name')
+    if 'error' in result:
+        row['error'] = result['error']
+        return row
+    row['popularity_score'] = round(result['popularity_score'], 6)
+    row['popularity_category'] = result['popularity_category']
+    row['model_used'] = result['model_used']
+    row['cascade'] = result.get('cascade')
+    row['confidence'] = result['confidence']
+    interval = result.get('prediction_interval')
+    if interval is not None:
+        row['interval_lower'] = interval['lower']
+        row['interval_upper'] = interval['upper']
+    quality = result.get('quality_rating')
+    if quality is not None:
+        row['quality_score'] = quality['score']
+        row['quality_grade'] = quality['grade']
+    return row
+
+
+def _init_worker():
+    # Без fork (Windows) модели загружаются в каждом процессе
+    global _MODELS
+    if _MODELS is None:
+        _MODELS = load_models()
+
+
+def score_chunk(records):
+    """Оценка пакета записей каталога -> строки JSONL (одной строкой)"""
+    try:
+        results = predict_batch([catalog_input(record) for record in records], _MODELS, include_timings=False)
+    except Exception as e:
+        results = [{'error': str(e)}] * len(records)
+    return ''.join(
+        json.dumps(score_row(record, result), ensure_ascii=False) + '\n'
+        for record, result in zip(records, results)
+    )
+
+
+def _atomic_write_json(path, data):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def input_signature(path):
+    """Признаки входного файла для проверки при продолжении"""
+    stat = os.stat(path)
+    return {'path': os.path.abspath(path), 'bytes': stat.st_size, 'mtime': int(stat.st_mtime)}
+
+
+def load_checkpoint(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+class CatalogWriter:
+    """Дозапись JSONL с контрольной точкой после каждого пакета"""
+
+    def __init__(self, path, checkpoint_path, signature, versions, resume_from=None):
+        self.path = path
+        self.checkpoint_path = checkpoint_path
+        self.state = {
+            'input': signature,
+            'versions': versions,
+            'records_done': 0,
+            'chunks_done': 0,
+            'output_bytes': 0,
+            'finished': False
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if resume_from is not None:
+            output_bytes = os.path.getsize(path) if os.path.exists(path) else -1
+            if output_bytes < resume_from['output_bytes']:
+                # Вывод удален или короче контрольной точки - продолжать не с чего
+                print(f"Вывод {path} не совпадает с контрольной точкой, оценка начинается заново", file=sys.stderr)
+                resume_from = None
+        if resume_from is None:
+            self.file = open(path, 'wb')
+        else:
+            self.state.update(
+                records_done=resume_from['records_done'],
+                chunks_done=resume_from['chunks_done'],
+                output_bytes=resume_from['output_bytes']
+            )
+            self.file = open(path, 'r+b')
+            # Отбрасываем то, что было дописано после последней контрольной точки
+            self.file.truncate(self.state['output_bytes'])
+            self.file.seek(self.state['output_bytes'])
+
+    def write_chunk(self, lines, n_records):
+        self.file.write(lines.encode('utf-8'))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.state['records_done'] += n_records
+        self.state['chunks_done'] += 1
+        self.state['output_bytes'] = self.file.tell()
+        _atomic_write_json(self.checkpoint_path, self.state)
+
+    def finish(self):
+        """Отметка о завершении; вызывается, когда итоговый файл уже записан"""
+        self.file.close()
+        self.state['finished'] = True
+        _atomic_write_json(self.checkpoint_path, self.state)
+
+    def close(self):
+        self.file.close()
+
+
+def jsonl_to_parquet(jsonl_path, parquet_path, chunk_size=50000):
+    """Перевод JSONL результатов в Parquet (группа строк на chunk_size записей)"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ('uid', pa.string()), ('name', pa.string()), ('popularity_score', pa.float64()),
+        ('popularity_category', pa.string()), ('model_used', pa.string()), ('cascade', pa.string()),
+        ('confidence', pa.float64()),
+        ('interval_lower', pa.float64()), ('interval_upper', pa.float64()),
+        ('quality_score', pa.float64()), ('quality_grade', pa.string()), ('error', pa.string())
+    ])
+    tmp_path = parquet_path + '.tmp'
+    with pq.ParquetWriter(tmp_path, schema) as writer:
+        for rows in iter_chunks(iter_json_records(jsonl_path), chunk_size):
+            writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+    os.replace(tmp_path, parquet_path)
+
+
+def score_catalog(input_path, output_path, chunk_size=1000, workers=None, restart=False):
+    """
+    Оценка всего каталога с контрольными точками
+
+    Returns:
+        состояние контрольной точки после завершения
+    """
+    parquet = output_path.endswith('.parquet')
+    if parquet:
+        try:
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            raise SystemExit("Для вывода в Parquet нужен pyarrow (pip install pyarrow) или используйте .jsonl")
+    jsonl_path = output_path + '.jsonl' if parquet else output_path
+    checkpoint_path = output_path + '.checkpoint.json'
+
+    global _MODELS
+    _MODELS = load_models()
+    if all(model is None for name, model in _MODELS.items() if name in ('standard', 'advanced', 'student')):
+        raise SystemExit("Модели не найдены. Сначала обучите модель.")
+    versions = registry_versions(_MODELS)
+    signature = input_signature(input_path)
+
+    checkpoint = None if restart else load_checkpoint(checkpoint_path)
+    if checkpoint is not None:
+        if checkpoint['input'] != signature:
+            raise SystemExit(f"Входные данные изменились с прошлого запуска ({checkpoint_path}); используйте --restart")
+        if checkpoint['versions'] != versions:
+            raise SystemExit(
+                f"Версии моделей изменились ({checkpoint['versions']} -> {versions}); используйте --restart"
+            )
+        if checkpoint['finished'] and os.path.exists(output_path):
+            print(f"Каталог уже оценен: {checkpoint['records_done']} записей в {output_path}")
+            return checkpoint
+        # Без итогового файла (например, прервана конвертация в Parquet) продолжаем:
+        # оцененные записи пропускаются, недостающие шаги выполняются заново
+        print(f"Продолжение с записи {checkpoint['records_done']} (пакетов: {checkpoint['chunks_done']})")
+
+    workers = workers or os.cpu_count() or 1
+    writer = CatalogWriter(jsonl_path, checkpoint_path, signature, versions, checkpoint)
+    # Уже оцененные записи пропускаются (разбираются, но не оцениваются)
+    records = islice(iter_json_records(input_path), writer.state['records_done'], None)
+    chunks = iter_chunks(records, chunk_size)
+
+    started = time.perf_counter()
+    scored = 0
+    pool = None
+    try:
+        if workers == 1:
+            for chunk in chunks:
+                writer.write_chunk(score_chunk(chunk), len(chunk))
+                scored += len(chunk)
+                _progress(writer.state, scored, started)
+        else:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('fork' if 'fork' in methods else 'spawn')
+            pool = context.Pool(workers, initializer=_init_worker)
+            # Ограниченное число пакетов в работе: каталог не читается в память целиком
+            pending = deque()
+            for chunk in chunks:
+                pending.append((pool.apply_async(score_chunk, (chunk,)), len(chunk)))
+                if len(pending) >= 2 * workers:
+                    result, n = pending.popleft()
+                    writer.write_chunk(result.get(), n)
+                    scored += n
+                    _progress(writer.state, scored, started)
+            while pending:
+                result, n = pending.popleft()
+                writer.write_chunk(result.get(), n)
+                scored += n
+            pool.close()
+            pool.join()
+    except BaseException:
+        if pool is not None:
+            pool.terminate()
+        writer.close()
+        raise
+
+    writer.close()
+    if parquet:
+        jsonl_to_parquet(jsonl_path, output_path)
+    # Контрольная точка завершается только после записи итогового файла
+    writer.finish()
+    if parquet:
+        os.remove(jsonl_path)
+
+    elapsed = time.perf_counter() - started
+    rate = scored / elapsed if elapsed > 0 else 0.0
+    print(f"Оценено записей: {scored} за {elapsed:.1f} с ({rate:.0f} записей/с), "
+          f"всего в {output_path}: {writer.state['records_done']}")
+    return writer.state
+
+
+def _progress(state, scored, started):
+    elapsed = time.perf_counter() - started
+    if state['chunks_done'] % 10 == 0 and elapsed > 0:
+        print(f"  {state['records_done']} записей ({scored / elapsed:.0f} записей/с)", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Пересчет прогнозов для всего каталога')
+    parser.add_argument('--input', default='data/raw_models.json', help='каталог (JSON массив или JSON Lines)')
+    parser.add_argument('--output', default='data/catalog_scores.jsonl', help='результат (.jsonl или .parquet)')
+    parser.add_argument('--chunk-size', type=int, default=1000, help='записей в пакете')
+    parser.add_argument('--workers', type=int, default=None, help='рабочих процессов (по умолчанию - число CPU)')
+    parser.add_argument('--restart', action='store_true', help='начать заново, игнорируя контрольную точку')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        print(f"Файл {args.input} не найден", file=sys.stderr)
+        sys.exit(1)
+    score_catalog(args.input, args.output, args.chunk_size, args.workers, args.restart)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Теневая оценка модели-кандидата на реальных запросах
+
+Новая версия, опубликованная как кандидат (указатель CANDIDATE реестра,
+train_model*.py --candidate), не отвечает на запросы. Сервер прогнозирования
+отбирает долю запросов (--shadow-rate) и передает их в фоновый поток: там
+текущие модели и кандидат считают прогноз на одних и тех же входах, а
+разница прогнозов и задержка копятся в скользящих окнах. Основной путь
+ответа только ставит пакет в ограниченную очередь (при переполнении
+пакет отбрасывается).
+
+Переключение на кандидата ({"op": "promote"}) проходит через проверку:
+достаточно сравнений, кандидат не медленнее текущей модели больше чем в
+max_latency_ratio раз и не расходится с ней больше порогов. Задержка
+сравнивается без этапа tfidf_transform: строки TF-IDF текущей модели уже
+закешированы основным путем, у кандидата - нет.
+"""
+
+import queue
+import random
+import sys
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from predict_advanced import load_models, predict_scores, categorize_score, registry_versions, REGISTRY
+from profiling import StageTimer
+from warmup import warm_up
+
+# Модели реестра, для которых поддерживается кандидат
+SHADOWED = ('standard', 'advanced')
+
+# Пороги проверки перед переключением на кандидата
+PROMOTION_GATE = {
+    'min_samples': 200,
+    # Отношение задержки кандидата к текущей модели
+    'max_latency_ratio': 1.10,
+    # Средняя абсолютная разница прогнозов (шкала популярности)
+    'max_mean_abs_delta': 0.5,
+    # Доля запросов с другой категорией популярности
+    'max_category_mismatch': 0.10
+}
+
+# Этапы, зависящие от состояния кешей, а не от модели
+_CACHE_STAGES = ('tfidf_transform',)
+
+
+def candidate_versions(registry=REGISTRY):
+    """Версии-кандидаты реестра {имя: версия} (пустой dict - кандидатов нет)"""
+    versions = {}
+    for name in SHADOWED:
+        version = registry.candidate_version(name)
+        if version is not None:
+            versions[name] = version
+    return versions
+
+
+def load_candidate(registry=REGISTRY):
+    """
+    Модели с версиями-кандидатами (для остальных имен - текущие версии)
+
+    Returns:
+        (модели, версии кандидатов) или (None, {}), если кандидатов нет
+    """
+    versions = candidate_versions(registry)
+    if not versions:
+        return None, {}
+    models = load_models(versions)
+    loaded = registry_versions(models)
+    missing = [name for name, version in versions.items() if loaded.get(name) != version]
+    if missing:
+        print(f"Warning: candidate models not loaded: {', '.join(missing)}", file=sys.stderr)
+        return None, {}
+    warm_up(models)
+    return models, versions
+
+
+def _percentile(values, q):
+    return round(float(np.percentile(values, q)), 4) if len(values) else None
+
+
+class ShadowEvaluator:
+    """Фоновое сравнение кандидата с текущими моделями на доле запросов"""
+
+    def __init__(self, candidate_models, versions, sample_rate=0.05, max_queue=64, window=5000, seed=None):
+        """
+        Args:
+            candidate_models: результат load_models с версиями-кандидатами
+            versions: версии кандидатов {имя: версия}
+            sample_rate: доля запросов для теневой оценки
+            max_queue: пакетов в очереди фонового потока
+            window: размер скользящих окон сравнений
+        """
+        self.candidate_models = candidate_models
+        self.versions = dict(versions)
+        self.sample_rate = sample_rate
+        self.started_at = time.time()
+        self._rng = random.Random(seed)
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self.deltas = deque(maxlen=window)
+        self.category_match = deque(maxlen=window)
+        # Задержка на запрос, мс: compute - без этапов, зависящих от кешей
+        self.latency = {
+            role: {'total': deque(maxlen=window), 'compute': deque(maxlen=window)}
+            for role in ('primary', 'candidate')
+        }
+        self.stats = {'offered': 0, 'sampled': 0, 'dropped': 0, 'batches': 0, 'errors': 0}
+        self._thread = threading.Thread(target=self._run, name='shadow-evaluator', daemon=True)
+        self._thread.start()
+
+    def offer(self, inputs, primary_models):
+        """Отбор доли запросов пакета для теневой оценки (не блокирует)"""
+        sampled = [d for d in inputs if self._rng.random() < self.sample_rate]
+        with self._lock:
+            self.stats['offered'] += len(inputs)
+        if not sampled:
+            return
+        try:
+            self._queue.put_nowait((sampled, primary_models))
+        except queue.Full:
+            with self._lock:
+                self.stats['dropped'] += len(sampled)
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join(timeout=5.0)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            inputs, primary_models = item
+            try:
+                self._compare(inputs, primary_models)
+            except Exception as e:
+                with self._lock:
+                    self.stats['errors'] += 1
+                print(f"Warning: shadow evaluation failed: {e}", file=sys.stderr)
+
+    def _timed_scores(self, inputs, models):
+        timer = StageTimer()
+        started = time.perf_counter()
+        scores = predict_scores(inputs, models, timer)
+        total = time.perf_counter() - started
+        compute = total - sum(timer.durations.get(name, 0.0) for name in _CACHE_STAGES)
+        return scores, total * 1000.0 / len(inputs), compute * 1000.0 / len(inputs)
+
+    def _compare(self, inputs, primary_models):
+        # Порядок прогонов чередуется, чтобы прогретость процессора не давала преимущества
+        roles = [('primary', primary_models), ('candidate', self.candidate_models)]
+        if self.stats['batches'] % 2:
+            roles.reverse()
+        measured = {role: self._timed_scores(inputs, models) for role, models in roles}
+
+        with self._lock:
+            self.stats['batches'] += 1
+            self.stats['sampled'] += len(inputs)
+            for role, (_, total_ms, compute_ms) in measured.items():
+                self.latency[role]['total'].append(total_ms)
+                self.latency[role]['compute'].append(compute_ms)
+            for (primary, _), (candidate, _) in zip(measured['primary'][0], measured['candidate'][0]):
+                if primary is None or candidate is None:
+                    continue
+                self.deltas.append(float(candidate) - float(primary))
+                self.category_match.append(categorize_score(candidate) == categorize_score(primary))
+
+    def snapshot(self):
+        """Накопленное сравнение: разница прогнозов и задержка по моделям"""
+        with self._lock:
+            deltas = list(self.deltas)
+            matches = list(self.category_match)
+            latency = {
+                role: {kind: list(values) for kind, values in by_kind.items()}
+                for role, by_kind in self.latency.items()
+            }
+            stats = dict(self.stats)
+
+        abs_deltas = np.abs(deltas) if deltas else []
+        report = {
+            'versions': self.versions,
+            'sample_rate': self.sample_rate,
+            'running_seconds': round(time.time() - self.started_at, 1),
+            'stats': stats,
+            'samples': len(deltas),
+            'delta': {
+                'mean': round(float(np.mean(deltas)), 4) if deltas else None,
+                'mean_abs': round(float(np.mean(abs_deltas)), 4) if deltas else None,
+                'p95_abs': _percentile(abs_deltas, 95),
+                'max_abs': round(float(np.max(abs_deltas)), 4) if deltas else None
+            },
+            'category_mismatch': round(1.0 - float(np.mean(matches)), 4) if matches else None,
+            'latency_ms': {
+                role: {
+                    'mean': round(float(np.mean(by_kind['total'])), 4) if by_kind['total'] else None,
+                    'p95': _percentile(by_kind['total'], 95),
+                    'compute_mean': round(float(np.mean(by_kind['compute'])), 4) if by_kind['compute'] else None
+                }
+                for role, by_kind in latency.items()
+            }
+        }
+        primary_compute = report['latency_ms']['primary']['compute_mean']
+        candidate_compute = report['latency_ms']['candidate']['compute_mean']
+        report['latency_ratio'] = (
+            round(candidate_compute / primary_compute, 4) if primary_compute and candidate_compute else None
+        )
+        return report
+
+    def gate(self, thresholds=None):
+        """
+        Проверка перед переключением на кандидата
+
+        Returns:
+            dict: promote (bool), reasons (список причин отказа), report (snapshot)
+        """
+        limits = dict(PROMOTION_GATE, **(thresholds or {}))
+        report = self.snapshot()
+        reasons = []
+        if report['samples'] < limits['min_samples']:
+            reasons.append(f"недостаточно сравнений: {report['samples']} < {limits['min_samples']}")
+        else:
+            if report['latency_ratio'] is not None and report['latency_ratio'] > limits['max_latency_ratio']:
+                reasons.append(
+                    f"кандидат медленнее: задержка x{report['latency_ratio']} > x{limits['max_latency_ratio']}"
+                )
+            if report['delta']['mean_abs'] > limits['max_mean_abs_delta']:
+                reasons.append(
+                    f"прогнозы расходятся: средняя |разница| {report['delta']['mean_abs']} "
+                    f"> {limits['max_mean_abs_delta']}"
+                )
+            if report['category_mismatch'] > limits['max_category_mismatch']:
+                reasons.append(
+                    f"другая категория популярности у {report['category_mismatch']:.1%} запросов "
+                    f"> {limits['max_category_mismatch']:.0%}"
+                )
+        return {'promote': not reasons, 'reasons': reasons, 'thresholds': limits, 'report': report}
+
+    def promote(self, registry=REGISTRY, force=False, thresholds=None):
+        """Переключение реестра на кандидата, если проверка пройдена (или force)"""
+        decision = self.gate(thresholds)
+        if decision['promote'] or force:
+            for name, version in self.versions.items():
+                registry.promote(name, version)
+            decision['promoted'] = dict(self.versions)
+        else:
+            decision['promoted'] = {}
+        return decision
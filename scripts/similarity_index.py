@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Приближенный поиск похожих моделей (LSH на случайных гиперплоскостях)
+
+Индекс строится при обучении расширенной модели по тому же пространству
+признаков (нормализованные численные + TF-IDF + теги). Для каждой из
+n_tables таблиц вектор кодируется n_bits знаками случайных проекций;
+кандидаты из совпавших корзин (и соседних по одному биту, если
+кандидатов мало) ранжируются точным косинусным сходством.
+Корзины хранятся как отсортированные коды и перестановка строк, поиск
+корзины - двоичный поиск, поэтому запрос не сканирует весь каталог.
+
+Для каталогов из миллионов моделей: коды считаются по одной таблице и
+частями строк (HASH_CHUNK_ROWS) сразу в uint32, векторы каталога хранятся
+в float32 и остаются разреженными (CSR), если разрежены TF-IDF и теги, а
+описания моделей - колонками массивов, а не dict на каждую строку.
+"""
+
+import numpy as np
+from scipy import sparse
+
+# Строк в одной части при вычислении кодов (временная матрица проекций - часть x n_bits)
+HASH_CHUNK_ROWS = 65536
+
+
+def normalize_rows(X):
+    """L2 нормализация строк в float32 (нулевые строки остаются нулевыми; CSR остается CSR)"""
+    if sparse.issparse(X):
+        X = sparse.csr_matrix(X, dtype=np.float32)
+        norms = np.sqrt(np.asarray(X.multiply(X).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        return sparse.diags((1.0 / norms).astype(np.float32)).tocsr() @ X
+    X = np.asarray(X, dtype=np.float32)
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return X / norms
+
+
+def index_features(blocks):
+    """
+    Вектор для индекса: каждый блок признаков нормализуется отдельно,
+    чтобы численные признаки не подавляли текстовые в косинусной мере.
+    Если хотя бы один блок разреженный, результат - CSR.
+    """
+    blocks = [normalize_rows(block) for block in blocks]
+    if any(sparse.issparse(block) for block in blocks):
+        return normalize_rows(sparse.hstack(blocks, format='csr'))
+    return normalize_rows(np.hstack(blocks))
+
+
+def _column(values):
+    """Колонка описаний моделей: строки - массив object, числа - float32/int64"""
+    column = np.asarray(values)
+    if column.dtype.kind in 'USO':
+        return np.asarray(values, dtype=object)
+    if column.dtype.kind == 'f':
+        return column.astype(np.float32)
+    return column
+
+
+def _metadata_columns(metadata):
+    """Колонки описаний моделей из dict колонок или списка dict по строкам"""
+    if isinstance(metadata, list):
+        metadata = {key: [row[key] for row in metadata] for key in (metadata[0] if metadata else {})}
+    return {name: _column(values) for name, values in metadata.items()}
+
+
+def _value(value):
+    if isinstance(value, np.floating):
+        return round(float(value), 4)
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+class SimilarityIndex:
+    """LSH индекс для косинусного сходства"""
+
+    def __init__(self, n_tables=16, n_bits=None, bucket_size=32, min_candidates=100, seed=42):
+        """
+        Args:
+            n_tables: число хеш-таблиц (больше - выше полнота, медленнее запрос)
+            n_bits: бит на код; по умолчанию подбирается так, чтобы в корзине
+                было около bucket_size моделей
+            min_candidates: минимум кандидатов до проверки соседних корзин
+        """
+        self.n_tables = n_tables
+        self.n_bits = n_bits
+        self.bucket_size = bucket_size
+        self.min_candidates = min_candidates
+        self.seed = seed
+        self.planes = None
+        self.vectors = None
+        self.metadata = {}
+        self._codes = []
+        self._order = []
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # Индекс, сохраненный до перехода на колонки, хранит список dict по строкам
+        if isinstance(self.metadata, list):
+            self.metadata = _metadata_columns(self.metadata)
+
+    def __len__(self):
+        return 0 if self.vectors is None else self.vectors.shape[0]
+
+    def _hash(self, X):
+        """
+        Коды корзин: (n_tables, n_rows) uint32
+
+        Проекции считаются по одной таблице и частями строк, биты сразу
+        складываются в код - без тензора (n_tables, n_rows, n_bits).
+        """
+        n_rows = X.shape[0]
+        codes = np.zeros((self.n_tables, n_rows), dtype=np.uint32)
+        for table in range(self.n_tables):
+            for start in range(0, n_rows, HASH_CHUNK_ROWS):
+                projections = X[start:start + HASH_CHUNK_ROWS] @ self.planes[table]
+                chunk = codes[table, start:start + HASH_CHUNK_ROWS]
+                for bit in range(self.n_bits):
+                    chunk |= (projections[:, bit] > 0).astype(np.uint32) << np.uint32(bit)
+        return codes
+
+    def fit(self, X, metadata):
+        """
+        Построение индекса
+
+        Args:
+            X: матрица признаков (см. index_features), плотная или CSR
+            metadata: колонки описаний моделей (dict имя -> значения по строкам:
+                uid, name, popularity_score, ...) или список dict для каждой строки
+        """
+        X = normalize_rows(X)
+        if self.n_bits is None:
+            self.n_bits = int(np.clip(np.round(np.log2(max(X.shape[0], 1) / self.bucket_size)), 4, 24))
+        rng = np.random.RandomState(self.seed)
+        self.planes = rng.standard_normal((self.n_tables, X.shape[1], self.n_bits)).astype(np.float32)
+        self.vectors = X
+        self.metadata = _metadata_columns(metadata)
+
+        codes = self._hash(X)
+        self._codes = []
+        self._order = []
+        for table in range(self.n_tables):
+            order = np.argsort(codes[table], kind='stable')
+            self._order.append(order.astype(np.int32))
+            self._codes.append(codes[table][order])
+        return self
+
+    def _bucket(self, table, code):
+        codes = self._codes[table]
+        start = np.searchsorted(codes, code, side='left')
+        end = np.searchsorted(codes, code, side='right')
+        return self._order[table][start:end]
+
+    def _candidates(self, codes):
+        """Кандидаты по коду в каждой таблице; при нехватке - соседние корзины"""
+        found = [self._bucket(t, codes[t]) for t in range(self.n_tables)]
+        candidates = np.unique(np.concatenate(found)) if found else np.empty(0, dtype=np.int32)
+        if len(candidates) >= self.min_candidates:
+            return candidates
+        # Multi-probe: корзины на расстоянии одного бита
+        for t in range(self.n_tables):
+            for bit in range(self.n_bits):
+                found.append(self._bucket(t, codes[t] ^ (1 << bit)))
+        return np.unique(np.concatenate(found))
+
+    def _describe(self, row):
+        """Описание модели каталога по номеру строки"""
+        return {name: _value(column[row]) for name, column in self.metadata.items()}
+
+    def _similarity(self, candidates, x):
+        """Косинусная мера кандидатов со строкой запроса x (плотной или CSR 1 x n)"""
+        if sparse.issparse(x):
+            x = x.T
+        similarity = self.vectors[candidates] @ x
+        if sparse.issparse(similarity):
+            similarity = similarity.toarray()
+        return np.asarray(similarity).ravel()
+
+    def query_batch(self, X, k=5):
+        """Top-k похожих моделей для каждой строки X"""
+        if len(self) == 0:
+            return [[] for _ in range(X.shape[0])]
+        X = normalize_rows(X)
+        codes = self._hash(X)
+        results = []
+        for row in range(X.shape[0]):
+            candidates = self._candidates(codes[:, row])
+            if len(candidates) == 0:
+                results.append([])
+                continue
+            similarity = self._similarity(candidates, X[row])
+            top = np.argsort(-similarity)[:k]
+            results.append([
+                dict(self._describe(candidates[i]), similarity=round(float(similarity[i]), 4))
+                for i in top
+            ])
+        return results
+
+    def query(self, x, k=5):
+        """Top-k похожих моделей для одного вектора (плотного или строки CSR)"""
+        X = x if sparse.issparse(x) else np.asarray(x).reshape(1, -1)
+        return self.query_batch(X, k)[0]
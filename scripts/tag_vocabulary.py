@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Словарь тегов и категорий с целочисленным кодированием
+Используется для multi-hot признаков модели и быстрых проверок по множествам
+"""
+
+import json
+import numpy as np
+from scipy import sparse
+
+from feature_spec import FEATURE_DTYPE
+
+TAG_PREFIX = 'tag:'
+CATEGORY_PREFIX = 'category:'
+
+
+def normalize_token(value):
+    """Нормализация тега/категории"""
+    return str(value).strip().lower()
+
+
+def record_tokens(tags, categories):
+    """Токены записи: теги и категории в отдельных пространствах имен"""
+    tokens = set()
+    if isinstance(tags, list):
+        tokens.update(TAG_PREFIX + normalize_token(tag) for tag in tags if str(tag).strip())
+    if isinstance(categories, list):
+        tokens.update(CATEGORY_PREFIX + normalize_token(cat) for cat in categories if str(cat).strip())
+    return tokens
+
+
+class TagVocabulary:
+    """Индекс тегов/категорий: токен -> ID, документные частоты"""
+
+    def __init__(self, min_df=1, max_size=None):
+        self.min_df = min_df
+        self.max_size = max_size
+        self.index = {}
+        self.tokens = []
+        self.doc_freq = np.zeros(0, dtype=np.int64)
+        self.n_documents = 0
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def __contains__(self, token):
+        return token in self.index
+
+    def fit(self, records):
+        """
+        Построение словаря
+
+        Args:
+            records: итерируемое из пар (tags, categories)
+        """
+        counts = {}
+        n_documents = 0
+        for tags, categories in records:
+            n_documents += 1
+            for token in record_tokens(tags, categories):
+                counts[token] = counts.get(token, 0) + 1
+
+        # Самые частые токены получают меньшие ID, при равенстве - по алфавиту
+        kept = sorted(
+            (token for token, df in counts.items() if df >= self.min_df),
+            key=lambda token: (-counts[token], token)
+        )
+        if self.max_size:
+            kept = kept[:self.max_size]
+
+        self.tokens = kept
+        self.index = {token: i for i, token in enumerate(kept)}
+        self.doc_freq = np.array([counts[token] for token in kept], dtype=np.int64)
+        self.n_documents = n_documents
+        return self
+
+    def encode(self, tags, categories):
+        """Список ID известных токенов записи (неизвестные пропускаются)"""
+        index = self.index
+        return sorted(index[token] for token in record_tokens(tags, categories) if token in index)
+
+    def transform(self, records):
+        """Разреженная multi-hot матрица (n_records x len(vocabulary))"""
+        indptr = [0]
+        indices = []
+        for tags, categories in records:
+            indices.extend(self.encode(tags, categories))
+            indptr.append(len(indices))
+        data = np.ones(len(indices), dtype=FEATURE_DTYPE)
+        return sparse.csr_matrix(
+            (data, np.array(indices, dtype=np.int32), np.array(indptr, dtype=np.int64)),
+            shape=(len(indptr) - 1, len(self.tokens))
+        )
+
+    def feature_names(self):
+        """Имена признаков для multi-hot колонок"""
+        return list(self.tokens)
+
+    def to_dict(self):
+        return {
+            'min_df': self.min_df,
+            'max_size': self.max_size,
+            'n_documents': self.n_documents,
+            'tokens': self.tokens,
+            'doc_freq': self.doc_freq.tolist()
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        vocab = cls(min_df=data.get('min_df', 1), max_size=data.get('max_size'))
+        vocab.tokens = list(data['tokens'])
+        vocab.index = {token: i for i, token in enumerate(vocab.tokens)}
+        vocab.doc_freq = np.array(data['doc_freq'], dtype=np.int64)
+        vocab.n_documents = data.get('n_documents', 0)
+        return vocab
+
+    def save(self, path):
+        """Сохранение словаря в JSON"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path):
+        """Загрузка словаря из JSON"""
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Кеш обработки текста: очищенный текст и строки TF-IDF
+
+Описания и наборы тегов часто повторяются (шаблонные описания, паки
+ассетов одного автора), а preprocess_text и TfidfVectorizer.transform
+каждый раз заново токенизируют текст и строят биграммы. Кеш хранит
+результаты по хешу текста с вытеснением давно не использованных записей
+при превышении лимита памяти и считает долю попаданий.
+
+Кеш строк TF-IDF привязан к конкретному векторизатору (новая версия
+модели - новый кеш, старый удаляется вместе с векторизатором).
+Лимит памяти каждого кеша: TEXT_CACHE_MB (по умолчанию 64 МБ).
+"""
+
+import hashlib
+import os
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+from scipy import sparse
+
+from feature_spec import preprocess_text
+
+# Примерные накладные расходы на запись (ключ, кортеж, OrderedDict)
+_ENTRY_OVERHEAD = 200
+
+
+def default_max_bytes():
+    return int(float(os.environ.get('TEXT_CACHE_MB', '64')) * 1024 * 1024)
+
+
+def text_key(text):
+    """Ключ кеша - 128-битный хеш текста"""
+    return hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+
+
+class BoundedCache:
+    """LRU кеш с ограничением по памяти (потокобезопасно)"""
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = default_max_bytes() if max_bytes is None else max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, nbytes):
+        nbytes += _ENTRY_OVERHEAD
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous[1]
+            self._entries[key] = (value, nbytes)
+            self.bytes += nbytes
+            while self.bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None
+        }
+
+
+_CLEAN_CACHE = BoundedCache()
+_ROW_CACHES = weakref.WeakKeyDictionary()
+_ROW_CACHES_LOCK = threading.Lock()
+
+
+def clean_text(text):
+    """preprocess_text с кешированием по хешу исходного текста"""
+    if not text:
+        return ""
+    key = text_key(text)
+    cleaned = _CLEAN_CACHE.get(key)
+    if cleaned is None:
+        cleaned = preprocess_text(text)
+        _CLEAN_CACHE.put(key, cleaned, len(cleaned) + 16)
+    return cleaned
+
+
+def _row_cache(tfidf):
+    with _ROW_CACHES_LOCK:
+        cache = _ROW_CACHES.get(tfidf)
+        if cache is None:
+            cache = _ROW_CACHES[tfidf] = BoundedCache()
+        return cache
+
+
+def _store_rows(cache, keys, X):
+    """Строки csr матрицы X в кеш; возвращает {ключ: (indices, data)}"""
+    rows = {}
+    for position, key in enumerate(keys):
+        start, end = X.indptr[position], X.indptr[position + 1]
+        row = (X.indices[start:end].copy(), X.data[start:end].copy())
+        rows[key] = row
+        cache.put(key, row, row[0].nbytes + row[1].nbytes + 16)
+    return rows
+
+
+def tfidf_fit_transform(tfidf, texts):
+    """tfidf.fit_transform(texts) с заполнением кеша строк обучающих текстов"""
+    texts = list(texts)
+    X = tfidf.fit_transform(texts).tocsr()
+    _store_rows(_row_cache(tfidf), [text_key(text) for text in texts], X)
+    return X
+
+
+def tfidf_transform(tfidf, texts):
+    """
+    tfidf.transform(texts) с кешированием строк; отсутствующие в кеше
+    тексты (без повторов внутри пакета) векторизуются одним вызовом
+    """
+    cache = _row_cache(tfidf)
+    texts = list(texts)
+    keys = [text_key(text) for text in texts]
+    rows = [cache.get(key) for key in keys]
+
+    missing = {}
+    for i, row in enumerate(rows):
+        if row is None:
+            missing.setdefault(keys[i], i)
+    if missing:
+        order = list(missing.values())
+        computed = _store_rows(cache, list(missing), tfidf.transform([texts[i] for i in order]).tocsr())
+        rows = [row if row is not None else computed[key] for row, key in zip(rows, keys)]
+
+    lengths = np.fromiter((len(row[0]) for row in rows), dtype=np.int64, count=len(rows))
+    indptr = np.concatenate(([0], np.cumsum(lengths)))
+    indices = np.concatenate([row[0] for row in rows]) if rows else np.empty(0, dtype=np.int32)
+    data = np.concatenate([row[1] for row in rows]) if rows else np.empty(0)
+    return sparse.csr_matrix((data, indices, indptr), shape=(len(rows), len(tfidf.vocabulary_)))
+
+
+def cache_stats():
+    """Статистика кешей текущего процесса"""
+    with _ROW_CACHES_LOCK:
+        row_caches = [cache.stats() for cache in _ROW_CACHES.values()]
+    return {
+        'clean_text': _CLEAN_CACHE.stats(),
+        'tfidf_rows': row_caches[0] if len(row_caches) == 1 else row_caches
+    }
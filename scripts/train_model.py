@@ -1,19 +1,39 @@
 #!/usr/bin/env python3
 """
 Обучение модели машинного обучения для прогнозирования популярности 3D-моделей
+
+Режим --out-of-core обучает модель по частям, не загружая данные целиком:
+    python scripts/train_model.py --out-of-core --chunk-size 10000 --epochs 5
 """
 
+import argparse
 import json
+import os
+import sys
 import pandas as pd
 import numpy as np
 from sklearn.model_selection import train_test_split, cross_val_score
 from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
-from sklearn.linear_model import LinearRegression
+from sklearn.linear_model import LinearRegression, SGDRegressor
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import mean_squared_error, r2_score, mean_absolute_error
 import joblib
 import matplotlib.pyplot as plt
 import seaborn as sns
+from run_report import RunReport, report_stage
+from json_stream import iter_json_records, iter_chunks
+from prediction_intervals import ConformalIntervals
+from explanations import cache_global_importance
+from model_registry import ModelRegistry
+from feature_spec import STANDARD_SPEC, FEATURE_DTYPE
+from evaluation_store import save_evaluation, serving_metrics
+from early_stopping import fit_with_early_stopping
+
+# Максимальная доля строк в отложенной выборке out-of-core (остальные - для обучения)
+HOLDOUT_FRACTION = 0.2
+
+# Файлы запуска: не входят в версию реестра (метрики содержат дату обучения)
+STANDARD_RUN_FILES = ('model_metrics.json', 'evaluation.npz')
 
 def load_data(filename='data/preprocessed_data.json'):
     """Загрузка обработанных данных"""
@@ -22,34 +42,12 @@ def load_data(filename='data/preprocessed_data.json'):
     return pd.DataFrame(data)
 
 def prepare_features(df):
-    """Подготовка признаков для обучения"""
-    # Выбираем признаки
-    feature_columns = [
-        'category_count',
-        'tag_count',
-        'description_length',
-        'face_count',
-        'vertex_count',
-        'animation_count',
-        'is_downloadable',
-        'is_premium_author',
-        'author_followers',
-        'days_since_published'
-    ]
-    
-    X = df[feature_columns].copy()
+    """Подготовка признаков для обучения (порядок и типы - feature_spec.STANDARD_SPEC)"""
+    X = STANDARD_SPEC.frame(df)
     y = df['popularity_score'].values
-    
-    # Преобразуем булевы значения в числовые
-    X['is_downloadable'] = X['is_downloadable'].astype(int)
-    X['is_premium_author'] = X['is_premium_author'].astype(int)
-    
-    # Обработка пропущенных значений
-    X = X.fillna(0)
-    
-    return X, y, feature_columns
+    return X, y, list(STANDARD_SPEC.names)
 
-def train_models(X_train, y_train):
+def train_models(X_train, y_train, report=None):
     """Обучение нескольких моделей"""
     models = {
         'Linear Regression': LinearRegression(),
@@ -74,15 +72,23 @@ def train_models(X_train, y_train):
     print("\n=== Обучение моделей ===")
     for name, model in models.items():
         print(f"\nОбучение {name}...")
-        model.fit(X_train, y_train)
+        loss_curve = None
+        with report_stage(report, f'fit: {name}', rows=len(y_train)):
+            if isinstance(model, GradientBoostingRegressor):
+                # n_estimators - верхняя граница, число деревьев выбирается по валидации
+                loss_curve = fit_with_early_stopping(model, X_train, y_train)
+            else:
+                model.fit(X_train, y_train)
         trained_models[name] = model
         
         # Cross-validation
-        cv_scores = cross_val_score(model, X_train, y_train, cv=5, 
-                                     scoring='neg_mean_squared_error')
+        with report_stage(report, f'cv: {name}', rows=len(y_train)):
+            cv_scores = cross_val_score(model, X_train, y_train, cv=5, 
+                                         scoring='neg_mean_squared_error')
         scores[name] = {
             'cv_mse': -cv_scores.mean(),
-            'cv_std': cv_scores.std()
+            'cv_std': cv_scores.std(),
+            'loss_curve': loss_curve
         }
         print(f"  CV MSE: {scores[name]['cv_mse']:.4f} (+/- {scores[name]['cv_std']:.4f})")
     
@@ -149,8 +155,16 @@ def plot_predictions(y_test, predictions, model_name):
     plt.savefig(f'data/predictions_{model_name.replace(" ", "_").lower()}.png', dpi=300)
     print(f"График предсказаний сохранен: data/predictions_{model_name.replace(' ', '_').lower()}.png")
 
-def save_best_model(models, results, feature_columns, data_size):
-    """Сохранение лучшей модели"""
+def save_best_model(models, results, feature_columns, data_size, report=None, y_test=None, X_test=None,
+                    loss_curves=None, directory='models'):
+    """
+    Сохранение лучшей модели в directory (временный каталог реестра, см. publish_standard_model)
+    
+    y_test - реальные значения тестовой выборки: по остаткам лучшей модели
+    калибруются интервалы прогноза (prediction_intervals.py);
+    X_test - нормализованные признаки для глобальных важностей (explanations.py);
+    loss_curves - кривые обучения по именам моделей (early_stopping.py)
+    """
     # Находим модель с наименьшим RMSE
     best_model_name = min(results.keys(), key=lambda x: results[x]['rmse'])
     best_model = models[best_model_name]
@@ -159,16 +173,40 @@ def save_best_model(models, results, feature_columns, data_size):
     print(f"RMSE: {results[best_model_name]['rmse']:.4f}")
     print(f"R²: {results[best_model_name]['r2']:.4f}")
     
-    # Сохраняем модель
+    # Интервалы прогноза по остаткам на тестовой выборке; прогнозы теста
+    # сохраняются отдельно от модели (evaluation_store.py)
+    intervals = None
+    residuals = None
+    if y_test is not None:
+        intervals = ConformalIntervals().fit(y_test, results[best_model_name]['predictions'])
+        print(f"Интервал {intervals.coverage:.0%}: [{intervals.q_low:+.3f}, {intervals.q_high:+.3f}]")
+        residuals = save_evaluation(
+            os.path.join(directory, 'evaluation.npz'), y_test, results[best_model_name]['predictions'],
+            best_model_name
+        )
+        print("Прогнозы тестовой выборки сохранены: evaluation.npz")
+    
+    # Сохраняем модель (только то, что нужно для прогноза)
     model_data = {
         'model': best_model,
         'model_name': best_model_name,
         'feature_columns': feature_columns,
-        'metrics': results[best_model_name]
+        'feature_spec': STANDARD_SPEC.to_dict(),
+        'feature_dtype': FEATURE_DTYPE.name,
+        'metrics': serving_metrics(results[best_model_name]),
+        'intervals': intervals
     }
     
-    joblib.dump(model_data, 'models/popularity_model.pkl')
-    print("\nМодель сохранена: models/popularity_model.pkl")
+    model_path = os.path.join(directory, 'popularity_model.pkl')
+    with report_stage(report, 'save_model'):
+        joblib.dump(model_data, model_path)
+    print("\nМодель сохранена: popularity_model.pkl")
+    
+    if X_test is not None:
+        with report_stage(report, 'global_importance', rows=len(X_test)):
+            cache_global_importance(
+                model_path, best_model, feature_columns, X_test, best_model_name
+            )
     
     # Сохраняем метрики для веб-интерфейса
     from datetime import datetime
@@ -180,26 +218,205 @@ def save_best_model(models, results, feature_columns, data_size):
         'r2_score': results[best_model_name]['r2'],
         'training_samples': data_size,
         'model_type': best_model_name,
-        'features': feature_columns
+        'features': feature_columns,
+        'prediction_interval': intervals.summary() if intervals is not None else None,
+        'residuals': residuals,
+        'loss_curve': (loss_curves or {}).get(best_model_name)
     }
     
-    with open('models/model_metrics.json', 'w') as f:
+    with open(os.path.join(directory, 'model_metrics.json'), 'w') as f:
         json.dump(metrics_json, f, indent=2)
     
-    print("Метрики сохранены: models/model_metrics.json")
+    print("Метрики сохранены: model_metrics.json")
     
     return best_model, best_model_name
 
-def main():
+def publish_standard_model(registry, staging, model_type, report=None, candidate=False):
+    """
+    Публикация артефактов стандартной модели из временного каталога реестра
+    (registry.staging) и переключение текущей версии; models/ обновляется только
+    при переключении, поэтому кандидат его не затрагивает
+    
+    candidate - не переключать, а отправить версию на теневую оценку (shadow.py)
+    """
+    with report_stage(report, 'publish'):
+        version = registry.publish_staged(
+            'standard', staging, {'model_type': model_type},
+            promote=not candidate, run_files=STANDARD_RUN_FILES
+        )
+        staged = candidate and registry.propose('standard', version)
+    print(f"Версия в реестре: {version} (models/registry/standard/{version})"
+          + (" - кандидат на теневой оценке" if staged else ""))
+    if report is not None:
+        report.set('registry_version', version)
+        report.set('candidate', bool(staged))
+        bundle = registry.bundle_dir('standard', version)
+        for filename in ('popularity_model.pkl', 'scaler.pkl', 'evaluation.npz'):
+            report.add_artifact(os.path.join(bundle, filename))
+    return version
+
+def save_scaler(scaler, directory, report=None):
+    with report_stage(report, 'save_scaler'):
+        joblib.dump(scaler, os.path.join(directory, 'scaler.pkl'))
+    print("Scaler сохранен: scaler.pkl")
+
+def iter_feature_chunks(filename, chunk_size):
+    """Потоковая подготовка признаков: (X, y, feature_columns) по частям"""
+    for records in iter_chunks(iter_json_records(filename), chunk_size):
+        X, y, feature_columns = prepare_features(pd.DataFrame(records))
+        yield X, y.astype(np.float64), feature_columns
+
+class ReservoirHoldout:
+    """Отложенная выборка фиксированного размера (reservoir sampling, алгоритм R)"""
+    
+    def __init__(self, size, n_features, seed=42):
+        self.size = size
+        self.X = np.empty((size, n_features), dtype=FEATURE_DTYPE)
+        self.y = np.empty(size)
+        self.indices = np.full(size, -1, dtype=np.int64)
+        self.seen = 0
+        self.rng = np.random.RandomState(seed)
+    
+    def add(self, X, y):
+        """Обработка очередной части данных"""
+        n = len(y)
+        positions = np.arange(self.seen, self.seen + n)
+        # Для строки с глобальным номером i слот выбирается из [0, i]
+        slots = np.floor(self.rng.random_sample(n) * (positions + 1)).astype(np.int64)
+        filling = positions < self.size
+        slots[filling] = positions[filling]
+        for row in np.flatnonzero(slots < self.size):
+            slot = slots[row]
+            self.X[slot] = X[row]
+            self.y[slot] = y[row]
+            self.indices[slot] = positions[row]
+        self.seen += n
+    
+    def finalize(self, max_size=None):
+        """
+        Обрезка незаполненных слотов; возвращает отсортированные номера строк выборки
+        
+        max_size - уменьшение выборки случайным подмножеством (остается равномерной
+        выборкой из всех строк), когда строк меньше, чем ожидалось при создании
+        """
+        filled = min(self.seen, self.size)
+        keep = np.arange(filled)
+        if max_size is not None and max_size < filled:
+            keep = np.sort(self.rng.choice(filled, max(max_size, 0), replace=False))
+        self.X, self.y, self.indices = self.X[keep], self.y[keep], self.indices[keep]
+        return np.sort(self.indices)
+
+def iter_training_chunks(filename, chunk_size, holdout_indices):
+    """Части данных без строк отложенной выборки: (X, y)"""
+    offset = 0
+    for X_chunk, y_chunk, _ in iter_feature_chunks(filename, chunk_size):
+        positions = np.arange(offset, offset + len(y_chunk))
+        offset += len(y_chunk)
+        mask = ~np.isin(positions, holdout_indices, assume_unique=True)
+        if mask.any():
+            yield X_chunk[mask], y_chunk[mask]
+
+def train_out_of_core(filename='data/preprocessed_data.json', chunk_size=10000, epochs=5,
+                      holdout_size=10000, report=None):
+    """
+    Обучение стандартной модели по частям данных (для наборов больше RAM)
+    
+    Проход 1: reservoir-выборка для теста (не больше HOLDOUT_FRACTION строк -
+    число строк известно после прохода).
+    Проход 2: StandardScaler.partial_fit без строк отложенной выборки
+    (как fit на тренировочной части в train_model).
+    Проходы 3..epochs+2: SGDRegressor.partial_fit на нормализованных частях
+    без строк отложенной выборки.
+    
+    Raises:
+        ValueError: нет данных или их слишком мало для обучения и теста
+    """
+    feature_columns = None
+    holdout = None
+    
+    print("\n=== Проход 1: отложенная выборка ===")
+    with report_stage(report, 'holdout_sample') as stage_info:
+        for X_chunk, y_chunk, feature_columns in iter_feature_chunks(filename, chunk_size):
+            if holdout is None:
+                holdout = ReservoirHoldout(holdout_size, X_chunk.shape[1])
+            holdout.add(X_chunk.values, y_chunk)
+        stage_info['rows'] = holdout.seen if holdout else 0
+    if holdout is None:
+        raise ValueError(f"Нет данных в {filename}")
+    
+    total_rows = holdout.seen
+    holdout_indices = holdout.finalize(int(total_rows * HOLDOUT_FRACTION))
+    if len(holdout_indices) == 0:
+        raise ValueError(
+            f"Нет строк для теста: {total_rows} записей в {filename}, holdout_size={holdout_size} "
+            f"(нужно не меньше {int(np.ceil(1 / HOLDOUT_FRACTION))} записей и holdout_size > 0)"
+        )
+    print(f"Всего записей: {total_rows}, отложено для теста: {len(holdout_indices)}")
+    train_rows = total_rows - len(holdout_indices)
+    
+    print("\n=== Проход 2: нормализация ===")
+    scaler = StandardScaler()
+    with report_stage(report, 'scaler_partial_fit', rows=train_rows):
+        for X_train, _ in iter_training_chunks(filename, chunk_size, holdout_indices):
+            scaler.partial_fit(X_train)
+    
+    model = SGDRegressor(random_state=42)
+    rng = np.random.RandomState(42)
+    for epoch in range(1, epochs + 1):
+        print(f"Эпоха {epoch}/{epochs}...")
+        with report_stage(report, f'fit: epoch {epoch}', rows=train_rows):
+            for X_train, y_train in iter_training_chunks(filename, chunk_size, holdout_indices):
+                order = rng.permutation(len(y_train))
+                model.partial_fit(scaler.transform(X_train)[order], y_train[order])
+    
+    name = 'SGD Regressor (out-of-core)'
+    with report_stage(report, 'evaluate', rows=len(holdout.y)):
+        X_holdout = pd.DataFrame(holdout.X, columns=feature_columns)
+        results = evaluate_models({name: model}, scaler.transform(X_holdout), holdout.y)
+    return {name: model}, results, scaler, feature_columns, total_rows, holdout
+
+def main_out_of_core(chunk_size, epochs, holdout_size, candidate=False):
+    """Обучение без загрузки всех данных в память"""
+    print("Запуск обучения модели по частям данных (out-of-core)...")
+    report = RunReport('standard_out_of_core')
+    
+    models, results, scaler, feature_columns, data_size, holdout = train_out_of_core(
+        chunk_size=chunk_size, epochs=epochs, holdout_size=holdout_size, report=report
+    )
+    
+    X_holdout = scaler.transform(pd.DataFrame(holdout.X, columns=feature_columns))
+    best_model_name = min(results.keys(), key=lambda x: results[x]['rmse'])
+    
+    registry = ModelRegistry()
+    with registry.staging('standard') as staging:
+        save_best_model(models, results, feature_columns, data_size, report, holdout.y, X_holdout,
+                        directory=staging)
+        save_scaler(scaler, staging, report)
+        publish_standard_model(registry, staging, best_model_name, report, candidate)
+    
+    report.set('model_type', best_model_name)
+    report.set('training_samples', data_size)
+    report.set('chunk_size', chunk_size)
+    report.set('epochs', epochs)
+    report.write('models/training_report.json')
+    print("Отчет о запуске сохранен: models/training_report.json")
+    
+    print("\n=== Обучение завершено! ===")
+
+def main(candidate=False):
     """Основная функция"""
     print("Запуск обучения модели машинного обучения...")
+    report = RunReport('standard')
     
     # Загрузка данных
-    df = load_data()
+    with report_stage(report, 'load_data') as stage_info:
+        df = load_data()
+        stage_info['rows'] = len(df)
     print(f"Загружено {len(df)} записей")
     
     # Подготовка признаков
-    X, y, feature_columns = prepare_features(df)
+    with report_stage(report, 'prepare_features', rows=len(df)):
+        X, y, feature_columns = prepare_features(df)
     print(f"\nПризнаков: {len(feature_columns)}")
     print(f"Целевая переменная: popularity_score")
     
@@ -211,30 +428,62 @@ def main():
     print(f"Тестовая выборка: {len(X_test)}")
     
     # Нормализация признаков
-    scaler = StandardScaler()
-    X_train_scaled = scaler.fit_transform(X_train)
-    X_test_scaled = scaler.transform(X_test)
+    with report_stage(report, 'scaler_fit', rows=len(X_train)):
+        scaler = StandardScaler()
+        X_train_scaled = scaler.fit_transform(X_train)
+        X_test_scaled = scaler.transform(X_test)
     
     # Обучение моделей
-    models, cv_scores = train_models(X_train_scaled, y_train)
+    models, cv_scores = train_models(X_train_scaled, y_train, report)
     
     # Оценка моделей
-    results = evaluate_models(models, X_test_scaled, y_test)
+    with report_stage(report, 'evaluate', rows=len(X_test)):
+        results = evaluate_models(models, X_test_scaled, y_test)
     
     # Визуализация важности признаков
-    plot_feature_importance(models['Random Forest'], feature_columns)
-    
-    # Визуализация предсказаний лучшей модели
-    best_model_name = min(results.keys(), key=lambda x: results[x]['rmse'])
-    plot_predictions(y_test, results[best_model_name]['predictions'], best_model_name)
+    with report_stage(report, 'plots'):
+        plot_feature_importance(models['Random Forest'], feature_columns)
+        
+        # Визуализация предсказаний лучшей модели
+        best_model_name = min(results.keys(), key=lambda x: results[x]['rmse'])
+        plot_predictions(y_test, results[best_model_name]['predictions'], best_model_name)
     
     # Сохранение лучшей модели и scaler
     data_size = len(X_train) + len(X_test)
-    save_best_model(models, results, feature_columns, data_size)
-    joblib.dump(scaler, 'models/scaler.pkl')
-    print("Scaler сохранен: models/scaler.pkl")
+    loss_curves = {name: info['loss_curve'] for name, info in cv_scores.items() if info['loss_curve']}
+    
+    registry = ModelRegistry()
+    with registry.staging('standard') as staging:
+        save_best_model(models, results, feature_columns, data_size, report, y_test, X_test_scaled, loss_curves,
+                        directory=staging)
+        save_scaler(scaler, staging, report)
+        publish_standard_model(registry, staging, best_model_name, report, candidate)
+    
+    # Отчет о запуске
+    report.set('model_type', best_model_name)
+    report.set('training_samples', data_size)
+    report.write('models/training_report.json')
+    print("Отчет о запуске сохранен: models/training_report.json")
     
     print("\n=== Обучение завершено! ===")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description='Обучение стандартной модели популярности')
+    parser.add_argument('--out-of-core', action='store_true',
+                        help='обучение по частям без загрузки всех данных в память')
+    parser.add_argument('--chunk-size', type=int, default=10000, help='строк в части (out-of-core)')
+    parser.add_argument('--epochs', type=int, default=5, help='проходов по данным (out-of-core)')
+    parser.add_argument('--holdout-size', type=int, default=10000,
+                        help='размер отложенной выборки (out-of-core)')
+    parser.add_argument('--candidate', action='store_true',
+                        help='не переключать текущую версию, а отправить на теневую оценку')
+    args = parser.parse_args()
+    
+    if args.out_of_core:
+        try:
+            main_out_of_core(args.chunk_size, args.epochs, args.holdout_size, args.candidate)
+        except ValueError as e:
+            print(f"Ошибка: {e}", file=sys.stderr)
+            sys.exit(1)
+    else:
+        main(args.candidate)
@@ -3,7 +3,9 @@
 Расширенное обучение модели с поддержкой текстовых признаков (теги, описание)
 """
 
+import argparse
 import json
+import os
 import pandas as pd
 import numpy as np
 from sklearn.model_selection import train_test_split, cross_val_score
@@ -12,10 +14,29 @@ from sklearn.linear_model import LinearRegression
 from sklearn.preprocessing import StandardScaler
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics import mean_squared_error, r2_score, mean_absolute_error
-from sklearn.compose import ColumnTransformer
-from sklearn.pipeline import Pipeline
 import joblib
-import re
+from tag_vocabulary import TagVocabulary
+from run_report import RunReport, report_stage
+from similarity_index import SimilarityIndex, index_features
+from prediction_intervals import ConformalIntervals
+from distillation import StudentModel, median_latency_ms
+from explanations import cache_global_importance
+from model_registry import ModelRegistry
+from feature_spec import ADVANCED_SPEC, FEATURE_DTYPE, calculate_popularity, model_matrix
+from evaluation_store import save_evaluation, serving_metrics
+from sampling import sample_records, POPULARITY_EDGES
+from cascade import evaluate_cascade, fit_cascade_bound
+from dedup import deduplicate
+from early_stopping import fit_with_early_stopping
+from text_cache import cache_stats, clean_text, tfidf_fit_transform, tfidf_transform
+
+# Артефакты набора в реестре (для отчета о запуске)
+ADVANCED_ARTIFACTS = ('popularity_model_advanced.pkl', 'tag_vocabulary.json', 'popularity_model_student.pkl',
+                      'similarity_index.pkl', 'evaluation_advanced.npz')
+# Файлы запуска: не входят в версию реестра (метрики содержат дату обучения)
+ADVANCED_RUN_FILES = ('model_metrics_advanced.json', 'evaluation_advanced.npz')
+# Доля отложенной выборки для калибровки интервала ученика и границы каскада
+STUDENT_CALIBRATION_FRACTION = 0.5
 
 def load_raw_data(filename='data/raw_models.json'):
     """Загрузка сырых данных с тегами и описанием"""
@@ -23,18 +44,6 @@ def load_raw_data(filename='data/raw_models.json'):
         data = json.load(f)
     return data
 
-def preprocess_text(text):
-    """Предобработка текста"""
-    if not text:
-        return ""
-    # Приводим к нижнему регистру
-    text = text.lower()
-    # Удаляем специальные символы
-    text = re.sub(r'[^a-zA-Z0-9\s]', ' ', text)
-    # Удаляем множественные пробелы
-    text = re.sub(r'\s+', ' ', text).strip()
-    return text
-
 def prepare_advanced_features(raw_data):
     """Подготовка признаков с текстовыми данными"""
     df_list = []
@@ -52,13 +61,6 @@ def prepare_advanced_features(raw_data):
         
         # Категории
         categories = model.get('categories', [])
-        if isinstance(categories, list):
-            categories_text = ' '.join([str(cat) for cat in categories])
-        else:
-            categories_text = ""
-        
-        # Объединяем все текстовые данные
-        combined_text = preprocess_text(f"{tags_text} {description} {categories_text}")
         
         # Численные признаки
         face_count = model.get('faceCount', 0)
@@ -77,15 +79,17 @@ def prepare_advanced_features(raw_data):
         downloads = model.get('downloadCount', 0)
         
         # Вычисляем популярность
-        popularity = (np.log1p(views) * 0.25 + 
-                     np.log1p(likes) * 0.35 + 
-                     np.log1p(downloads) * 0.25 +
-                     calculate_polygon_score(face_count) * 0.15)
+        popularity = calculate_popularity(views, likes, downloads, face_count)
         
         df_list.append({
-            'combined_text': combined_text,
-            'tags_text': preprocess_text(tags_text),
-            'description_text': preprocess_text(description),
+            'uid': model.get('uid', ''),
+            'name': model.get('name', ''),
+            'view_count': views,
+            'like_count': likes,
+            'tags': tags if isinstance(tags, list) else [],
+            'categories': categories if isinstance(categories, list) else [],
+            'tags_text': clean_text(tags_text),
+            'description_text': clean_text(description),
             'category_count': len(categories) if isinstance(categories, list) else 0,
             'tag_count': len(tags) if isinstance(tags, list) else 0,
             'description_length': len(description),
@@ -100,65 +104,35 @@ def prepare_advanced_features(raw_data):
     
     return pd.DataFrame(df_list)
 
-def calculate_polygon_score(face_count):
-    """Оценка качества по полигонам (копия из Go кода)"""
-    if face_count <= 0:
-        return 0
-    
-    min_optimal = 5000.0
-    max_optimal = 50000.0
-    penalty_rate = 0.5
-    
-    faces = float(face_count)
-    
-    if faces >= min_optimal and faces <= max_optimal:
-        mid = (min_optimal + max_optimal) / 2
-        distance = abs(faces - mid)
-        max_distance = (max_optimal - min_optimal) / 2
-        return 10.0 * (1.0 - (distance / max_distance) * 0.2)
-    
-    if faces < min_optimal:
-        ratio = faces / min_optimal
-        return np.log1p(faces) * ratio * penalty_rate
-    
-    excess = (faces - max_optimal) / max_optimal
-    penalty = 1.0 / (1.0 + excess * penalty_rate)
-    return 10.0 * penalty
+def build_tag_vocabulary(tag_records):
+    """Словарь тегов/категорий для multi-hot признаков"""
+    return TagVocabulary(min_df=2, max_size=100).fit(tag_records)
 
-def create_advanced_pipeline():
-    """Создание pipeline с обработкой текста"""
-    # Численные признаки
-    numeric_features = [
-        'category_count', 'tag_count', 'description_length',
-        'face_count', 'vertex_count', 'animation_count',
-        'is_downloadable', 'is_premium_author', 'author_followers'
-    ]
-    
-    # Создаем TF-IDF векторизатор для текста
-    # max_features ограничивает количество признаков
-    tfidf = TfidfVectorizer(
-        max_features=100,
-        min_df=2,
-        max_df=0.8,
-        ngram_range=(1, 2)
-    )
-    
-    return numeric_features, tfidf
-
-def train_advanced_model(X_train_numeric, X_train_text, y_train):
-    """Обучение модели с текстовыми признаками"""
+def train_advanced_model(X_train_numeric, X_train_text, y_train, X_train_tags=None, vocabulary=None,
+                         report=None):
+    """
+    Обучение модели с текстовыми признаками (с ранней остановкой бустинга)
+    
+    X_train_text - текст описаний: теги и категории входят в модель только
+    multi-hot блоком словаря и в TF-IDF повторно не токенизируются
+    """
     # Векторизация текста
     tfidf = TfidfVectorizer(
         max_features=100,
         min_df=2,
         max_df=0.8,
-        ngram_range=(1, 2)
+        ngram_range=(1, 2),
+        dtype=FEATURE_DTYPE
     )
     
-    X_train_text_vec = tfidf.fit_transform(X_train_text).toarray()
+    with report_stage(report, 'tfidf_fit', rows=len(y_train)):
+        X_train_text_vec = tfidf_fit_transform(tfidf, X_train_text)
     
-    # Объединяем численные и текстовые признаки
-    X_train_combined = np.hstack([X_train_numeric, X_train_text_vec])
+    # Объединяем численные, текстовые и multi-hot признаки тегов (разреженные до модели)
+    blocks = [X_train_numeric, X_train_text_vec]
+    if vocabulary is not None:
+        blocks.append(vocabulary.transform(X_train_tags))
+    X_train_combined = model_matrix(blocks)
     
     # Обучаем модель
     model = GradientBoostingRegressor(
@@ -169,14 +143,28 @@ def train_advanced_model(X_train_numeric, X_train_text, y_train):
         subsample=0.8
     )
     
-    model.fit(X_train_combined, y_train)
+    # n_estimators - верхняя граница, число деревьев выбирается по валидации
+    with report_stage(report, 'model_fit', rows=len(y_train)):
+        loss_curve = fit_with_early_stopping(model, X_train_combined, y_train)
     
-    return model, tfidf, X_train_text_vec.shape[1]
+    return model, tfidf, X_train_text_vec.shape[1], loss_curve
 
-def evaluate_advanced_model(model, tfidf, X_test_numeric, X_test_text, y_test):
+def combine_features(tfidf, X_numeric_scaled, X_text, X_tags=None, vocabulary=None, cached=True):
+    """
+    Матрица признаков расширенной модели: численные + TF-IDF + multi-hot тегов
+    
+    cached=False - без кеша строк TF-IDF (замер задержки холодного запроса)
+    """
+    X_text_vec = tfidf_transform(tfidf, X_text) if cached else tfidf.transform(X_text)
+    blocks = [X_numeric_scaled, X_text_vec]
+    if vocabulary is not None:
+        blocks.append(vocabulary.transform(X_tags))
+    return model_matrix(blocks)
+
+def evaluate_advanced_model(model, tfidf, X_test_numeric, X_test_text, y_test,
+                            X_test_tags=None, vocabulary=None):
     """Оценка модели с текстовыми признаками"""
-    X_test_text_vec = tfidf.transform(X_test_text).toarray()
-    X_test_combined = np.hstack([X_test_numeric, X_test_text_vec])
+    X_test_combined = combine_features(tfidf, X_test_numeric, X_test_text, X_test_tags, vocabulary)
     
     y_pred = model.predict(X_test_combined)
     
@@ -193,20 +181,160 @@ def evaluate_advanced_model(model, tfidf, X_test_numeric, X_test_text, y_test):
         'predictions': y_pred
     }
 
-def save_advanced_model(model, tfidf, scaler, numeric_features, text_features_count, metrics):
-    """Сохранение расширенной модели"""
+def calibration_split(n, fraction=STUDENT_CALIBRATION_FRACTION, seed=42):
+    """
+    Индексы калибровочной и оценочной частей отложенной выборки
+    (в каждой части не меньше одной строки, если строк хотя бы две)
+    """
+    order = np.random.RandomState(seed).permutation(n)
+    n_calibration = min(max(int(round(n * fraction)), 1), n - 1) if n > 1 else n
+    return np.sort(order[:n_calibration]), np.sort(order[n_calibration:])
+
+def distill_student_model(teacher, tfidf, scaler, vocabulary, train, test, teacher_metrics, report=None,
+                          directory='models'):
+    """
+    Дистилляция учителя в линейную модель над хешированными признаками
+    (артефакт - в directory, временный каталог реестра)
+    
+    Args:
+        train, test: кортежи (X_numeric DataFrame, X_text, X_tags, y)
+        teacher_metrics: результат evaluate_advanced_model для учителя
+    """
+    X_train_num, X_train_text, X_train_tags, _ = train
+    X_test_num, X_test_text, X_test_tags, y_test = test
+    
+    # Ученик учится на прогнозах учителя, а не на исходной цели
+    with report_stage(report, 'distill_student', rows=len(X_train_num)):
+        y_teacher = teacher.predict(combine_features(
+            tfidf, scaler.transform(X_train_num), X_train_text, X_train_tags, vocabulary
+        ))
+        student = StudentModel(X_train_num.columns).fit(
+            X_train_num.values, X_train_text, X_train_tags, y_teacher
+        )
+    
+    # Отложенная выборка делится на калибровочную часть (интервал ученика и граница
+    # каскада) и оценочную (метрики и согласие каскада), чтобы отчет не был завышен
+    y_pred = student.predict(X_test_num.values, X_test_text, X_test_tags)
+    y_teacher_test = np.asarray(teacher_metrics['predictions'])
+    calibration, evaluation = calibration_split(len(y_pred))
+    metrics = {
+        'rmse': float(np.sqrt(mean_squared_error(y_test[evaluation], y_pred[evaluation]))),
+        'mae': float(mean_absolute_error(y_test[evaluation], y_pred[evaluation])),
+        'r2': float(r2_score(y_test[evaluation], y_pred[evaluation])),
+        # Насколько точно ученик повторяет учителя
+        'fidelity_r2': float(r2_score(y_teacher_test[evaluation], y_pred[evaluation])),
+        # Учитель - на той же оценочной части
+        'r2_gap': float(r2_score(y_test[evaluation], y_teacher_test[evaluation])
+                        - r2_score(y_test[evaluation], y_pred[evaluation])),
+        'calibration_rows': int(len(calibration)),
+        'evaluation_rows': int(len(evaluation))
+    }
+    
+    # Задержка одного запроса (включая преобразование признаков)
+    one_num, one_text, one_tags = X_test_num.iloc[:1], X_test_text.iloc[:1], X_test_tags[:1]
+    latency = {
+        'teacher': median_latency_ms(lambda: teacher.predict(combine_features(
+            tfidf, scaler.transform(one_num), one_text, one_tags, vocabulary, cached=False
+        ))),
+        'student': median_latency_ms(lambda: student.predict(one_num.values, one_text, one_tags))
+    }
+    
+    # Каскад (cascade.py): граница ошибки ученика относительно учителя калибруется на
+    # калибровочной части и проверяется на оценочной - та же граница используется при прогнозе
+    cascade_bound = fit_cascade_bound(y_teacher_test[calibration], y_pred[calibration])
+    cascade_metrics = evaluate_cascade(
+        cascade_bound, y_teacher_test[evaluation], y_pred[evaluation], POPULARITY_EDGES, latency
+    )
+    
+    student_data = {
+        'model': student,
+        'model_name': 'Distilled Ridge over Hashed Features',
+        'teacher_name': 'Advanced Gradient Boosting with Text Features',
+        'text_source': 'description',
+        'metrics': metrics,
+        'latency_ms': latency,
+        'intervals': ConformalIntervals().fit(y_test[calibration], y_pred[calibration]),
+        'cascade': cascade_bound,
+        'cascade_metrics': cascade_metrics
+    }
+    with report_stage(report, 'save_student'):
+        joblib.dump(student_data, os.path.join(directory, 'popularity_model_student.pkl'))
+    print("\nМодель-ученик сохранена: popularity_model_student.pkl")
+    print(f"R² ученика: {metrics['r2']:.4f} (учитель: {metrics['r2'] + metrics['r2_gap']:.4f}, "
+          f"разница: {metrics['r2_gap']:.4f}, согласие с учителем: {metrics['fidelity_r2']:.4f})")
+    print(f"Задержка одного прогноза: учитель {latency['teacher']:.2f} мс, ученик {latency['student']:.2f} мс")
+    print(f"Каскад: расширенной модели передано {cascade_metrics['escalation_rate']:.1%} запросов, "
+          f"категория совпадает с учителем у {cascade_metrics['category_agreement']:.1%} "
+          f"(только ученик: {cascade_metrics['student_category_agreement']:.1%}), "
+          f"ожидаемая задержка {cascade_metrics['expected_latency_ms']:.2f} мс; "
+          f"оценка на {metrics['evaluation_rows']} строках, калибровка на {metrics['calibration_rows']}")
+    return student_data
+
+def build_similarity_index(df, numeric_features, scaler, tfidf, vocabulary=None):
+    """
+    Индекс похожих моделей по всему каталогу в пространстве признаков модели
+    (TF-IDF и теги остаются разреженными, описания моделей - колонками)
+    """
+    blocks = [
+        scaler.transform(ADVANCED_SPEC.frame(df)),
+        tfidf_transform(tfidf, df['description_text'])
+    ]
+    if vocabulary is not None:
+        blocks.append(vocabulary.transform(list(zip(df['tags'], df['categories']))))
+    
+    metadata = {
+        'uid': df['uid'].to_numpy(dtype=object),
+        'name': df['name'].to_numpy(dtype=object),
+        'view_count': df['view_count'].to_numpy(dtype=np.int64),
+        'like_count': df['like_count'].to_numpy(dtype=np.int64),
+        'popularity_score': df['popularity_score'].to_numpy(dtype=np.float32)
+    }
+    return SimilarityIndex().fit(index_features(blocks), metadata)
+
+def save_advanced_model(model, tfidf, scaler, numeric_features, text_features_count, metrics,
+                        vocabulary=None, report=None, y_test=None, loss_curve=None, directory='models'):
+    """
+    Сохранение расширенной модели в directory (временный каталог реестра);
+    y_test - для калибровки интервалов прогноза; прогнозы тестовой выборки
+    сохраняются отдельно в evaluation_advanced.npz, кривая обучения
+    (loss_curve, early_stopping.py) - в JSON метрик
+    """
+    intervals = None
+    residuals = None
+    if y_test is not None:
+        intervals = ConformalIntervals().fit(y_test, metrics['predictions'])
+        print(f"\nИнтервал {intervals.coverage:.0%}: [{intervals.q_low:+.3f}, {intervals.q_high:+.3f}]")
+        residuals = save_evaluation(
+            os.path.join(directory, 'evaluation_advanced.npz'), y_test, metrics['predictions'],
+            'Advanced Gradient Boosting with Text Features'
+        )
+    
     model_data = {
         'model': model,
         'tfidf': tfidf,
         'scaler': scaler,
+        'tag_vocabulary': vocabulary,
+        # TF-IDF по описанию: теги и категории - в multi-hot блоке словаря
+        'text_source': 'description',
+        'intervals': intervals,
         'model_name': 'Advanced Gradient Boosting with Text Features',
         'numeric_features': numeric_features,
+        'feature_spec': ADVANCED_SPEC.to_dict(),
         'text_features_count': text_features_count,
-        'metrics': metrics
+        'feature_dtype': FEATURE_DTYPE.name,
+        'metrics': serving_metrics(metrics)
     }
     
-    joblib.dump(model_data, 'models/popularity_model_advanced.pkl')
-    print("\nРасширенная модель сохранена: models/popularity_model_advanced.pkl")
+    with report_stage(report, 'save_model'):
+        joblib.dump(model_data, os.path.join(directory, 'popularity_model_advanced.pkl'))
+    print("\nРасширенная модель сохранена: popularity_model_advanced.pkl")
+    if residuals is not None:
+        print("Прогнозы тестовой выборки сохранены: evaluation_advanced.npz")
+    
+    if vocabulary is not None:
+        vocabulary.save(os.path.join(directory, 'tag_vocabulary.json'))
+        print("Словарь тегов сохранен: tag_vocabulary.json")
+    tag_features_count = len(vocabulary) if vocabulary is not None else 0
     
     # Метрики
     from datetime import datetime
@@ -220,118 +348,215 @@ def save_advanced_model(model, tfidf, scaler, numeric_features, text_features_co
         'features': {
             'numeric': numeric_features,
             'text_features_count': text_features_count,
-            'total': len(numeric_features) + text_features_count
-        }
+            'tag_features_count': tag_features_count,
+            'total': len(numeric_features) + text_features_count + tag_features_count
+        },
+        'prediction_interval': intervals.summary() if intervals is not None else None,
+        'residuals': residuals,
+        'loss_curve': loss_curve
     }
     
-    with open('models/model_metrics_advanced.json', 'w') as f:
+    with open(os.path.join(directory, 'model_metrics_advanced.json'), 'w') as f:
         json.dump(metrics_json, f, indent=2)
     
-    print("Метрики сохранены: models/model_metrics_advanced.json")
+    print("Метрики сохранены: model_metrics_advanced.json")
 
-def main():
-    """Основная функция"""
+def main(limit=None, seed=42, dedup=True, dedup_threshold=0.9, candidate=False):
+    """
+    Основная функция
+    
+    limit - быстрый запуск на стратифицированной выборке из limit моделей
+    (sampling.py): файл читается потоково, целиком не загружается;
+    dedup - удаление точных и почти дубликатов до разделения на train/test (dedup.py);
+    candidate - новая версия не заменяет текущую, а проходит теневую оценку (shadow.py)
+    """
     print("=" * 60)
     print("Обучение расширенной модели с текстовыми признаками")
     print("=" * 60)
     
     # Загрузка данных
     print("\nЗагрузка сырых данных...")
-    raw_data = load_raw_data()
-    
-    # Применяем ограничение если задано
-    if 'limit' in globals() and limit:
-        raw_data = raw_data[:limit]
+    report = RunReport('advanced')
+    with report_stage(report, 'load_data') as stage_info:
+        if limit:
+            raw_data, sampling = sample_records('data/raw_models.json', limit, seed)
+            report.set('sampling', sampling)
+            print(f"Выборка {sampling['sampled']} из {sampling['seen']} моделей "
+                  f"(слоев: {sampling['strata']}, seed={seed})")
+        else:
+            raw_data = load_raw_data()
+        stage_info['rows'] = len(raw_data)
     
     print(f"Загружено {len(raw_data)} моделей")
     
+    # Удаление дубликатов до разделения, чтобы копии не попадали в обе выборки
+    if dedup:
+        with report_stage(report, 'dedup', rows=len(raw_data)):
+            raw_data, dedup_report = deduplicate(raw_data, dedup_threshold)
+        with open('models/dedup_report.json', 'w') as f:
+            json.dump(dedup_report, f, indent=2)
+        report.set('dedup', {key: value for key, value in dedup_report.items() if key != 'examples'})
+        removed = dedup_report['removed']
+        print(f"Удалено дубликатов: {removed['total']} (uid: {removed['uid']}, содержимое: {removed['content']}, "
+              f"почти дубликаты: {removed['near']}), осталось {len(raw_data)}")
+        print("Отчет о дубликатах сохранен: models/dedup_report.json")
+    
     # Подготовка признаков
     print("\nПодготовка признаков (включая текст)...")
-    df = prepare_advanced_features(raw_data)
+    with report_stage(report, 'prepare_features', rows=len(raw_data)):
+        df = prepare_advanced_features(raw_data)
     print(f"Подготовлено {len(df)} записей")
     
-    # Разделение на признаки и целевую переменную
-    numeric_features = [
-        'category_count', 'tag_count', 'description_length',
-        'face_count', 'vertex_count', 'animation_count',
-        'is_downloadable', 'is_premium_author', 'author_followers'
-    ]
+    # Разделение на признаки и целевую переменную (см. feature_spec.ADVANCED_SPEC)
+    numeric_features = list(ADVANCED_SPEC.names)
     
-    X_numeric = df[numeric_features]
-    X_text = df['combined_text']
+    X_numeric = ADVANCED_SPEC.frame(df)
+    # Теги и категории - в словаре (multi-hot), в TF-IDF только описание
+    X_text = df['description_text']
+    X_tags = list(zip(df['tags'], df['categories']))
     y = df['popularity_score'].values
     
     # Разделение на train/test
-    X_train_num, X_test_num, X_train_text, X_test_text, y_train, y_test = train_test_split(
-        X_numeric, X_text, y, test_size=0.2, random_state=42
+    (X_train_num, X_test_num, X_train_text, X_test_text,
+     X_train_tags, X_test_tags, y_train, y_test) = train_test_split(
+        X_numeric, X_text, X_tags, y, test_size=0.2, random_state=42
     )
     
     print(f"\nТренировочная выборка: {len(X_train_num)}")
     print(f"Тестовая выборка: {len(X_test_num)}")
     
     # Нормализация численных признаков
-    scaler = StandardScaler()
-    X_train_num_scaled = scaler.fit_transform(X_train_num)
-    X_test_num_scaled = scaler.transform(X_test_num)
+    with report_stage(report, 'scaler_fit', rows=len(X_train_num)):
+        scaler = StandardScaler()
+        X_train_num_scaled = scaler.fit_transform(X_train_num)
+        X_test_num_scaled = scaler.transform(X_test_num)
+    
+    # Словарь тегов/категорий строится только по обучающей выборке
+    with report_stage(report, 'tag_vocabulary_fit', rows=len(X_train_tags)):
+        vocabulary = build_tag_vocabulary(X_train_tags)
     
     # Обучение модели
     print("\nОбучение модели с текстовыми признаками...")
-    model, tfidf, text_features_count = train_advanced_model(
-        X_train_num_scaled, X_train_text, y_train
+    model, tfidf, text_features_count, loss_curve = train_advanced_model(
+        X_train_num_scaled, X_train_text, y_train, X_train_tags, vocabulary, report
     )
     
     print(f"Численных признаков: {len(numeric_features)}")
     print(f"Текстовых признаков (TF-IDF): {text_features_count}")
-    print(f"Всего признаков: {len(numeric_features) + text_features_count}")
+    print(f"Признаков тегов/категорий (multi-hot): {len(vocabulary)}")
+    print(f"Всего признаков: {len(numeric_features) + text_features_count + len(vocabulary)}")
     
     # Оценка модели
     print("\n" + "=" * 60)
     print("Оценка модели на тестовой выборке")
     print("=" * 60)
-    results = evaluate_advanced_model(
-        model, tfidf, X_test_num_scaled, X_test_text, y_test
-    )
+    with report_stage(report, 'evaluate', rows=len(y_test)):
+        results = evaluate_advanced_model(
+            model, tfidf, X_test_num_scaled, X_test_text, y_test, X_test_tags, vocabulary
+        )
     
     print(f"\nMSE: {results['mse']:.4f}")
     print(f"RMSE: {results['rmse']:.4f}")
     print(f"MAE: {results['mae']:.4f}")
     print(f"R²: {results['r2']:.4f}")
     
-    # Сохранение модели
-    save_advanced_model(
-        model, tfidf, scaler, numeric_features, 
-        text_features_count, results
-    )
-    
-    # Пример важных слов из TF-IDF
-    print("\n" + "=" * 60)
-    print("Топ-20 важных слов/фраз для популярности:")
-    print("=" * 60)
-    feature_names = tfidf.get_feature_names_out()
-    # Получаем важность признаков
-    if hasattr(model, 'feature_importances_'):
-        importances = model.feature_importances_
-        # Берем только текстовые признаки
-        text_importances = importances[len(numeric_features):]
-        # Сортируем
-        indices = np.argsort(text_importances)[::-1][:20]
-        for i, idx in enumerate(indices, 1):
-            if idx < len(feature_names):
-                print(f"{i}. {feature_names[idx]}: {text_importances[idx]:.4f}")
+    # Артефакты пишутся сразу во временный каталог реестра: models/ обновляется
+    # только при переключении текущей версии, кандидат его не затрагивает
+    registry = ModelRegistry()
+    with registry.staging('advanced') as staging:
+        # Сохранение модели
+        save_advanced_model(
+            model, tfidf, scaler, numeric_features, 
+            text_features_count, results, vocabulary, report, y_test, loss_curve, staging
+        )
+    
+        # Дистилляция в быструю модель
+        print("\n" + "=" * 60)
+        print("Дистилляция в быструю модель")
+        print("=" * 60)
+        student_data = distill_student_model(
+            model, tfidf, scaler, vocabulary,
+            (X_train_num, X_train_text, X_train_tags, y_train),
+            (X_test_num, X_test_text, X_test_tags, y_test),
+            results, report, staging
+        )
+    
+        # Индекс похожих моделей
+        with report_stage(report, 'similarity_index', rows=len(df)):
+            index = build_similarity_index(df, numeric_features, scaler, tfidf, vocabulary)
+            joblib.dump(index, os.path.join(staging, 'similarity_index.pkl'))
+        print(f"Индекс похожих моделей сохранен: similarity_index.pkl ({len(index)} моделей)")
+    
+        # Глобальные важности (средний вклад признаков) для версии модели
+        with report_stage(report, 'global_importance', rows=len(y_test)):
+            cache_global_importance(
+                os.path.join(staging, 'popularity_model_advanced.pkl'), model,
+                numeric_features + list(tfidf.get_feature_names_out()) + vocabulary.feature_names(),
+                combine_features(tfidf, X_test_num_scaled, X_test_text, X_test_tags, vocabulary),
+                'Advanced Gradient Boosting with Text Features'
+            )
+    
+        # Пример важных слов из TF-IDF
+        print("\n" + "=" * 60)
+        print("Топ-20 важных слов/фраз для популярности:")
+        print("=" * 60)
+        feature_names = list(tfidf.get_feature_names_out()) + vocabulary.feature_names()
+        # Получаем важность признаков
+        if hasattr(model, 'feature_importances_'):
+            importances = model.feature_importances_
+            # Берем только текстовые признаки и теги
+            text_importances = importances[len(numeric_features):]
+            # Сортируем
+            indices = np.argsort(text_importances)[::-1][:20]
+            for i, idx in enumerate(indices, 1):
+                if idx < len(feature_names):
+                    print(f"{i}. {feature_names[idx]}: {text_importances[idx]:.4f}")
+    
+        # Публикация всех артефактов запуска одной версией в реестре
+        with report_stage(report, 'publish'):
+            version = registry.publish_staged(
+                'advanced', staging, {'model_type': 'Advanced Gradient Boosting with Text Features'},
+                promote=not candidate, run_files=ADVANCED_RUN_FILES
+            )
+            staged = candidate and registry.propose('advanced', version)
+        print(f"\nВерсия в реестре: {version} (models/registry/advanced/{version})"
+              + (" - кандидат на теневой оценке" if staged else ""))
+        report.set('registry_version', version)
+        report.set('candidate', bool(staged))
+    
+    # Отчет о запуске
+    bundle = registry.bundle_dir('advanced', version)
+    for filename in ADVANCED_ARTIFACTS:
+        report.add_artifact(os.path.join(bundle, filename))
+    report.set('model_type', 'Advanced Gradient Boosting with Text Features')
+    report.set('training_samples', len(df))
+    report.set('student_r2_gap', round(student_data['metrics']['r2_gap'], 4))
+    report.set('student_latency_ms', round(student_data['latency_ms']['student'], 4))
+    report.set('teacher_latency_ms', round(student_data['latency_ms']['teacher'], 4))
+    report.set('cascade', {key: round(value, 4) for key, value in student_data['cascade_metrics'].items()})
+    report.set('text_cache', cache_stats())
+    report.set('n_estimators', loss_curve['n_estimators'])
+    report.set('feature_dtype', FEATURE_DTYPE.name)
+    report.write('models/training_report_advanced.json')
+    print("\nОтчет о запуске сохранен: models/training_report_advanced.json")
     
     print("\n" + "=" * 60)
     print("Обучение завершено!")
     print("=" * 60)
 
 if __name__ == "__main__":
-    import sys
-    # Поддержка параметра для ограничения количества данных
-    limit = None
-    if len(sys.argv) > 1:
-        try:
-            limit = int(sys.argv[1])
-            print(f"Ограничение данных: {limit} моделей")
-        except ValueError:
-            pass
-    
-    main()
+    parser = argparse.ArgumentParser(description='Обучение расширенной модели с текстовыми признаками')
+    # Позиционный аргумент передается веб-сервером (/api/train)
+    parser.add_argument('limit', nargs='?', type=int, default=None,
+                        help='обучение на стратифицированной выборке из limit моделей')
+    parser.add_argument('--seed', type=int, default=42, help='seed выборки')
+    parser.add_argument('--no-dedup', action='store_true', help='не удалять дубликаты')
+    parser.add_argument('--dedup-threshold', type=float, default=0.9,
+                        help='минимальное сходство Жаккара для почти дубликатов')
+    parser.add_argument('--candidate', action='store_true',
+                        help='не переключать текущую версию, а отправить на теневую оценку')
+    args = parser.parse_args()
+    if args.limit:
+        print(f"Ограничение данных: {args.limit} моделей")
+    
+    main(args.limit, args.seed, not args.no_dedup, args.dedup_threshold, args.candidate)
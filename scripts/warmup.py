@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Прогрев процесса прогнозирования перед приемом запросов
+
+Первый вызов после загрузки моделей платит отложенные затраты: проверки
+входа sklearn при первом predict, построение объяснителя по деревьям,
+заполнение кешей текста и TF-IDF, первые обращения к страницам моделей
+после fork. Прогрев прогоняет синтетические запросы через каждый путь
+загруженных моделей (стандартная, расширенная, ученик, объяснения,
+похожие модели, рейтинг качества) - по одному и пакетом. Сервер и рабочие
+процессы пула сообщают о готовности только после прогрева.
+"""
+
+import sys
+import time
+
+from predict_advanced import predict_batch
+
+# Синтетический запрос с текстом (расширенная модель, объяснение, похожие модели)
+_TEXT_REQUEST = {
+    'tags': ['lowpoly', 'game', 'pbr', 'character', 'rigged'],
+    'categories': ['characters-creatures'],
+    'description': 'Low poly game ready character. PBR textures 2048x2048, rigged and animated.',
+    'category_count': 1,
+    'tag_count': 5,
+    'description_length': 78,
+    'face_count': 12000,
+    'vertex_count': 6500,
+    'animation_count': 2,
+    'is_downloadable': True,
+    'is_premium_author': False,
+    'author_followers': 150,
+    'account_type': 'basic',
+    'is_animated': True,
+    'has_textures': True,
+    'has_pbr': True,
+    'is_rigged': True,
+    'explain': True,
+    'similar_k': 5
+}
+
+
+def warmup_requests(models):
+    """Синтетические запросы для всех путей загруженных моделей"""
+    requests = []
+    if models.get('advanced'):
+        requests.append(dict(_TEXT_REQUEST))
+    if models.get('student'):
+        # Нулевой бюджет задержки всегда выбирает ученика
+        requests.append(dict(_TEXT_REQUEST, latency_budget_ms=0, explain=False, similar_k=0))
+    if models.get('standard'):
+        # Без тегов и описания - стандартная модель
+        requests.append({
+            key: value for key, value in _TEXT_REQUEST.items()
+            if key not in ('tags', 'categories', 'description')
+        })
+    return requests
+
+
+def warm_up(models, rounds=2):
+    """
+    Прогон синтетических запросов по одному и пакетом
+
+    Returns:
+        отчет о прогреве: длительность, задержка первого и последнего прохода, пути моделей
+    """
+    requests = warmup_requests(models)
+    report = {'requests': len(requests), 'rounds': rounds, 'paths': [], 'errors': 0}
+    if not requests:
+        report.update(duration_ms=0.0, first_round_ms=None, last_round_ms=None)
+        return report
+
+    started = time.perf_counter()
+    round_ms = []
+    paths = set()
+    for _ in range(rounds):
+        round_started = time.perf_counter()
+        try:
+            results = [predict_batch([request], models, include_timings=False)[0] for request in requests]
+            results += predict_batch(requests, models, include_timings=False)
+        except Exception as e:
+            # Прогрев не должен мешать запуску: ошибка проявится и на реальных запросах
+            print(f"Warning: warm-up failed: {e}", file=sys.stderr)
+            results = [{'error': str(e)}]
+        round_ms.append((time.perf_counter() - round_started) * 1000.0)
+        for result in results:
+            if 'error' in result:
+                report['errors'] += 1
+            else:
+                paths.add(result['model_used'])
+
+    report.update(
+        duration_ms=round((time.perf_counter() - started) * 1000.0, 3),
+        first_round_ms=round(round_ms[0], 3),
+        last_round_ms=round(round_ms[-1], 3),
+        paths=sorted(paths)
+    )
+    if report['errors']:
+        print(f"Warning: {report['errors']} warm-up predictions failed", file=sys.stderr)
+    return report
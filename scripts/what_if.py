@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Что если: какие изменения модели сильнее всего поднимут прогноз популярности
+
+Для одного запроса строится полная сетка вариантов по управляемым признакам
+моделей популярности (WHAT_IF_GRID: полигоны, число тегов, длина описания,
+возможность скачивания) - текущее значение плюс типичные целевые значения.
+Все варианты прогнозируются одним пакетом predict_scores (одна модель, один
+вызов model.predict, каскад отключен), поэтому прогнозы вариантов сравнимы
+между собой и с исходным запросом.
+
+Из сетки выбираются лучшие сочетания изменений по приросту прогноза. Сочетание
+попадает в ответ, только если каждое его изменение дает не меньше MIN_GAIN:
+возврат любого признака к текущему значению (соседняя ячейка сетки) должен
+уменьшать прогноз. Деревья дают одинаковый прогноз на целых диапазонах
+значений, поэтому из ячеек с равным прогнозом остается одна - с наименьшим
+изменением. Для каждого признака отдельно показывается лучшее значение при
+остальных неизменных.
+
+Теги и описание как текст не меняются: меняются только признаки tag_count и
+description_length. Флаги текстур и PBR (QUALITY_FLAGS) не входят в признаки
+моделей популярности - для них считается только прирост рейтинга качества.
+
+Использование:
+    echo '{"tags": [...], "face_count": 120000, ...}' | python scripts/what_if.py [--top-k 5]
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from predict_advanced import load_models, predict_scores, categorize_score, calculate_quality, registry_versions
+from prediction_schema import RequestError, decode_requests, dumps
+from profiling import StageTimer, stage
+
+# Управляемые признаки моделей популярности (feature_spec.py): значение по умолчанию
+# (поле не передано) и целевые значения сетки
+WHAT_IF_GRID = {
+    'face_count': (0, [2000, 5000, 10000, 20000, 35000, 50000]),
+    'tag_count': (0, [5, 10, 15, 20, 30]),
+    'description_length': (0, [100, 250, 500, 1000, 2000]),
+    'is_downloadable': (False, [False, True]),
+}
+
+# Флаги, влияющие только на рейтинг качества (quality_rating.py)
+QUALITY_FLAGS = ('has_textures', 'has_pbr')
+
+# Минимальный прирост прогноза от каждого изменения в предложенном сочетании
+MIN_GAIN = 0.05
+
+# Прогнозы, отличающиеся меньше, считаются равными (одна и та же ветка деревьев)
+SCORE_TOLERANCE = 1e-6
+
+# Поля запроса, не нужные вариантам: объяснения, похожие модели и бюджет задержки
+# (варианты считает самая точная модель - пакет сетки все равно один)
+_RESPONSE_OPTIONS = ('explain', 'similar_k', 'latency_budget_ms')
+
+
+def grid_axes(input_data):
+    """
+    Оси сетки: (признак, значения, индекс текущего значения)
+
+    Текущее значение всегда входит в ось, поэтому исходный запрос - одна из ячеек сетки.
+    """
+    axes = []
+    for feature, (default, targets) in WHAT_IF_GRID.items():
+        current = input_data.get(feature, default)
+        values = sorted(set(targets) | {current})
+        axes.append((feature, values, values.index(current)))
+    return axes
+
+
+def grid_variants(input_data, axes):
+    """
+    Варианты запроса для всех ячеек сетки (порядок C - последний признак меняется быстрее)
+
+    Returns:
+        (список dict запросов, массив индексов ячеек n_variants x n_axes)
+    """
+    shape = tuple(len(values) for _, values, _ in axes)
+    cells = np.indices(shape).reshape(len(axes), -1).T
+    base = {key: value for key, value in input_data.items() if key not in _RESPONSE_OPTIONS}
+    base['cascade'] = False
+    columns = [[values[i] for i in cells[:, j]] for j, (_, values, _) in enumerate(axes)]
+    names = [feature for feature, _, _ in axes]
+    variants = [dict(base, **dict(zip(names, row))) for row in zip(*columns)]
+    return variants, cells
+
+
+def change_sizes(axes):
+    """
+    Величина изменения для каждого значения оси: разница log1p для чисел, 1 для флагов
+    (0 - текущее значение)
+    """
+    sizes = []
+    for _, values, current in axes:
+        if isinstance(values[current], bool):
+            sizes.append(np.array([float(i != current) for i in range(len(values))]))
+        else:
+            logs = np.log1p(np.maximum(np.asarray(values, dtype=np.float64), 0.0))
+            sizes.append(np.abs(logs - logs[current]))
+    return sizes
+
+
+def contributing(scores, axes):
+    """
+    Маска ячеек, в которых каждое изменение дает прирост не меньше MIN_GAIN
+
+    Сравнение с соседней ячейкой, где один признак возвращен к текущему значению,
+    делается для всей сетки сразу (срез по текущему индексу с broadcast).
+    """
+    mask = np.ones(scores.shape, dtype=bool)
+    for axis, (_, values, current) in enumerate(axes):
+        reverted = np.take(scores, [current], axis=axis)
+        changed = np.arange(len(values)) != current
+        changed = changed.reshape([-1 if a == axis else 1 for a in range(scores.ndim)])
+        mask &= ~changed | (scores - reverted >= MIN_GAIN)
+    return mask
+
+
+def rank_cells(scores, cells, axes, base_cell, top_k):
+    """
+    Лучшие ячейки сетки: по приросту, при равном прогнозе - меньше изменений и
+    меньшее изменение; из ячеек с одинаковым прогнозом остается одна
+    """
+    gains = scores - scores[base_cell]
+    flat = np.flatnonzero((contributing(scores, axes) & (gains >= MIN_GAIN)).ravel())
+    if not len(flat):
+        return []
+    chosen = cells[flat]
+    n_changes = (chosen != np.array(base_cell)).sum(axis=1)
+    size = sum(axis_sizes[chosen[:, j]] for j, axis_sizes in enumerate(change_sizes(axes)))
+    levels = np.round(gains.ravel()[flat] / SCORE_TOLERANCE)
+    order = np.lexsort((size, n_changes, -levels))
+
+    best, seen = [], set()
+    for position in order:
+        if levels[position] in seen:
+            continue
+        seen.add(levels[position])
+        best.append(int(flat[position]))
+        if len(best) == top_k:
+            break
+    return best
+
+
+def _changes(cell, axes):
+    return {
+        feature: {'from': values[current], 'to': values[i]}
+        for (feature, values, current), i in zip(axes, cell) if i != current
+    }
+
+
+def _quality_score(input_data):
+    try:
+        return calculate_quality(input_data)['total_score']
+    except Exception as e:
+        print(f"Warning: Quality rating failed: {e}", file=sys.stderr)
+        return None
+
+
+def _gain(value, base):
+    return round(value - base, 4) if value is not None and base is not None else None
+
+
+def what_if(input_data, models, top_k=5, timer=None):
+    """
+    Лучшие изменения управляемых признаков для одного запроса
+
+    Returns:
+        dict: base (исходный прогноз), best (сочетания изменений с приростом),
+        by_feature (лучшее значение каждого признака), quality_flags (прирост
+        рейтинга качества от флагов), variants, model_used
+    """
+    axes = grid_axes(input_data)
+    with stage(timer, 'what_if_grid'):
+        variants, cells = grid_variants(input_data, axes)
+    predicted = predict_scores(variants, models, timer)
+    if any(score is None for score, _ in predicted):
+        return {'error': 'No models available'}
+
+    shape = tuple(len(values) for _, values, _ in axes)
+    scores = np.array([score for score, _ in predicted], dtype=np.float64).reshape(shape)
+    base_cell = tuple(current for _, _, current in axes)
+    base_score = float(scores[base_cell])
+    base_variant = variants[np.ravel_multi_index(base_cell, shape)]
+    base_quality = _quality_score(base_variant)
+
+    with stage(timer, 'what_if_rank'):
+        best = []
+        for index in rank_cells(scores, cells, axes, base_cell, top_k):
+            quality = _quality_score(variants[index])
+            best.append({
+                'changes': _changes(cells[index], axes),
+                'popularity_score': float(scores.flat[index]),
+                'popularity_category': categorize_score(scores.flat[index]),
+                'gain': round(float(scores.flat[index] - base_score), 4),
+                'quality_score': quality,
+                'quality_gain': _gain(quality, base_quality)
+            })
+
+        # Каждый признак отдельно: лучшее значение при остальных текущих
+        by_feature = []
+        sizes = change_sizes(axes)
+        for axis, (feature, values, current) in enumerate(axes):
+            line = scores[tuple(slice(None) if a == axis else c for a, c in enumerate(base_cell))]
+            option = {}
+            for i in range(len(values)):
+                if i == current:
+                    continue
+                cell = list(base_cell)
+                cell[axis] = i
+                quality = _quality_score(variants[np.ravel_multi_index(tuple(cell), shape)])
+                gain = round(float(line[i] - base_score), 4)
+                # Лучшее значение - по приросту прогноза, затем по рейтингу качества, затем ближайшее
+                key = (gain, _gain(quality, base_quality) or 0.0, -sizes[axis][i])
+                if not option or key > option['_key']:
+                    option = {'_key': key, 'feature': feature, 'from': values[current], 'to': values[i],
+                              'gain': gain, 'quality_gain': _gain(quality, base_quality)}
+            if option:
+                option.pop('_key')
+                by_feature.append(option)
+        by_feature.sort(key=lambda option: (option['gain'], option['quality_gain'] or 0.0), reverse=True)
+
+        # Флаги качества не меняют прогноз популярности - только рейтинг качества
+        quality_flags = []
+        for flag in QUALITY_FLAGS:
+            if not input_data.get(flag, False):
+                quality = _quality_score(dict(base_variant, **{flag: True}))
+                quality_flags.append({'feature': flag, 'from': False, 'to': True,
+                                      'quality_gain': _gain(quality, base_quality)})
+
+    return {
+        'model_used': predicted[0][1],
+        'versions': registry_versions(models),
+        'variants': len(variants),
+        'base': {
+            'popularity_score': base_score,
+            'popularity_category': categorize_score(base_score),
+            'quality_score': base_quality
+        },
+        'best': best,
+        'by_feature': by_feature,
+        'quality_flags': quality_flags
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Лучшие изменения модели для роста прогноза популярности')
+    parser.add_argument('--top-k', type=int, default=5, help='число предложенных сочетаний изменений')
+    parser.add_argument('--profile', action='store_true', help='добавить timings_ms по этапам')
+    parser.add_argument('--pretty', action='store_true', help='JSON с отступами')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        inputs, is_batch = decode_requests(sys.stdin.buffer.read())
+        if is_batch:
+            raise RequestError('what-if accepts a single request object')
+    except RequestError as e:
+        sys.stdout.buffer.write(dumps({'error': f'invalid request: {e}'}) + b'\n')
+        sys.exit(1)
+
+    timer = StageTimer() if args.profile else None
+    with stage(timer, 'load_models'):
+        models = load_models()
+    result = what_if(inputs[0], models, args.top_k, timer)
+    if timer is not None and 'error' not in result:
+        result['timings_ms'] = timer.as_ms()
+    sys.stdout.buffer.write(dumps(result, args.pretty) + b'\n')
+    if 'error' in result:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+"""Общие настройки тестов: модули scripts/ импортируются так же, как при запуске скриптов"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
@@ -0,0 +1,111 @@
+"""Признаки расширенной модели: TF-IDF по описанию, разреженные блоки до модели"""
+
+import numpy as np
+import pytest
+from scipy import sparse
+from sklearn.preprocessing import StandardScaler
+
+import explanations
+import predict_advanced
+from feature_spec import ADVANCED_SPEC, FEATURE_DTYPE, model_matrix
+from train_model_advanced import (build_tag_vocabulary, combine_features, prepare_advanced_features,
+                                  train_advanced_model)
+
+DESCRIPTION_WORDS = ['sculpt', 'render', 'texture', 'rigged', 'scan']
+TAG_WORDS = ['spaceship', 'dragon', 'castle', 'robot']
+
+
+def raw_models(n=120, seed=0):
+    rng = np.random.RandomState(seed)
+    return [{
+        'uid': f'uid{i}',
+        'name': f'model {i}',
+        'description': ' '.join(rng.choice(DESCRIPTION_WORDS, 3)),
+        'tags': [str(tag) for tag in rng.choice(TAG_WORDS, 2, replace=False)],
+        'categories': ['animals-pets'] if i % 2 else ['architecture'],
+        'faceCount': int(rng.randint(100, 100000)),
+        'vertexCount': int(rng.randint(100, 50000)),
+        'viewCount': int(rng.randint(0, 10000)),
+        'likeCount': int(rng.randint(0, 500))
+    } for i in range(n)]
+
+
+@pytest.fixture(scope='module')
+def trained():
+    raw = raw_models()
+    df = prepare_advanced_features(raw)
+    tags = list(zip(df['tags'], df['categories']))
+    vocabulary = build_tag_vocabulary(tags)
+    scaler = StandardScaler().fit(ADVANCED_SPEC.frame(df))
+    model, tfidf, text_features_count, _ = train_advanced_model(
+        scaler.transform(ADVANCED_SPEC.frame(df)), df['description_text'],
+        df['popularity_score'].values, tags, vocabulary
+    )
+    model_data = {'model': model, 'tfidf': tfidf, 'scaler': scaler, 'tag_vocabulary': vocabulary,
+                  'text_source': 'description', 'text_features_count': text_features_count}
+    return raw, df, model_data
+
+
+def test_model_matrix_matches_dense_hstack():
+    rng = np.random.RandomState(1)
+    blocks = [rng.randn(20, 3), sparse.random(20, 7, density=0.3, format='csr', random_state=2)]
+    X = model_matrix(blocks)
+    assert isinstance(X, np.ndarray) and X.dtype == FEATURE_DTYPE
+    assert np.allclose(X, np.hstack([blocks[0], blocks[1].toarray()]), atol=1e-6)
+    assert model_matrix([blocks[0]]).dtype == FEATURE_DTYPE
+
+
+def test_tfidf_does_not_see_tags(trained):
+    _, df, model_data = trained
+    assert 'combined_text' not in df
+    words = set(' '.join(model_data['tfidf'].get_feature_names_out()).split())
+    assert words and words <= set(DESCRIPTION_WORDS)
+    # Теги попадают в модель только через словарь
+    assert {'tag:' + tag for tag in TAG_WORDS} <= set(model_data['tag_vocabulary'].feature_names())
+    assert model_data['model'].n_features_in_ == (
+        len(ADVANCED_SPEC) + model_data['text_features_count'] + len(model_data['tag_vocabulary'])
+    )
+
+
+def test_model_text_depends_on_text_source():
+    request = {'description': 'Rigged Dragon!', 'tags': ['dragon'], 'categories': ['animals-pets']}
+    assert predict_advanced.model_text(request, {'text_source': 'description'}) == 'rigged dragon'
+    # Модели, обученные до словаря тегов, - прежний объединенный текст
+    assert predict_advanced.model_text(request, {}) == predict_advanced.combined_text(request)
+    assert 'pets' in predict_advanced.model_text(request, {})
+
+
+def test_serving_blocks_are_sparse_and_match_training(trained):
+    raw, df, model_data = trained
+    inputs = [dict({name: row[name] for name in ADVANCED_SPEC.names},
+                   description=record['description'], tags=record['tags'], categories=record['categories'])
+              for record, (_, row) in zip(raw[:20], df.iterrows())]
+    blocks = predict_advanced.advanced_feature_blocks(inputs, model_data)
+    assert [sparse.issparse(block) for block in blocks] == [False, True, True]
+
+    X_train = combine_features(
+        model_data['tfidf'], model_data['scaler'].transform(ADVANCED_SPEC.frame(df.iloc[:20])),
+        df['description_text'].iloc[:20], list(zip(df['tags'], df['categories']))[:20],
+        model_data['tag_vocabulary']
+    )
+    assert np.allclose(model_matrix(blocks), X_train, atol=1e-5)
+
+
+def test_explain_requests_are_not_routed_to_student():
+    models = {'advanced': {'model': object()}, 'student': {'latency_ms': {'teacher': 5.0}}}
+    assert predict_advanced.wants_student({'latency_budget_ms': 1}, models)
+    assert not predict_advanced.wants_student({'latency_budget_ms': 1, 'explain': True}, models)
+
+
+def test_explainer_cache_keeps_models_without_trees(monkeypatch):
+    built = []
+
+    def make_explainer(model, feature_names):
+        built.append(model)
+        return None
+
+    monkeypatch.setattr(explanations, 'make_explainer', make_explainer)
+    cache = explanations.ExplanationCache()
+    assert cache.explainer('v1', 'linear', ['a']) is None
+    assert cache.explainer('v1', 'linear', ['a']) is None
+    assert built == ['linear']
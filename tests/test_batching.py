@@ -0,0 +1,116 @@
+"""Адаптивный micro-batching (batching.py)"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from batching import AdaptiveBatcher, percentile
+
+
+def test_percentile():
+    assert percentile([], 95) == 0.0
+    assert percentile([3, 1, 2], 50) == 2
+    assert percentile(list(range(101)), 95) == 95
+
+
+def test_concurrent_requests_share_a_batch():
+    sizes = []
+
+    def process(items):
+        sizes.append(len(items))
+        return [item * 10 for item in items]
+
+    async def scenario():
+        batcher = AdaptiveBatcher(process, max_batch=8, initial_wait_ms=20.0, max_wait_ms=20.0)
+        batcher.start()
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(20)))
+        await batcher.stop()
+        return results, batcher.snapshot()
+
+    results, snapshot = asyncio.run(scenario())
+    # Каждый получает свой результат, пакеты не больше max_batch
+    assert results == [i * 10 for i in range(20)]
+    assert max(sizes) == 8 and sum(sizes) == 20
+    assert snapshot['items'] == 20 and snapshot['batches'] == len(sizes)
+
+
+def test_full_queue_rejects():
+    async def scenario():
+        batcher = AdaptiveBatcher(lambda items: items, max_queue=2)
+        batcher.enqueue(1)
+        batcher.enqueue(2)
+        with pytest.raises(asyncio.QueueFull):
+            batcher.enqueue(3)
+        batcher.start()
+        await batcher.stop()
+
+    asyncio.run(scenario())
+
+
+def test_failed_batch_answers_every_request():
+    def process(items):
+        raise RuntimeError('model crashed')
+
+    async def scenario():
+        batcher = AdaptiveBatcher(process, initial_wait_ms=5.0)
+        batcher.start()
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(3)))
+        await batcher.stop()
+        return results, batcher.snapshot()
+
+    results, snapshot = asyncio.run(scenario())
+    assert results == [{'error': 'model crashed'}] * 3
+    assert snapshot['errors'] >= 1
+
+
+def test_concurrency_limits_batches_in_flight():
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def process(items):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.02)
+        with lock:
+            active[0] -= 1
+        return items
+
+    async def scenario():
+        batcher = AdaptiveBatcher(process, max_batch=1, initial_wait_ms=0.0, concurrency=2)
+        batcher.start()
+        await asyncio.gather(*(batcher.submit(i) for i in range(8)))
+        await batcher.stop()
+
+    asyncio.run(scenario())
+    assert peak[0] == 2
+
+
+def test_window_adapts_to_slo():
+    async def scenario():
+        batcher = AdaptiveBatcher(lambda items: items, latency_slo_ms=10.0, initial_wait_ms=4.0,
+                                  max_wait_ms=8.0, adapt_every=1)
+        # Задержки выше SLO - окно уменьшается вдвое
+        batcher.latencies.extend([0.05] * 10)
+        batcher.batch_sizes.extend([4] * 4)
+        batcher._adapt()
+        assert batcher.wait == pytest.approx(0.002)
+
+        # Запросы по одному - ожидание бесполезно
+        batcher.latencies.clear()
+        batcher.latencies.extend([0.001] * 10)
+        batcher.batch_sizes.clear()
+        batcher.batch_sizes.extend([1] * 4)
+        batcher._adapt()
+        assert batcher.wait == 0.0
+
+        # Параллельные запросы и запас по задержке - окно растет до max_wait
+        batcher.batch_sizes.clear()
+        batcher.batch_sizes.extend([4] * 4)
+        for _ in range(40):
+            batcher._adapt()
+        assert batcher.wait == pytest.approx(0.008)
+
+    asyncio.run(scenario())
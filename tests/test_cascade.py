@@ -0,0 +1,50 @@
+"""Каскад ученик -> расширенная модель (cascade.py)"""
+
+import numpy as np
+import pytest
+
+from cascade import cascade_accepts, category_index, evaluate_cascade, fit_cascade_bound
+from predict_advanced import CATEGORY_THRESHOLDS, categorize_score
+
+
+def bound(offset=0.25, n=1000):
+    """Ошибка ученика ровно +-offset: интервал [ученик - offset, ученик + offset]"""
+    student = np.arange(n) % 40 * 0.25
+    teacher = student + np.where(np.arange(n) % 2, offset, -offset)
+    return fit_cascade_bound(teacher, student)
+
+
+def test_category_index_matches_categorize_score_at_boundaries():
+    scores = [4.999, 5.0, 5.001, 7.999, 8.0, 8.001]
+    names = ['low', 'medium', 'high']
+    assert [names[i] for i in category_index(scores, CATEGORY_THRESHOLDS)] == [categorize_score(s) for s in scores]
+
+
+@pytest.mark.parametrize('student, accepted', [
+    (4.74, True),   # [4.49, 4.99] - low
+    (4.75, False),  # [4.5, 5.0] - верхняя граница уже medium
+    (5.0, False),
+    (5.24, False),  # [4.99, 5.49] - пересекает 5
+    (5.25, True),   # [5.0, 5.5] - medium
+    (7.74, True),   # [7.49, 7.99] - medium
+    (7.75, False),  # [7.5, 8.0] - пересекает 8
+    (8.25, True),   # [8.0, 8.5] - high
+])
+def test_accept_or_escalate_at_category_boundaries(student, accepted):
+    fitted = bound()
+    assert (fitted.q_low, fitted.q_high) == (-0.25, 0.25)
+    assert cascade_accepts(fitted, [student], CATEGORY_THRESHOLDS)[0] == accepted
+
+
+def test_evaluate_cascade_metrics():
+    fitted = bound()
+    student = np.array([2.0, 5.1, 6.5, 7.9, 9.0])
+    # Учитель расходится с учеником только у переданных дальше запросов
+    teacher = np.array([2.1, 4.9, 6.4, 8.1, 9.2])
+    metrics = evaluate_cascade(fitted, teacher, student, CATEGORY_THRESHOLDS,
+                               latency_ms={'student': 1.0, 'teacher': 10.0})
+    assert metrics['n'] == 5
+    assert metrics['escalation_rate'] == pytest.approx(0.4)
+    assert metrics['category_agreement'] == 1.0
+    assert metrics['student_category_agreement'] == pytest.approx(0.6)
+    assert metrics['expected_latency_ms'] == pytest.approx(1.0 + 0.4 * 10.0)
@@ -0,0 +1,55 @@
+"""Удаление дубликатов каталога (dedup.py)"""
+
+import random
+
+from dedup import deduplicate, shingles
+
+WORDS = [f'word{i}' for i in range(500)]
+
+
+def record(uid, description, faces=1000, tags=('car',)):
+    return {'uid': uid, 'description': description, 'tags': list(tags), 'categories': ['vehicles'],
+            'faceCount': faces, 'vertexCount': faces // 2, 'animationCount': 0}
+
+
+def descriptions(n, length=200, seed=0):
+    rng = random.Random(seed)
+    return [' '.join(rng.choice(WORDS) for _ in range(length)) for _ in range(n)]
+
+
+def test_unique_records_are_kept_in_order():
+    records = [record(f'uid{i}', text) for i, text in enumerate(descriptions(50))]
+    kept, report = deduplicate(records)
+    assert kept == records
+    assert report['removed'] == {'uid': 0, 'content': 0, 'near': 0, 'total': 0}
+    assert report['input_records'] == report['kept_records'] == 50
+
+
+def test_exact_and_near_duplicates_keep_the_first_record():
+    texts = descriptions(3)
+    records = [
+        record('a', texts[0]),
+        record('a', texts[1]),                   # тот же uid
+        record('b', texts[0]),                   # то же содержимое под другим uid
+        record('c', texts[0] + ' extra'),        # почти дубликат
+        record('d', texts[2]),
+    ]
+    kept, report = deduplicate(records)
+    assert [item['uid'] for item in kept] == ['a', 'd']
+    assert report['removed'] == {'uid': 1, 'content': 1, 'near': 1, 'total': 3}
+    assert report['removed_fraction'] == 0.6
+    near = [example for example in report['examples'] if example['kind'] == 'near']
+    assert near[0]['uid'] == 'c' and near[0]['duplicate_of'] == 'a' and near[0]['similarity'] >= 0.9
+
+
+def test_different_geometry_is_not_a_content_duplicate():
+    text = descriptions(1)[0]
+    kept, report = deduplicate([record('a', text, faces=1000), record('b', text, faces=5000)], threshold=1.01)
+    assert len(kept) == 2 and report['removed']['total'] == 0
+
+
+def test_short_texts_are_only_checked_exactly():
+    records = [record('a', 'red car', faces=1000), record('b', 'red car', faces=2000)]
+    assert len(shingles('red car car')) < 5
+    kept, report = deduplicate(records)
+    assert len(kept) == 2 and report['removed']['near'] == 0
@@ -0,0 +1,90 @@
+"""Модель-ученик: дистилляция, калибровка и маршрутизация по бюджету задержки"""
+
+import os
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import StandardScaler
+
+import predict_advanced
+from feature_spec import ADVANCED_SPEC
+from test_advanced_features import raw_models
+from train_model_advanced import (build_tag_vocabulary, calibration_split, distill_student_model,
+                                  evaluate_advanced_model, prepare_advanced_features, train_advanced_model)
+
+
+@pytest.fixture(scope='module')
+def distilled(tmp_path_factory):
+    df = prepare_advanced_features(raw_models(n=200))
+    X_num = ADVANCED_SPEC.frame(df)
+    tags = list(zip(df['tags'], df['categories']))
+    (X_train_num, X_test_num, X_train_text, X_test_text,
+     X_train_tags, X_test_tags, y_train, y_test) = train_test_split(
+        X_num, df['description_text'], tags, df['popularity_score'].values, test_size=0.3, random_state=0
+    )
+    scaler = StandardScaler().fit(X_train_num)
+    vocabulary = build_tag_vocabulary(X_train_tags)
+    teacher, tfidf, _, _ = train_advanced_model(
+        scaler.transform(X_train_num), X_train_text, y_train, X_train_tags, vocabulary
+    )
+    teacher_metrics = evaluate_advanced_model(
+        teacher, tfidf, scaler.transform(X_test_num), X_test_text, y_test, X_test_tags, vocabulary
+    )
+    directory = str(tmp_path_factory.mktemp('staging'))
+    student_data = distill_student_model(
+        teacher, tfidf, scaler, vocabulary,
+        (X_train_num, X_train_text, X_train_tags, y_train),
+        (X_test_num, X_test_text, X_test_tags, y_test),
+        teacher_metrics, directory=directory
+    )
+    return student_data, directory, len(y_test)
+
+
+def test_calibration_split_is_disjoint_and_covers_holdout():
+    calibration, evaluation = calibration_split(11)
+    assert len(calibration) == 6 and len(evaluation) == 5
+    assert sorted(np.concatenate([calibration, evaluation]).tolist()) == list(range(11))
+    assert [len(part) for part in calibration_split(2)] == [1, 1]
+
+
+def test_student_is_calibrated_and_evaluated_on_separate_rows(distilled):
+    student_data, _, n_test = distilled
+    metrics = student_data['metrics']
+    assert metrics['calibration_rows'] + metrics['evaluation_rows'] == n_test
+    assert student_data['intervals'].n_calibration == metrics['calibration_rows']
+    assert 0.0 <= student_data['cascade_metrics']['escalation_rate'] <= 1.0
+
+
+def test_student_artifact_is_written_to_directory(distilled):
+    student_data, directory, _ = distilled
+    saved = joblib.load(os.path.join(directory, 'popularity_model_student.pkl'))
+    assert set(saved['latency_ms']) == {'teacher', 'student'}
+    assert saved['text_source'] == 'description'
+    assert saved['cascade'] is not None
+
+
+def test_latency_budget_routes_requests_to_student(distilled, monkeypatch):
+    _, directory, _ = distilled
+    student = joblib.load(os.path.join(directory, 'popularity_model_student.pkl'))
+    teacher_ms = student['latency_ms']['teacher']
+    monkeypatch.setenv('PREDICT_CASCADE', '0')
+    monkeypatch.setattr(predict_advanced, 'predict_popularity_advanced_batch',
+                        lambda batch, *args, **kwargs: [99.0] * len(batch))
+    request = {'tags': ['car', 'vehicle'], 'description': 'red sports car', 'faceCount': 5000}
+    inputs = [
+        dict(request, latency_budget_ms=teacher_ms / 2),
+        dict(request),
+        dict(request, latency_budget_ms=teacher_ms * 2),
+        dict(request, latency_budget_ms=teacher_ms / 2, explain=True)
+    ]
+
+    models = {'standard': None, 'advanced': {'model': object()}, 'student': student}
+    scores = predict_advanced.predict_scores(inputs, models)
+    assert [used for _, used in scores] == ['student', 'advanced', 'advanced', 'advanced']
+    assert np.isfinite(scores[0][0]) and scores[0][0] != 99.0
+
+    # Без расширенной модели все запросы с текстом получает ученик
+    models['advanced'] = None
+    assert [used for _, used in predict_advanced.predict_scores(inputs, models)] == ['student'] * 4
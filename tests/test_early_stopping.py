@@ -0,0 +1,50 @@
+"""Ранняя остановка градиентного бустинга (early_stopping.py)"""
+
+import numpy as np
+from sklearn.ensemble import GradientBoostingRegressor
+from sklearn.model_selection import train_test_split
+
+from early_stopping import ValidationMonitor, fit_with_early_stopping, select_n_estimators
+
+
+def data(n=600, seed=0):
+    rng = np.random.RandomState(seed)
+    X = rng.randn(n, 5).astype(np.float32)
+    y = X[:, 0] + 0.5 * X[:, 1] + rng.randn(n) * 0.5
+    return X, y
+
+
+def test_select_n_estimators_takes_the_smallest_within_tolerance():
+    losses = [4.0, 2.0, 1.004, 1.0, 1.2]
+    assert select_n_estimators(losses, tolerance=0.005) == 3
+    assert select_n_estimators(losses, tolerance=0.0) == 4
+
+
+def test_monitor_losses_match_staged_predictions():
+    X, y = data()
+    X_val, y_val = X[:100], y[:100]
+    monitor = ValidationMonitor(X_val, y_val, patience=1000)
+    model = GradientBoostingRegressor(n_estimators=30, random_state=0).fit(X[100:], y[100:], monitor=monitor)
+    staged = [np.mean((y_val - prediction) ** 2) for prediction in model.staged_predict(X_val)]
+    assert len(monitor.losses) == 30
+    assert np.allclose(monitor.losses, staged, rtol=1e-5)
+
+
+def test_fit_stops_early_and_truncates_the_ensemble():
+    X, y = data()
+    model = GradientBoostingRegressor(n_estimators=1000, learning_rate=0.3, max_depth=4, random_state=0)
+    full = GradientBoostingRegressor(n_estimators=1000, learning_rate=0.3, max_depth=4, random_state=0)
+    curve = fit_with_early_stopping(model, X, y, patience=5)
+
+    assert curve['n_estimators_built'] < 1000
+    assert curve['n_estimators'] <= curve['best_iteration'] <= curve['n_estimators_built']
+    assert curve['n_estimators_built'] - curve['best_iteration'] == 5
+    assert len(curve['validation_mse']) == curve['n_estimators_built']
+    assert model.n_estimators_ == model.n_estimators == len(model.estimators_) == curve['n_estimators']
+
+    # Обрезанный ансамбль предсказывает так же, как первые n деревьев полного
+    full.set_params(n_estimators=curve['n_estimators_built'])
+    X_fit, _, y_fit, _ = train_test_split(X, y, test_size=0.1, random_state=42)
+    full.fit(X_fit, y_fit)
+    staged = list(full.staged_predict(X[:50]))[curve['n_estimators'] - 1]
+    assert np.allclose(model.predict(X[:50]), staged)
@@ -0,0 +1,56 @@
+"""Результаты оценки отдельно от артефактов прогноза (evaluation_store.py)"""
+
+import os
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.linear_model import LinearRegression
+
+from evaluation_store import load_evaluation, residual_stats, save_evaluation, serving_metrics
+from feature_spec import STANDARD_SPEC
+from train_model import save_best_model
+
+
+def test_serving_metrics_keep_only_scalars():
+    metrics = {'rmse': np.float64(0.5), 'r2': 0.9, 'n': 10, 'predictions': np.arange(5.0),
+               'cv_scores': [1.0, 2.0], 'name': 'Ridge'}
+    assert serving_metrics(metrics) == {'rmse': 0.5, 'r2': 0.9, 'n': 10.0}
+
+
+def test_residual_stats():
+    stats = residual_stats([1.0, 2.0, 3.0, 4.0], [1.0, 1.0, 4.0, 4.0])
+    assert stats['n'] == 4 and stats['mean'] == 0.0
+    assert stats['mae'] == 0.5 and stats['rmse'] == pytest.approx(np.sqrt(0.5))
+    assert list(stats['quantiles']) == ['q05', 'q25', 'q50', 'q75', 'q95']
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / 'evaluation.npz')
+    y_true = np.random.RandomState(0).rand(100)
+    y_pred = y_true + 0.1
+    stats = save_evaluation(path, y_true, y_pred.astype(np.float32), 'Ridge')
+    data = load_evaluation(path)
+    assert np.array_equal(data['y_true'], y_true)
+    assert np.allclose(data['y_pred'], y_pred) and data['y_pred'].dtype == np.float64
+    assert data['model_name'] == 'Ridge' and data['stats'] == stats
+    assert stats['mean'] == pytest.approx(-0.1)
+
+
+def test_model_artifact_has_no_test_predictions(tmp_path):
+    rng = np.random.RandomState(0)
+    X = rng.rand(60, len(STANDARD_SPEC))
+    y = X.sum(axis=1)
+    X_train, X_test, y_train, y_test = X[:40], X[40:], y[:40], y[40:]
+    model = LinearRegression().fit(X_train, y_train)
+    predictions = model.predict(X_test)
+    results = {'Linear Regression': {'rmse': 0.0, 'mae': 0.0, 'r2': 1.0, 'predictions': predictions}}
+
+    save_best_model({'Linear Regression': model}, results, STANDARD_SPEC.names, 60,
+                    y_test=y_test, directory=str(tmp_path))
+
+    saved = joblib.load(os.path.join(tmp_path, 'popularity_model.pkl'))
+    assert 'predictions' not in saved['metrics']
+    assert all(np.ndim(value) == 0 for value in saved['metrics'].values())
+    evaluation = load_evaluation(os.path.join(tmp_path, 'evaluation.npz'))
+    assert np.allclose(evaluation['y_pred'], predictions) and np.allclose(evaluation['y_true'], y_test)
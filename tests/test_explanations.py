@@ -0,0 +1,58 @@
+"""Объяснения прогнозов (explanations.py) и повторное использование признаков прогноза"""
+
+import numpy as np
+import pytest
+from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
+from sklearn.linear_model import Ridge
+
+import predict_advanced
+from explanations import explain_batch, make_explainer
+
+
+def regression_data(n=300, n_features=6, seed=0):
+    rng = np.random.RandomState(seed)
+    X = rng.randn(n, n_features).astype(np.float32)
+    # Коррелированные признаки и взаимодействие
+    X[:, 1] = X[:, 0] + 0.1 * X[:, 1]
+    y = 2 * X[:, 0] - X[:, 2] + X[:, 3] * X[:, 4] + 0.1 * rng.randn(n)
+    return X, y
+
+
+@pytest.mark.parametrize('model', [
+    GradientBoostingRegressor(n_estimators=30, max_depth=3, random_state=0),
+    GradientBoostingRegressor(n_estimators=10, max_depth=2, init='zero', random_state=0),
+    RandomForestRegressor(n_estimators=10, max_depth=5, random_state=0),
+    Ridge(alpha=1.0)
+])
+def test_bias_plus_contributions_equals_prediction(model):
+    X, y = regression_data()
+    model.fit(X, y)
+    explainer = make_explainer(model, [f'f{i}' for i in range(X.shape[1])])
+    contributions = explainer.contributions(X[:50])
+    assert contributions.shape == (50, X.shape[1])
+    assert np.allclose(explainer.bias + contributions.sum(axis=1), model.predict(X[:50]), atol=1e-4)
+
+
+def test_explain_batch_keeps_top_features_by_magnitude():
+    X, y = regression_data()
+    model = GradientBoostingRegressor(n_estimators=20, random_state=0).fit(X, y)
+    explainer = make_explainer(model, [f'f{i}' for i in range(X.shape[1])])
+    explanation, = explain_batch(explainer, X[:1], top_n=2)
+    values = [abs(c['value']) for c in explanation['contributions']]
+    assert len(values) <= 2 and values == sorted(values, reverse=True)
+
+
+def test_cached_feature_blocks_builds_only_missing_rows(monkeypatch):
+    built = []
+
+    def fake_blocks(inputs, model_data, timer=None):
+        built.append([d['id'] for d in inputs])
+        return [np.array([[float(d['id'])] for d in inputs])]
+
+    monkeypatch.setattr(predict_advanced, 'advanced_feature_blocks', fake_blocks)
+    first, second = {'id': 1}, {'id': 2}
+    feature_rows = {}
+    predict_advanced.remember_feature_rows([first], fake_blocks([first], None), feature_rows)
+    blocks = predict_advanced.cached_feature_blocks([second, first], None, feature_rows)
+    assert built == [[1], [2]]
+    assert blocks[0].ravel().tolist() == [2.0, 1.0]
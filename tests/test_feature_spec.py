@@ -0,0 +1,89 @@
+"""Общая спецификация признаков (feature_spec.py)"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import sparse
+from sklearn.preprocessing import StandardScaler
+
+from feature_spec import (ADVANCED_SPEC, FEATURE_DTYPE, STANDARD_SPEC, FeatureSpec, model_matrix,
+                          parse_feature_dtype, standardize)
+
+SPEC = FeatureSpec('test', [('views', 'number'), ('is_free', 'bool'), ('faces', 'number')])
+
+
+@pytest.mark.parametrize('value', ['float16x', 'int32', 'float16', 'not a dtype'])
+def test_invalid_feature_dtype_is_a_clear_value_error(value):
+    with pytest.raises(ValueError, match='FEATURE_DTYPE'):
+        parse_feature_dtype(value)
+
+
+def test_supported_feature_dtypes():
+    assert parse_feature_dtype('float32') == np.float32
+    assert parse_feature_dtype('float64') == np.float64
+
+
+def test_matrix_converts_in_spec_order_with_defaults():
+    records = [{'faces': 10, 'views': 3, 'is_free': True}, {'views': None, 'is_free': 0}, {}]
+    X = SPEC.matrix(records)
+    assert X.dtype == FEATURE_DTYPE
+    assert X.tolist() == [[3, 1, 10], [0, 0, 0], [0, 0, 0]]
+    assert SPEC.row(records[0]).tolist() == [[3, 1, 10]]
+
+    out = np.full((5, 3), -1.0, dtype=FEATURE_DTYPE)
+    assert SPEC.matrix(records[:2], out=out) is out
+    assert out[:2].tolist() == [[3, 1, 10], [0, 0, 0]] and out[2:].min() == -1
+
+
+def test_frame_matches_matrix_for_the_same_data():
+    records = [{'faces': 10, 'views': 3, 'is_free': True}, {'faces': None, 'views': 1, 'is_free': None}]
+    df = pd.DataFrame(records, columns=['extra', 'faces', 'is_free', 'views'])
+    X = SPEC.frame(df)
+    assert list(X.columns) == SPEC.names
+    assert (X.dtypes == FEATURE_DTYPE).all()
+    assert X.values.tolist() == SPEC.matrix(records).tolist()
+
+
+def test_unknown_feature_kind_is_rejected():
+    with pytest.raises(ValueError, match='Неизвестный тип'):
+        FeatureSpec('bad', [('views', 'string')])
+
+
+def test_spec_round_trip_and_fingerprint():
+    restored = FeatureSpec.from_dict(STANDARD_SPEC.to_dict())
+    assert restored.names == STANDARD_SPEC.names
+    assert restored.fingerprint() == STANDARD_SPEC.fingerprint() != ADVANCED_SPEC.fingerprint()
+    assert STANDARD_SPEC.names[:len(ADVANCED_SPEC)] == ADVANCED_SPEC.names
+
+
+def test_verify_rejects_mismatched_artifacts():
+    SPEC.verify(saved_spec=SPEC.to_dict(), columns=SPEC.names, n_features=3, dtype=FEATURE_DTYPE)
+    reordered = {'name': 'test', 'features': [['faces', 'number'], ['views', 'number'], ['is_free', 'bool']]}
+    with pytest.raises(ValueError, match='отличается от кода'):
+        SPEC.verify(saved_spec=reordered)
+    with pytest.raises(ValueError, match='не совпадают'):
+        SPEC.verify(columns=['views', 'faces'])
+    with pytest.raises(ValueError, match='Ожидается 4 признаков'):
+        SPEC.verify(n_features=4)
+
+
+def test_standardize_matches_scaler():
+    X = np.random.RandomState(0).rand(20, 3).astype(FEATURE_DTYPE)
+    scaler = StandardScaler().fit(X)
+    assert np.allclose(standardize(X.copy(), scaler), scaler.transform(X), atol=1e-6)
+
+
+def test_model_matrix_from_dense_and_sparse_blocks():
+    dense = np.arange(6, dtype=np.float64).reshape(2, 3)
+    block = sparse.csr_matrix(np.array([[0, 1.5], [2.5, 0]]))
+    for blocks in ([dense, block], [dense, block.toarray()]):
+        X = model_matrix(blocks)
+        assert isinstance(X, np.ndarray) and X.dtype == FEATURE_DTYPE
+        assert X.tolist() == [[0, 1, 2, 0, 1.5], [3, 4, 5, 2.5, 0]]
+
+
+def test_verify_rejects_models_trained_with_another_dtype():
+    other = np.float64 if FEATURE_DTYPE == np.float32 else np.float32
+    SPEC.verify(dtype=FEATURE_DTYPE.name)
+    with pytest.raises(ValueError, match=f'FEATURE_DTYPE={np.dtype(other).name}'):
+        SPEC.verify(dtype=np.dtype(other).name)
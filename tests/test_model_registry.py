@@ -0,0 +1,167 @@
+"""Реестр моделей: публикация, переключение версий и кандидаты (model_registry.py)"""
+
+import os
+from unittest import mock
+
+import pytest
+
+import model_registry
+from model_registry import ModelRegistry, RegistryWatcher
+
+
+def write(path, text):
+    path.write_text(text)
+    return str(path)
+
+
+def write_in(directory, filename, text):
+    with open(os.path.join(directory, filename), 'w') as f:
+        f.write(text)
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return ModelRegistry(str(tmp_path / 'registry'))
+
+
+def test_publish_is_content_addressed(registry, tmp_path):
+    model = write(tmp_path / 'model.pkl', 'weights-1')
+    metrics = write(tmp_path / 'metrics.json', '{}')
+
+    version = registry.publish('advanced', [model, metrics, str(tmp_path / 'missing.npz')], {'r2': 0.5})
+    assert registry.current_version('advanced') == version
+    manifest = registry.manifest('advanced', version)
+    assert set(manifest['files']) == {'model.pkl', 'metrics.json'}
+    assert manifest['r2'] == 0.5
+
+    # Те же файлы - та же версия; другие - новая
+    assert registry.publish('advanced', [model, metrics]) == version
+    write(tmp_path / 'model.pkl', 'weights-2')
+    assert registry.publish('advanced', [model, metrics]) != version
+
+
+def test_published_bundle_is_immutable_copy(registry, tmp_path):
+    model = write(tmp_path / 'model.pkl', 'weights-1')
+    registry.publish('standard', [model])
+    write(tmp_path / 'model.pkl', 'overwritten in place')
+
+    directory, _ = registry.resolve('standard')
+    with open(os.path.join(directory, 'model.pkl')) as f:
+        assert f.read() == 'weights-1'
+
+
+def test_failed_publish_leaves_no_partial_bundle(registry, tmp_path):
+    first = registry.publish('advanced', [write(tmp_path / 'a.pkl', 'v1')])
+    with mock.patch.object(model_registry, 'file_sha256', side_effect=OSError('disk error')):
+        with pytest.raises(OSError):
+            registry.publish('advanced', [write(tmp_path / 'a.pkl', 'v2')])
+
+    model_dir = os.path.join(registry.root, 'advanced')
+    assert sorted(os.listdir(model_dir)) == sorted([first, 'CURRENT'])
+    assert registry.current_version('advanced') == first
+
+
+def test_failed_pointer_write_keeps_previous_version(registry, tmp_path):
+    first = registry.publish('advanced', [write(tmp_path / 'a.pkl', 'v1')])
+    second = registry.publish('advanced', [write(tmp_path / 'a.pkl', 'v2')], promote=False)
+    with mock.patch.object(model_registry.os, 'replace', side_effect=OSError('rename failed')):
+        with pytest.raises(OSError):
+            registry.promote('advanced', second)
+
+    assert registry.current_version('advanced') == first
+    # Временный файл указателя удален
+    assert not [e for e in os.listdir(os.path.join(registry.root, 'advanced')) if e.startswith('.tmp-')]
+
+
+def test_promote_unknown_version_fails(registry, tmp_path):
+    registry.publish('advanced', [write(tmp_path / 'a.pkl', 'v1')])
+    with pytest.raises(ValueError):
+        registry.promote('advanced', 'deadbeef')
+
+
+def test_candidate_flow(registry, tmp_path):
+    # Первая версия сразу становится текущей - сравнивать не с чем
+    first = registry.publish('advanced', [write(tmp_path / 'a.pkl', 'v1')], promote=False)
+    assert registry.propose('advanced', first) is False
+    assert registry.current_version('advanced') == first
+
+    second = registry.publish('advanced', [write(tmp_path / 'a.pkl', 'v2')], promote=False)
+    assert registry.propose('advanced', second) is True
+    assert registry.current_version('advanced') == first
+    assert registry.candidate_version('advanced') == second
+
+    registry.promote('advanced', second)
+    assert registry.current_version('advanced') == second
+    assert registry.candidate_version('advanced') is None
+
+
+def test_prune_keeps_current_and_candidate(registry, tmp_path):
+    versions = []
+    for i in range(4):
+        version = registry.publish('advanced', [write(tmp_path / 'a.pkl', f'v{i}')], promote=False)
+        manifest_path = os.path.join(registry.bundle_dir('advanced', version), 'manifest.json')
+        with open(manifest_path) as f:
+            text = f.read()
+        # Порядок создания задается явно: время в манифесте - с точностью до секунды
+        with open(manifest_path, 'w') as f:
+            f.write(text.replace('"created_at": "', f'"created_at": "{i} '))
+        versions.append(version)
+    registry.promote('advanced', versions[0])
+    registry.propose('advanced', versions[1])
+
+    removed = registry.prune('advanced', keep=1)
+    assert set(removed) == {versions[2]}
+    assert {m['version'] for m in registry.versions('advanced')} == {versions[0], versions[1], versions[3]}
+
+
+def test_watcher_reports_pointer_changes(registry, tmp_path):
+    first = registry.publish('advanced', [write(tmp_path / 'a.pkl', 'v1')])
+    watcher = RegistryWatcher(registry, ['advanced', 'standard'])
+    assert watcher.changed() == []
+
+    second = registry.publish('advanced', [write(tmp_path / 'a.pkl', 'v2')])
+    assert second != first
+    assert watcher.changed() == ['advanced']
+    assert watcher.changed() == []
+
+
+def test_run_files_do_not_change_version(registry, tmp_path):
+    model = write(tmp_path / 'model.pkl', 'weights-1')
+    metrics = write(tmp_path / 'metrics.json', '{"training_date": "2026-01-01 10:00:00"}')
+    first = registry.publish('standard', [model, metrics], run_files=('metrics.json',))
+    write(tmp_path / 'metrics.json', '{"training_date": "2026-01-02 11:00:00"}')
+    assert registry.publish('standard', [model, metrics], run_files=('metrics.json',)) == first
+    assert registry.manifest('standard', first)['run_files'] == ['metrics.json']
+
+
+def test_staging_is_published_or_discarded(registry):
+    with pytest.raises(RuntimeError):
+        with registry.staging('advanced') as staging:
+            write_in(staging, 'a.pkl', 'v1')
+            raise RuntimeError('training failed')
+    assert not os.path.exists(staging)
+
+    with registry.staging('advanced') as staging:
+        write_in(staging, 'a.pkl', 'v1')
+        version = registry.publish_staged('advanced', staging)
+    assert not os.path.exists(staging)
+    assert registry.current_version('advanced') == version
+
+
+def test_flat_copies_follow_current_version_only(tmp_path):
+    registry = ModelRegistry(str(tmp_path / 'models' / 'registry'))
+    flat = tmp_path / 'models' / 'a.pkl'
+    with registry.staging('advanced') as staging:
+        write_in(staging, 'a.pkl', 'v1')
+        first = registry.publish_staged('advanced', staging)
+    assert flat.read_text() == 'v1'
+
+    with registry.staging('advanced') as staging:
+        write_in(staging, 'a.pkl', 'v2')
+        second = registry.publish_staged('advanced', staging, promote=False)
+    registry.propose('advanced', second)
+    # Кандидат не затрагивает models/
+    assert flat.read_text() == 'v1'
+    registry.promote('advanced', second)
+    assert flat.read_text() == 'v2'
+    assert first != second
@@ -0,0 +1,66 @@
+"""Конформные интервалы прогноза (prediction_intervals.py)"""
+
+import numpy as np
+import pytest
+
+from prediction_intervals import ConformalIntervals, interval_fields
+
+
+def calibrated(n=2000, coverage=0.8, seed=0, scale=1.0):
+    rng = np.random.RandomState(seed)
+    y_pred = rng.uniform(0, 10, n)
+    y_true = y_pred + rng.normal(0, scale, n)
+    return ConformalIntervals(coverage=coverage).fit(y_true, y_pred), rng
+
+
+@pytest.mark.parametrize('coverage', [0.8, 0.9])
+def test_empirical_coverage_on_new_data(coverage):
+    intervals, rng = calibrated(coverage=coverage)
+    y_pred = rng.uniform(0, 10, 20000)
+    y_true = y_pred + rng.normal(0, 1.0, len(y_pred))
+
+    lower, upper = intervals.interval(y_pred)
+    covered = np.mean((y_true >= lower) & (y_true <= upper))
+    assert covered == pytest.approx(coverage, abs=0.02)
+
+
+def test_offsets_match_normal_quantiles():
+    intervals, _ = calibrated(n=20000, coverage=0.8)
+    # Для N(0, 1) квантили 10% и 90% - примерно -1.28 и 1.28
+    assert intervals.q_low == pytest.approx(-1.2816, abs=0.05)
+    assert intervals.q_high == pytest.approx(1.2816, abs=0.05)
+    assert len(intervals.residuals) == intervals.max_residuals
+    assert intervals.n_calibration == 20000
+
+
+def test_category_confidence():
+    intervals, _ = calibrated(scale=0.5)
+    confidence = intervals.category_confidence([2.0, 4.9, 6.5, 9.5], thresholds=(5, 8))
+    # Далеко от границы категории - почти уверенно, у самой границы - около половины
+    assert confidence[0] > 0.99
+    assert 0.45 < confidence[1] < 0.65
+    assert confidence[2] > 0.9
+    assert confidence[3] > 0.99
+    assert np.all((confidence >= 0) & (confidence <= 1))
+
+
+def test_small_calibration_set_is_conservative():
+    intervals = ConformalIntervals(coverage=0.8).fit([1.0, 2.0, 3.0], [1.5, 2.0, 2.5])
+    # При малой выборке ранги ограничены крайними остатками
+    assert intervals.q_low == -0.5 and intervals.q_high == 0.5
+
+
+def test_empty_calibration_set_fails():
+    with pytest.raises(ValueError):
+        ConformalIntervals().fit([], [])
+
+
+def test_interval_fields():
+    assert interval_fields(None, [1.0], (5, 8)) is None
+    intervals, _ = calibrated()
+    fields = interval_fields(intervals, [3.0, 7.0], (5, 8))
+    assert len(fields) == 2
+    confidence, interval = fields[0]
+    assert 0 <= confidence <= 1
+    assert interval['lower'] < 3.0 < interval['upper']
+    assert interval['coverage'] == 0.8
@@ -0,0 +1,119 @@
+"""Пул процессов прогнозирования (prediction_pool.py)"""
+
+import gc
+import os
+import signal
+import time
+
+import pytest
+
+import prediction_pool
+
+
+def fake_predict_batch(inputs, models, include_timings=False):
+    results = []
+    for input_data in inputs:
+        if input_data.get('crash'):
+            os._exit(1)
+        if input_data.get('hang'):
+            time.sleep(60)
+        results.append({'model': models['name'], 'value': input_data['value']})
+    return results
+
+
+@pytest.fixture
+def fake_models(monkeypatch):
+    # Рабочие процессы создаются fork и наследуют подмененные функции модуля
+    monkeypatch.setattr(prediction_pool, 'warm_up', lambda models: {'duration_ms': 0.0})
+    monkeypatch.setattr(prediction_pool, 'predict_batch', fake_predict_batch)
+
+
+def test_predict_in_workers(fake_models):
+    pool = prediction_pool.PredictionPool({'name': 'a'}, workers=2)
+    try:
+        results = pool.predict([{'value': 1}, {'value': 2}])
+        assert results == [{'model': 'a', 'value': 1}, {'model': 'a', 'value': 2}]
+        assert all(worker['ready'] for worker in pool.snapshot()['workers'])
+    finally:
+        pool.close()
+
+
+def test_closing_old_pool_keeps_new_pool_frozen(fake_models):
+    old = prediction_pool.PredictionPool({'name': 'old'}, workers=1)
+    new = prediction_pool.PredictionPool({'name': 'new'}, workers=1)
+    try:
+        frozen = gc.get_freeze_count()
+        old.close()
+        # Заморозка общая для процесса: закрытие прежнего пула ее не снимает
+        assert gc.get_freeze_count() == frozen > 0
+        assert new.predict([{'value': 3}]) == [{'model': 'new', 'value': 3}]
+        # Прежние модели собираются, текущие снова заморожены
+        assert all(worker.models is None for worker in old.workers)
+        prediction_pool.refreeze()
+        assert gc.get_freeze_count() > 0
+        assert new.predict([{'value': 4}]) == [{'model': 'new', 'value': 4}]
+    finally:
+        new.close()
+
+
+def test_crashed_worker_is_restarted(fake_models):
+    pool = prediction_pool.PredictionPool({'name': 'a'}, workers=1)
+    try:
+        results = pool.predict([{'crash': True, 'value': 0}])
+        assert 'crashed' in results[0]['error']
+        assert pool.predict([{'value': 5}]) == [{'model': 'a', 'value': 5}]
+        assert pool.snapshot()['workers'][0]['restarts'] >= 1
+    finally:
+        pool.close()
+
+
+def test_hung_worker_is_killed_and_restarted(fake_models):
+    pool = prediction_pool.PredictionPool({'name': 'a'}, workers=1, call_timeout=0.5)
+    try:
+        started = time.monotonic()
+        results = pool.predict([{'hang': True, 'value': 0}, {'value': 1}])
+        # Зависший пакет не повторяется: оба запроса получают ошибку за один call_timeout
+        assert time.monotonic() - started < 5
+        assert all('did not answer' in result['error'] for result in results)
+        assert pool.predict([{'value': 5}]) == [{'model': 'a', 'value': 5}]
+        assert pool.snapshot()['workers'][0]['restarts'] == 1
+    finally:
+        pool.close()
+
+
+def test_hung_warm_up_fails_pool_creation(monkeypatch):
+    monkeypatch.setattr(prediction_pool, 'warm_up', lambda models: time.sleep(60))
+    started = time.monotonic()
+    with pytest.raises(RuntimeError, match='not ready'):
+        prediction_pool.PredictionPool({'name': 'a'}, workers=2, ready_timeout=0.5)
+    assert time.monotonic() - started < 10
+
+
+def test_workers_close_registered_parent_fds(fake_models):
+    read_fd, write_fd = os.pipe()
+    prediction_pool.register_parent_fd(write_fd)
+    pool = prediction_pool.PredictionPool({'name': 'a'}, workers=2)
+    try:
+        os.close(write_fd)
+        os.set_blocking(read_fd, False)
+        # Рабочие процессы не держат записывающий конец - чтение видит EOF
+        assert os.read(read_fd, 1) == b''
+    finally:
+        prediction_pool.unregister_parent_fd(write_fd)
+        os.close(read_fd)
+        pool.close()
+
+
+def test_workers_terminate_despite_parent_sigterm_handler(fake_models):
+    previous = signal.signal(signal.SIGTERM, lambda signum, frame: None)
+    try:
+        pool = prediction_pool.PredictionPool({'name': 'a'}, workers=1)
+    finally:
+        signal.signal(signal.SIGTERM, previous)
+    try:
+        process = pool.workers[0].process
+        process.terminate()
+        process.join(3)
+        assert not process.is_alive()
+    finally:
+        pool.close()
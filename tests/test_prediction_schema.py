@@ -0,0 +1,108 @@
+"""Схема запроса прогноза и кодирование JSON (prediction_schema.py)"""
+
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from prediction_schema import RequestError, decode_requests, dumps, loads, parse_request, parse_requests
+
+
+def test_known_fields_are_kept_and_unknown_ignored():
+    request = parse_request({'tags': ['car', 'pbr'], 'face_count': 1200, 'is_downloadable': True,
+                             'unknown': 'x'})
+    assert request == {'tags': ['car', 'pbr'], 'face_count': 1200, 'is_downloadable': True}
+
+
+def test_null_means_absent():
+    # Отсутствующие поля не заполняются: наличие tags/description выбирает модель
+    assert parse_request({'tags': None, 'description': None, 'face_count': 10}) == {'face_count': 10}
+
+
+@pytest.mark.parametrize('request_data, location', [
+    ({'face_count': 'many'}, 'face_count'),
+    ({'face_count': True}, 'face_count'),
+    ({'tags': 'car'}, 'tags'),
+    ({'tags': ['car', 3]}, 'tags[1]'),
+    ({'description': 5}, 'description'),
+    ({'similar_k': 2.5}, 'similar_k'),
+    ({'cascade': 1}, 'cascade'),
+])
+def test_wrong_types_are_rejected(request_data, location):
+    with pytest.raises(RequestError, match=location.replace('[', r'\[').replace(']', r'\]')):
+        parse_request(request_data)
+
+
+@pytest.mark.parametrize('payload', [
+    b'{"face_count": NaN}',
+    b'{"face_count": Infinity}',
+    b'{"latency_budget_ms": 1e400}',
+])
+def test_non_finite_numbers_are_rejected(payload):
+    with pytest.raises(RequestError):
+        decode_requests(payload)
+
+
+def test_bool_flags_accept_integers():
+    assert parse_request({'is_animated': 1, 'has_pbr': 0}) == {'is_animated': 1, 'has_pbr': 0}
+
+
+def test_decode_single_and_batch():
+    inputs, is_batch = decode_requests(b'{"face_count": 10}')
+    assert inputs == [{'face_count': 10}] and not is_batch
+
+    inputs, is_batch = decode_requests(b'[{"face_count": 1}, {"tag_count": 2}]')
+    assert inputs == [{'face_count': 1}, {'tag_count': 2}] and is_batch
+
+
+def test_batch_error_points_to_item():
+    with pytest.raises(RequestError, match=r'\$\[1\]'):
+        decode_requests(b'[{"face_count": 1}, {"face_count": "x"}]')
+
+
+def test_parse_requests_matches_decode_requests():
+    obj = [{'face_count': 1}, {'tags': ['a']}]
+    assert parse_requests(obj) == decode_requests(json.dumps(obj).encode())
+
+
+@pytest.mark.parametrize('payload', [b'{"face_count": ', b'not json', b''])
+def test_invalid_json(payload):
+    with pytest.raises(RequestError, match='invalid JSON'):
+        loads(payload)
+
+
+def test_dumps_handles_numpy_and_round_trips():
+    result = {'score': np.float32(4.5), 'count': np.int64(3), 'values': np.arange(3), 'name': 'модель'}
+    encoded = dumps(result)
+    assert isinstance(encoded, bytes)
+    assert b'\n' not in encoded
+    assert json.loads(encoded) == {'score': 4.5, 'count': 3, 'values': [0, 1, 2], 'name': 'модель'}
+    assert json.loads(dumps(result, pretty=True)) == json.loads(encoded)
+    assert b'\n' in dumps(result, pretty=True)
+
+
+def test_dumps_rejects_unknown_types():
+    with pytest.raises(TypeError):
+        dumps({'value': object()})
+
+
+def test_stdlib_backend_rejects_non_finite_numbers():
+    # Без msgspec и orjson проверку делает Python-код модуля (json принимает NaN)
+    code = (
+        "import sys; sys.modules['msgspec'] = None; sys.modules['orjson'] = None\n"
+        "import prediction_schema as s\n"
+        "assert s.JSON_BACKEND == 'json'\n"
+        "for payload in (b'{\"face_count\": NaN}', b'[{\"face_count\": 1e400}]'):\n"
+        "    try:\n"
+        "        s.decode_requests(payload)\n"
+        "    except s.RequestError:\n"
+        "        continue\n"
+        "    raise SystemExit('accepted ' + payload.decode())\n"
+        "assert s.decode_requests(b'{\"face_count\": 1.5}') == ([{'face_count': 1.5}], False)\n"
+    )
+    scripts = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts')
+    completed = subprocess.run([sys.executable, '-c', code], cwd=scripts, capture_output=True, text=True)
+    assert completed.returncode == 0, completed.stderr + completed.stdout
@@ -0,0 +1,89 @@
+"""Сервер прогнозирования: протокол, пакеты и ограничение what-if (prediction_server.py)"""
+
+import asyncio
+import os
+import threading
+
+import prediction_pool
+import prediction_server
+from prediction_server import PredictionServer, encode_message, read_message
+
+
+def fake_predict_batch(inputs, models, include_timings=False):
+    return [{'popularity_score': float(input_data.get('face_count', 0))} for input_data in inputs]
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_message_framing_round_trip():
+    async def scenario():
+        reader = asyncio.StreamReader()
+        reader.feed_data(encode_message({'op': 'health'}))
+        reader.feed_eof()
+        assert await read_message(reader) == {'op': 'health'}
+        assert await read_message(reader) is None
+    run(scenario())
+
+
+def test_predict_batch_and_invalid_request(monkeypatch):
+    monkeypatch.setattr(prediction_server, 'predict_batch', fake_predict_batch)
+
+    async def scenario():
+        server = PredictionServer({}, batch_wait_ms=1.0)
+        server._ready = True
+        server.batcher.start()
+        try:
+            single = await server._dispatch({'op': 'predict', 'data': {'face_count': 10}})
+            batch = await server._dispatch({'op': 'predict', 'data': [{'face_count': 1}, {'face_count': 2}]})
+            invalid = await server._dispatch({'op': 'predict', 'data': {'face_count': 'many'}})
+        finally:
+            await server.batcher.stop()
+        return single, batch, invalid
+
+    single, batch, invalid = run(scenario())
+    assert single == {'popularity_score': 10.0}
+    assert [r['popularity_score'] for r in batch] == [1.0, 2.0]
+    assert invalid['error'].startswith('invalid request')
+
+
+def test_what_if_over_limit_is_overloaded(monkeypatch):
+    release = threading.Event()
+
+    def slow_what_if(input_data, models, top_k):
+        release.wait(5)
+        return {'best': [], 'top_k': top_k}
+
+    monkeypatch.setattr(prediction_server, 'what_if', slow_what_if)
+
+    async def scenario():
+        server = PredictionServer({}, max_what_if=1)
+        first = asyncio.ensure_future(server.what_if({'face_count': 1000}))
+        await asyncio.sleep(0.05)
+        second = await server.what_if({'face_count': 1000})
+        release.set()
+        return await first, second, server.stats
+
+    first, second, stats = run(scenario())
+    assert first == {'best': [], 'top_k': 5}
+    assert second == {'error': 'overloaded'}
+    assert stats['rejected'] == 1 and stats['what_if'] == 1
+
+
+def test_what_if_validates_top_k():
+    result = run(PredictionServer({}).what_if({'face_count': 1}, top_k=0))
+    assert result['error'].startswith('invalid request')
+
+
+def test_what_if_runs_in_pool_worker(monkeypatch):
+    monkeypatch.setattr(prediction_pool, 'warm_up', lambda models: {'duration_ms': 0.0})
+    monkeypatch.setattr(prediction_pool, 'what_if',
+                        lambda input_data, models, top_k: {'pid': os.getpid(), 'top_k': top_k})
+    pool = prediction_pool.PredictionPool({}, workers=1)
+    try:
+        result = run(PredictionServer({}, pool=pool).what_if({'face_count': 1}, top_k=3))
+    finally:
+        pool.close()
+    assert result['top_k'] == 3
+    assert result['pid'] != os.getpid()
@@ -0,0 +1,53 @@
+"""Профилирование пути прогнозирования (profiling.py)"""
+
+import pstats
+
+from profiling import StageHistograms, StageTimer, env_flag, profile_call, stage
+
+
+def test_timer_accumulates_repeated_stages_and_feeds_histograms():
+    histograms = StageHistograms()
+    timer = StageTimer(histograms)
+    for _ in range(3):
+        with timer.stage('features'):
+            pass
+    with stage(timer, 'model_predict'):
+        pass
+    with stage(None, 'ignored'):
+        pass
+
+    assert set(timer.durations) == {'features', 'model_predict'}
+    assert all(value >= 0 for value in timer.as_ms().values())
+    assert '_count{stage="features"} 3' in histograms.render_prometheus()
+
+
+def test_histogram_buckets_are_cumulative():
+    histograms = StageHistograms(buckets=(0.01, 0.1), metric='m')
+    for seconds in (0.005, 0.01, 0.05, 2.0):
+        histograms.observe('predict', seconds)
+    lines = histograms.render_prometheus().splitlines()
+    assert lines[:2] == ['# HELP m Duration of prediction path stages.', '# TYPE m histogram']
+    assert lines[2:] == [
+        'm_bucket{stage="predict",le="0.01"} 2',
+        'm_bucket{stage="predict",le="0.1"} 3',
+        'm_bucket{stage="predict",le="+Inf"} 4',
+        'm_sum{stage="predict"} 2.065000',
+        'm_count{stage="predict"} 4'
+    ]
+
+
+def test_env_flag(monkeypatch):
+    for value, expected in (('1', True), (' Yes ', True), ('on', True), ('0', False), ('', False)):
+        monkeypatch.setenv('PREDICT_PROFILE', value)
+        assert env_flag('PREDICT_PROFILE') is expected
+
+
+def test_profile_call_dumps_cprofile_stats(tmp_path, monkeypatch):
+    monkeypatch.delenv('PREDICT_PROFILER', raising=False)
+    path = tmp_path / 'profile.pstats'
+
+    def work(n, offset=0):
+        return sum(range(n)) + offset
+
+    assert profile_call(work, str(path), 100, offset=1) == 4951
+    assert any(name == 'work' for _, _, name in pstats.Stats(str(path)).stats)
@@ -0,0 +1,34 @@
+"""Оценка тегов в рейтинге качества (quality_rating.py)"""
+
+import random
+
+from quality_rating import QualityRater
+
+
+def reference_matching(rater, tags, category):
+    """Прежняя проверка: рекомендованный тег входит в тег как подстрока"""
+    cat_key = next((key for key in rater.recommended_tags if key in category.lower()), 'prop')
+    return sum(1 for tag in tags if any(rec in tag.lower() for rec in rater.recommended_tags[cat_key]))
+
+
+def test_recommended_tags_match_as_substrings():
+    rater = QualityRater()
+    # 'supercar' и 'transportation-design' засчитываются как вхождения 'car' и 'transportation'
+    only_relevance = rater._rate_tags(['supercar', 'transportation-design'], 'vehicle')
+    assert only_relevance == 20
+    assert rater._rate_tags(['tree', 'rock'], 'vehicle') == 0
+    # Неизвестная категория - рекомендованные теги 'prop'
+    assert rater._rate_tags(['props', 'tree'], 'unknown') == 10
+
+
+def test_pattern_matches_reference_loop():
+    rater = QualityRater()
+    rng = random.Random(0)
+    pieces = [tag for tags in rater.recommended_tags.values() for tag in tags] + ['x', 'super', '-', 'tree']
+    for _ in range(500):
+        tags = [''.join(rng.choice(pieces) for _ in range(rng.randint(1, 3))) for _ in range(rng.randint(1, 6))]
+        category = rng.choice(list(rater.recommended_tags) + ['generic', 'Game Assets'])
+        expected = reference_matching(rater, tags, category)
+        cat_key = next((key for key in rater.recommended_tags if key in category.lower()), 'prop')
+        pattern = rater.recommended_tag_patterns[cat_key]
+        assert sum(1 for tag in tags if pattern.search(tag.lower())) == expected
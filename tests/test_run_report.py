@@ -0,0 +1,68 @@
+"""Отчет о запуске обучения (run_report.py)"""
+
+import json
+import tracemalloc
+
+import pytest
+
+from run_report import RunReport, report_stage
+
+
+def test_stage_records_time_rows_and_memory():
+    tracing = tracemalloc.is_tracing()
+    report = RunReport('test', trace_memory=True)
+    try:
+        with report.stage('load') as extra:
+            data = [0] * 200000
+            extra['rows'] = len(data)
+        with report.stage('fit', rows=10):
+            pass
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+
+    load, fit = report.stages
+    assert load['stage'] == 'load' and load['rows'] == 200000
+    assert load['wall_seconds'] >= 0 and load['rows_per_second'] > 0
+    assert load['python_peak_mb'] >= 1.0
+    assert fit['rows'] == 10 and 'python_peak_mb' in fit
+    assert load['peak_rss_growth_mb'] >= 0 and load['process_peak_rss_mb'] > 0
+
+
+def test_failed_stage_is_still_recorded():
+    report = RunReport('test', trace_memory=False)
+    with pytest.raises(RuntimeError):
+        with report.stage('broken'):
+            raise RuntimeError('boom')
+    assert [stage['stage'] for stage in report.stages] == ['broken']
+    assert 'python_peak_mb' not in report.stages[0] and 'rows' not in report.stages[0]
+
+
+def test_report_stage_without_report_measures_nothing():
+    with report_stage(None, 'noop', rows=5) as extra:
+        extra['rows'] = 7
+
+
+def test_write_report_and_history(tmp_path):
+    artifact = tmp_path / 'model.pkl'
+    artifact.write_bytes(b'x' * 123)
+    report = RunReport('advanced', trace_memory=False)
+    with report.stage('fit'):
+        pass
+    report.add_artifact(str(artifact))
+    report.add_artifact(str(tmp_path / 'missing.pkl'))
+    report.set('train_rows', 100)
+    report.set('dedup', {'kept_records': 90})
+
+    history = tmp_path / 'history.jsonl'
+    report.write(str(tmp_path / 'report.json'), str(history))
+    report.write(str(tmp_path / 'report.json'), str(history))
+
+    saved = json.loads((tmp_path / 'report.json').read_text())
+    assert saved['artifacts_bytes'] == {str(artifact): 123}
+    assert saved['info']['dedup'] == {'kept_records': 90}
+    lines = [json.loads(line) for line in history.read_text().splitlines()]
+    assert len(lines) == 2
+    # В историю попадают только скалярные поля info
+    assert lines[0]['train_rows'] == 100 and 'dedup' not in lines[0]
+    assert lines[0]['artifacts_bytes'] == 123 and set(lines[0]['stages']) == {'fit'}
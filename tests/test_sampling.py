@@ -0,0 +1,55 @@
+"""Стратифицированная выборка каталога (sampling.py)"""
+
+import json
+import random
+from collections import Counter
+
+from sampling import StratifiedReservoir, count_strata, record_stratum, sample_records
+
+
+def catalog(n=5000, n_categories=500, seed=0):
+    rng = random.Random(seed)
+    return [
+        {'uid': f'uid{i}', 'categories': [f'cat{rng.randrange(n_categories)}'],
+         'viewCount': rng.randrange(0, 100000), 'likeCount': rng.randrange(0, 5000),
+         'downloadCount': rng.randrange(0, 1000), 'faceCount': rng.randrange(100, 100000)}
+        for i in range(n)
+    ]
+
+
+def test_memory_is_bounded_by_limit_not_strata():
+    records = catalog()
+    counts = count_strata(records)
+    assert len(counts) > 100
+    sampler = StratifiedReservoir(50, counts)
+    peak = 0
+    for record in records:
+        sampler.add(record)
+        peak = max(peak, sum(len(reservoir) for reservoir in sampler.reservoirs.values()))
+    assert peak <= 50 and sampler.retained == 50
+    assert len(sampler.sample()) == 50
+
+
+def test_sample_is_proportional_ordered_and_reproducible(tmp_path):
+    records = catalog(n=3000, n_categories=3)
+    path = tmp_path / 'raw_models.json'
+    path.write_text(json.dumps(records))
+    sample, summary = sample_records(str(path), 300, seed=7)
+    assert summary['sampled'] == 300 and summary['seen'] == 3000
+    # Порядок исходного файла
+    positions = [int(record['uid'][3:]) for record in sample]
+    assert positions == sorted(positions)
+    # Доли слоев совпадают с каталогом с точностью до округления
+    full = Counter(record_stratum(record) for record in records)
+    sampled = Counter(record_stratum(record) for record in sample)
+    for key, count in full.items():
+        assert abs(sampled[key] - 300 * count / 3000) < 1
+    assert sample_records(str(path), 300, seed=7)[0] == sample
+
+
+def test_small_catalog_is_taken_whole(tmp_path):
+    records = catalog(n=20)
+    path = tmp_path / 'raw_models.json'
+    path.write_text(json.dumps(records))
+    sample, _ = sample_records(str(path), 100)
+    assert sample == records
@@ -0,0 +1,99 @@
+"""Пересчет каталога с контрольными точками (score_catalog.py)"""
+
+import json
+import os
+
+import pytest
+
+import score_catalog
+
+
+class Killed(BaseException):
+    """Имитация остановки процесса посреди запуска"""
+
+
+def fake_predict_batch(inputs, models, include_timings=False):
+    return [
+        {'popularity_score': float(input_data['face_count']), 'popularity_category': 'medium',
+         'model_used': 'advanced', 'confidence': 0.5}
+        for input_data in inputs
+    ]
+
+
+@pytest.fixture
+def catalog(tmp_path, monkeypatch):
+    monkeypatch.setattr(score_catalog, 'load_models', lambda: {'standard': None, 'advanced': object(), 'student': None})
+    monkeypatch.setattr(score_catalog, 'registry_versions', lambda models: {'advanced': 'v1'})
+    monkeypatch.setattr(score_catalog, 'predict_batch', fake_predict_batch)
+    path = tmp_path / 'raw_models.json'
+    path.write_text(json.dumps([{'uid': f'uid{i}', 'name': f'model {i}', 'faceCount': i} for i in range(25)]))
+    return str(path)
+
+
+def kill_after(monkeypatch, n_chunks):
+    calls = []
+
+    def predict(inputs, models, include_timings=False):
+        if len(calls) == n_chunks:
+            raise Killed()
+        calls.append(len(inputs))
+        return fake_predict_batch(inputs, models)
+
+    monkeypatch.setattr(score_catalog, 'predict_batch', predict)
+
+
+def read_rows(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    assert b'\0' not in data
+    return [json.loads(line) for line in data.decode('utf-8').splitlines()]
+
+
+def test_killed_run_resumes_where_it_stopped(catalog, tmp_path, monkeypatch):
+    output = str(tmp_path / 'scores.jsonl')
+    kill_after(monkeypatch, 2)
+    with pytest.raises(Killed):
+        score_catalog.score_catalog(catalog, output, chunk_size=10, workers=1)
+    assert score_catalog.load_checkpoint(output + '.checkpoint.json')['records_done'] == 20
+
+    monkeypatch.setattr(score_catalog, 'predict_batch', fake_predict_batch)
+    state = score_catalog.score_catalog(catalog, output, chunk_size=10, workers=1)
+    assert state['finished'] and state['records_done'] == 25
+    assert [row['uid'] for row in read_rows(output)] == [f'uid{i}' for i in range(25)]
+
+
+def test_missing_output_restarts_from_first_record(catalog, tmp_path, monkeypatch):
+    output = str(tmp_path / 'scores.jsonl')
+    kill_after(monkeypatch, 1)
+    with pytest.raises(Killed):
+        score_catalog.score_catalog(catalog, output, chunk_size=10, workers=1)
+    os.remove(output)
+
+    monkeypatch.setattr(score_catalog, 'predict_batch', fake_predict_batch)
+    state = score_catalog.score_catalog(catalog, output, chunk_size=10, workers=1)
+    assert state['records_done'] == 25
+    assert [row['uid'] for row in read_rows(output)] == [f'uid{i}' for i in range(25)]
+
+
+def test_failed_parquet_conversion_is_retried(catalog, tmp_path, monkeypatch):
+    pytest.importorskip('pyarrow')
+    output = str(tmp_path / 'scores.parquet')
+
+    def failing(jsonl_path, parquet_path):
+        raise MemoryError()
+
+    monkeypatch.setattr(score_catalog, 'jsonl_to_parquet', failing)
+    with pytest.raises(MemoryError):
+        score_catalog.score_catalog(catalog, output, chunk_size=10, workers=1)
+    assert not score_catalog.load_checkpoint(output + '.checkpoint.json')['finished']
+
+    converted = []
+
+    def convert(jsonl_path, parquet_path):
+        converted.append(len(read_rows(jsonl_path)))
+        open(parquet_path, 'wb').close()
+
+    monkeypatch.setattr(score_catalog, 'jsonl_to_parquet', convert)
+    state = score_catalog.score_catalog(catalog, output, chunk_size=10, workers=1)
+    assert state['finished'] and converted == [25]
+    assert os.path.exists(output) and not os.path.exists(output + '.jsonl')
@@ -0,0 +1,101 @@
+"""Проверка кандидата перед переключением (shadow.py)"""
+
+import pytest
+
+import shadow
+from shadow import PROMOTION_GATE, ShadowEvaluator
+
+
+class Registry:
+    def __init__(self):
+        self.promoted = []
+
+    def promote(self, name, version):
+        self.promoted.append((name, version))
+
+
+@pytest.fixture
+def evaluator():
+    evaluator = ShadowEvaluator({}, {'advanced': 'v2'}, sample_rate=1.0, seed=0)
+    yield evaluator
+    evaluator.close()
+
+
+def fill(evaluator, n, delta=0.1, mismatches=0, primary_ms=1.0, candidate_ms=1.0):
+    for i in range(n):
+        evaluator.deltas.append(delta)
+        evaluator.category_match.append(i >= mismatches)
+    for role, ms in (('primary', primary_ms), ('candidate', candidate_ms)):
+        evaluator.latency[role]['total'].append(ms)
+        evaluator.latency[role]['compute'].append(ms)
+
+
+def test_gate_requires_min_samples(evaluator):
+    fill(evaluator, PROMOTION_GATE['min_samples'] - 1)
+    decision = evaluator.gate()
+    assert not decision['promote']
+    assert len(decision['reasons']) == 1 and 'недостаточно сравнений' in decision['reasons'][0]
+
+    fill(evaluator, 1)
+    assert evaluator.gate()['promote']
+
+
+@pytest.mark.parametrize('candidate_ms, promote', [(1.10, True), (1.11, False)])
+def test_gate_latency_ratio(evaluator, candidate_ms, promote):
+    fill(evaluator, 200, primary_ms=1.0, candidate_ms=candidate_ms)
+    decision = evaluator.gate()
+    assert decision['report']['latency_ratio'] == candidate_ms
+    assert decision['promote'] is promote
+    assert promote or 'кандидат медленнее' in decision['reasons'][0]
+
+
+@pytest.mark.parametrize('delta, promote', [(0.5, True), (-0.5, True), (0.51, False), (-0.51, False)])
+def test_gate_mean_abs_delta(evaluator, delta, promote):
+    fill(evaluator, 200, delta=delta)
+    decision = evaluator.gate()
+    assert decision['promote'] is promote
+    assert promote or 'прогнозы расходятся' in decision['reasons'][0]
+
+
+@pytest.mark.parametrize('mismatches, promote', [(20, True), (21, False)])
+def test_gate_category_mismatch(evaluator, mismatches, promote):
+    fill(evaluator, 200, mismatches=mismatches)
+    decision = evaluator.gate()
+    assert decision['report']['category_mismatch'] == mismatches / 200
+    assert decision['promote'] is promote
+
+
+def test_gate_thresholds_can_be_overridden(evaluator):
+    fill(evaluator, 50, delta=0.8)
+    assert not evaluator.gate()['promote']
+    assert evaluator.gate({'min_samples': 50, 'max_mean_abs_delta': 1.0})['promote']
+
+
+def test_promote_switches_registry_only_when_gate_passes(evaluator):
+    registry = Registry()
+    fill(evaluator, 10)
+    decision = evaluator.promote(registry)
+    assert decision['promoted'] == {} and registry.promoted == []
+
+    decision = evaluator.promote(registry, force=True)
+    assert decision['promoted'] == {'advanced': 'v2'} and registry.promoted == [('advanced', 'v2')]
+
+
+def test_compare_collects_deltas_and_category_matches(evaluator, monkeypatch):
+    scores = {
+        'primary': [(1.0, 'advanced'), (5.0, 'advanced'), (None, None)],
+        'candidate': [(1.2, 'advanced'), (8.0, 'advanced'), (3.0, 'advanced')]
+    }
+    primary_models = object()
+    monkeypatch.setattr(
+        shadow, 'predict_scores',
+        lambda inputs, models, timer: scores['primary' if models is primary_models else 'candidate']
+    )
+    evaluator._compare([{}, {}, {}], primary_models)
+    report = evaluator.snapshot()
+    # Ответ без прогноза (None) не сравнивается
+    assert report['samples'] == 2
+    assert report['delta']['mean'] == pytest.approx(1.6)
+    # 5.0 -> medium, 8.0 -> high
+    assert report['category_mismatch'] == 0.5
+    assert report['stats']['batches'] == 1 and report['stats']['sampled'] == 3
@@ -0,0 +1,108 @@
+"""Индекс похожих моделей (similarity_index.py)"""
+
+import pickle
+
+import numpy as np
+from scipy import sparse
+
+import similarity_index
+from similarity_index import SimilarityIndex, index_features
+
+
+def catalog(n=3000, seed=0):
+    rng = np.random.RandomState(seed)
+    blocks = [
+        rng.randn(n, 9),
+        sparse.random(n, 100, density=0.05, format='csr', random_state=seed + 1),
+        sparse.random(n, 300, density=0.01, format='csr', random_state=seed + 2)
+    ]
+    metadata = {
+        'uid': np.array([f'uid{i}' for i in range(n)], dtype=object),
+        'view_count': np.arange(n, dtype=np.int64),
+        'popularity_score': rng.uniform(0, 10, n)
+    }
+    return blocks, metadata
+
+
+def test_sparse_blocks_stay_sparse_and_match_dense():
+    blocks, _ = catalog()
+    X_sparse = index_features(blocks)
+    X_dense = index_features([b.toarray() if sparse.issparse(b) else b for b in blocks])
+    assert sparse.isspmatrix_csr(X_sparse) and X_sparse.dtype == np.float32
+    assert np.abs(X_sparse.toarray() - X_dense).max() < 1e-6
+    assert np.allclose(np.asarray(X_sparse.multiply(X_sparse).sum(axis=1)).ravel(), 1.0, atol=1e-5)
+
+
+def test_catalog_model_finds_itself_first():
+    blocks, metadata = catalog()
+    X = index_features(blocks)
+    index = SimilarityIndex().fit(X, metadata)
+
+    rows = [0, 17, 2999]
+    results = index.query_batch(X[rows].toarray(), k=5)
+    for row, found in zip(rows, results):
+        assert found[0]['uid'] == f'uid{row}'
+        assert found[0]['similarity'] == 1.0
+        assert found[0]['view_count'] == row
+        assert isinstance(found[0]['view_count'], int)
+        assert len(found) == 5
+        assert [item['similarity'] for item in found] == sorted((item['similarity'] for item in found), reverse=True)
+
+
+def test_sparse_queries_match_dense_queries():
+    blocks, metadata = catalog()
+    X = index_features(blocks)
+    index = SimilarityIndex().fit(X, metadata)
+
+    rows = [5, 123, 2500]
+    assert index.query_batch(X[rows], k=3) == index.query_batch(X[rows].toarray(), k=3)
+    assert index.query_batch(X[rows], k=3)[0][0]['uid'] == 'uid5'
+    assert SimilarityIndex().query_batch(X[rows]) == [[], [], []]
+
+
+def test_query_accepts_a_sparse_row():
+    blocks, metadata = catalog()
+    X = index_features(blocks)
+    index = SimilarityIndex().fit(X, metadata)
+
+    assert index.query(X[42], k=3) == index.query(X[42].toarray().ravel(), k=3)
+    assert index.query(X[42], k=3)[0]['uid'] == 'uid42'
+
+def test_codes_are_uint32_and_do_not_depend_on_chunking(monkeypatch):
+    blocks, metadata = catalog(n=1000)
+    X = index_features(blocks)
+    index = SimilarityIndex(n_tables=4).fit(X, metadata)
+    codes = index._hash(X)
+    assert codes.dtype == np.uint32 and codes.shape == (4, 1000)
+
+    monkeypatch.setattr(similarity_index, 'HASH_CHUNK_ROWS', 7)
+    assert np.array_equal(index._hash(X), codes)
+    # Тот же код, что и при одном проходе по всем битам сразу
+    expected = ((X @ index.planes[0]) > 0) @ (1 << np.arange(index.n_bits))
+    assert np.array_equal(codes[0], expected)
+
+
+def test_list_metadata_and_pickle_round_trip():
+    blocks, metadata = catalog(n=500)
+    X = index_features(blocks)
+    rows = [{'uid': uid, 'view_count': int(views)} for uid, views in zip(metadata['uid'], metadata['view_count'])]
+    index = pickle.loads(pickle.dumps(SimilarityIndex().fit(X, rows)))
+    assert len(index) == 500
+    assert index.query(X[3].toarray(), k=1)[0]['uid'] == 'uid3'
+
+
+def test_pickle_with_list_metadata_loads_as_columns():
+    blocks, metadata = catalog(n=500)
+    X = index_features(blocks)
+    index = SimilarityIndex().fit(X, metadata)
+    # Индекс, сохраненный до перехода на колонки
+    index.metadata = [{'uid': uid, 'view_count': int(views)}
+                      for uid, views in zip(metadata['uid'], metadata['view_count'])]
+    loaded = pickle.loads(pickle.dumps(index))
+    assert isinstance(loaded.metadata, dict)
+    assert loaded.query(X[3].toarray(), k=1)[0]['uid'] == 'uid3'
+    assert loaded.query(X[3].toarray(), k=1)[0]['view_count'] == 3
+
+
+def test_empty_index():
+    assert SimilarityIndex().query_batch(np.zeros((2, 5)), k=3) == [[], []]
@@ -0,0 +1,68 @@
+"""Кеш обработки текста (text_cache.py)"""
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+import text_cache
+from text_cache import BoundedCache, _ENTRY_OVERHEAD, tfidf_fit_transform, tfidf_transform
+
+
+def test_least_recently_used_entries_are_evicted_by_bytes():
+    cache = BoundedCache(max_bytes=3 * (100 + _ENTRY_OVERHEAD))
+    for key in 'abc':
+        cache.put(key, key.upper(), 100)
+    assert cache.get('a') == 'A'
+    cache.put('d', 'D', 100)
+
+    assert cache.get('b') is None
+    assert [cache.get(key) for key in 'acd'] == ['A', 'C', 'D']
+    assert cache.bytes == 3 * (100 + _ENTRY_OVERHEAD) and len(cache) == 3
+    assert cache.stats()['evictions'] == 1
+
+
+def test_replacing_a_key_does_not_double_count_and_large_values_are_skipped():
+    cache = BoundedCache(max_bytes=1000)
+    cache.put('a', 1, 100)
+    cache.put('a', 2, 50)
+    assert cache.get('a') == 2 and cache.bytes == 50 + _ENTRY_OVERHEAD
+    cache.put('big', 3, 1000)
+    assert cache.get('big') is None and len(cache) == 1
+
+
+def test_hit_stats():
+    cache = BoundedCache(max_bytes=1000)
+    assert cache.stats()['hit_rate'] is None
+    cache.put('a', 1, 10)
+    for key in ('a', 'a', 'a', 'missing'):
+        cache.get(key)
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['hit_rate']) == (3, 1, 0.75)
+
+
+def test_cached_tfidf_rows_match_transform():
+    train = ['red sports car', 'blue car model', 'old wooden house', 'red house roof', 'sports car wheel']
+    tfidf = TfidfVectorizer()
+    X_train = tfidf_fit_transform(tfidf, train)
+    assert np.allclose(X_train.toarray(), tfidf.transform(train).toarray())
+
+    texts = ['red sports car', 'new blue house', 'new blue house', 'unknown words only', '']
+    cache = text_cache._row_cache(tfidf)
+    hits, misses = cache.hits, cache.misses
+    X = tfidf_transform(tfidf, texts)
+    assert np.allclose(X.toarray(), tfidf.transform(texts).toarray())
+    # Обучающий текст уже в кеше; повтор внутри пакета векторизуется один раз
+    assert cache.hits - hits == 1 and cache.misses - misses == 4
+    assert len(cache) == len(train) + 3
+
+    X_again = tfidf_transform(tfidf, texts)
+    assert np.allclose(X_again.toarray(), X.toarray())
+    assert cache.hits - hits == 1 + len(texts)
+
+
+def test_clean_text_is_cached():
+    text = 'Unique  DESCRIPTION for the clean_text cache test!'
+    cleaned = text_cache.clean_text(text)
+    hits = text_cache._CLEAN_CACHE.hits
+    assert text_cache.clean_text(text) == cleaned
+    assert text_cache._CLEAN_CACHE.hits == hits + 1
+    assert text_cache.clean_text('') == ''
@@ -0,0 +1,111 @@
+"""Обучение стандартной модели по частям (train_model.train_out_of_core)"""
+
+import json
+import os
+
+import numpy as np
+import pytest
+
+from model_registry import ModelRegistry
+from train_model import HOLDOUT_FRACTION, ReservoirHoldout, iter_feature_chunks, main_out_of_core, train_out_of_core
+
+
+def write_dataset(path, n_rows, seed=0):
+    rng = np.random.RandomState(seed)
+    records = []
+    for i in range(n_rows):
+        faces = int(rng.randint(100, 100000))
+        records.append({
+            'model_uid': f'uid{i:05d}',
+            'category_count': int(rng.randint(0, 4)),
+            'tag_count': int(rng.randint(0, 20)),
+            'description_length': int(rng.randint(0, 2000)),
+            'face_count': faces,
+            'vertex_count': faces // 2,
+            'animation_count': int(rng.randint(0, 3)),
+            'is_downloadable': bool(rng.randint(0, 2)),
+            'is_premium_author': bool(rng.randint(0, 2)),
+            'author_followers': int(rng.randint(0, 5000)),
+            'days_since_published': int(rng.randint(0, 1000)),
+            'popularity_score': float(rng.uniform(0, 10))
+        })
+    path.write_text(json.dumps(records))
+    return str(path)
+
+
+def test_small_dataset_caps_holdout_and_trains(tmp_path):
+    # Строк меньше holdout_size по умолчанию: тест не должен забирать все строки
+    filename = write_dataset(tmp_path / 'data.json', 300)
+    models, results, _, _, total_rows, holdout = train_out_of_core(
+        filename, chunk_size=64, epochs=1, holdout_size=10000
+    )
+    assert total_rows == 300
+    assert len(holdout.y) == int(300 * HOLDOUT_FRACTION)
+    (name, model), = models.items()
+    assert hasattr(model, 'coef_')
+    assert np.isfinite(results[name]['rmse'])
+
+
+def test_holdout_rows_are_unique_and_from_dataset(tmp_path):
+    filename = write_dataset(tmp_path / 'data.json', 200)
+    _, _, _, _, _, holdout = train_out_of_core(filename, chunk_size=50, epochs=1, holdout_size=30)
+    assert len(holdout.indices) == 30
+    assert len(set(holdout.indices.tolist())) == 30
+    assert holdout.indices.min() >= 0 and holdout.indices.max() < 200
+
+
+def test_too_few_rows_fail_with_clear_error(tmp_path):
+    filename = write_dataset(tmp_path / 'data.json', 3)
+    with pytest.raises(ValueError, match='Нет строк для теста'):
+        train_out_of_core(filename, chunk_size=64, epochs=1)
+
+
+def test_reservoir_finalize_shrinks_to_uniform_subset():
+    holdout = ReservoirHoldout(50, 1)
+    holdout.add(np.arange(40, dtype=float).reshape(-1, 1), np.arange(40, dtype=float))
+    indices = holdout.finalize(max_size=10)
+    assert len(indices) == 10 and len(holdout.y) == 10
+    # Строки выборки остаются согласованными со своими номерами
+    assert np.array_equal(holdout.X[:, 0], holdout.indices.astype(float))
+    assert np.array_equal(holdout.y, holdout.indices.astype(float))
+
+
+def test_scaler_does_not_see_holdout_rows(tmp_path):
+    filename = write_dataset(tmp_path / 'data.json', 200)
+    _, _, scaler, _, _, holdout = train_out_of_core(filename, chunk_size=50, epochs=1, holdout_size=30)
+    assert scaler.n_samples_seen_ == 170
+    X = np.vstack([X_chunk.values for X_chunk, _, _ in iter_feature_chunks(filename, 50)]).astype(np.float64)
+    train_mask = ~np.isin(np.arange(200), holdout.indices)
+    assert np.allclose(scaler.mean_, X[train_mask].mean(axis=0), rtol=1e-5)
+
+
+def test_candidate_run_does_not_touch_flat_models(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'data').mkdir()
+    (tmp_path / 'models').mkdir()
+    write_dataset(tmp_path / 'data' / 'preprocessed_data.json', 200, seed=0)
+    main_out_of_core(chunk_size=50, epochs=1, holdout_size=30)
+    registry = ModelRegistry()
+    first = registry.current_version('standard')
+    flat = (tmp_path / 'models' / 'popularity_model.pkl').read_bytes()
+    assert flat == (tmp_path / 'models' / 'registry' / 'standard' / first / 'popularity_model.pkl').read_bytes()
+
+    write_dataset(tmp_path / 'data' / 'preprocessed_data.json', 200, seed=1)
+    main_out_of_core(chunk_size=50, epochs=1, holdout_size=30, candidate=True)
+    assert registry.current_version('standard') == first
+    assert registry.candidate_version('standard') not in (None, first)
+    assert (tmp_path / 'models' / 'popularity_model.pkl').read_bytes() == flat
+    assert not [e for e in os.listdir(tmp_path / 'models' / 'registry' / 'standard') if e.startswith('.staging-')]
+
+
+def test_same_model_gets_same_version(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'data').mkdir()
+    (tmp_path / 'models').mkdir()
+    write_dataset(tmp_path / 'data' / 'preprocessed_data.json', 200)
+    main_out_of_core(chunk_size=50, epochs=1, holdout_size=30)
+    first = ModelRegistry().current_version('standard')
+    # Метрики второго запуска содержат другую дату обучения
+    main_out_of_core(chunk_size=50, epochs=1, holdout_size=30)
+    assert ModelRegistry().current_version('standard') == first
+    assert len(ModelRegistry().versions('standard')) == 1
@@ -0,0 +1,56 @@
+"""Прогрев процесса прогнозирования (warmup.py)"""
+
+import warmup
+from warmup import warm_up, warmup_requests
+
+
+def fake_predict_batch(calls):
+    def predict_batch(requests, models, include_timings=True):
+        calls.append(len(requests))
+        results = []
+        for request in requests:
+            if request.get('latency_budget_ms') == 0:
+                results.append({'model_used': 'student'})
+            elif 'tags' in request:
+                results.append({'model_used': 'advanced'})
+            else:
+                results.append({'error': 'no standard model'})
+        return results
+    return predict_batch
+
+
+def test_requests_cover_loaded_models():
+    assert warmup_requests({'standard': None, 'advanced': None}) == []
+    requests = warmup_requests({'standard': {'model': 1}, 'advanced': {'model': 1}, 'student': {'model': 1}})
+    text, student, standard = requests
+    assert text['explain'] and text['similar_k'] > 0
+    assert student['latency_budget_ms'] == 0 and not student['explain']
+    assert 'tags' not in standard and 'description' not in standard
+    assert [len(r) for r in warmup_requests({'advanced': {'model': 1}})] == [len(text)]
+
+
+def test_warm_up_runs_single_and_batched_rounds(monkeypatch):
+    calls = []
+    monkeypatch.setattr(warmup, 'predict_batch', fake_predict_batch(calls))
+    report = warm_up({'standard': {'model': 1}, 'advanced': {'model': 1}, 'student': {'model': 1}}, rounds=2)
+    # По одному запросу и одним пакетом в каждом раунде
+    assert calls == [1, 1, 1, 3] * 2
+    assert report['requests'] == 3 and report['rounds'] == 2
+    assert report['paths'] == ['advanced', 'student']
+    assert report['errors'] == 4
+    assert report['first_round_ms'] >= 0 and report['duration_ms'] >= report['last_round_ms']
+
+
+def test_warm_up_failure_does_not_raise(monkeypatch, capsys):
+    def failing(requests, models, include_timings=True):
+        raise RuntimeError('model broken')
+    monkeypatch.setattr(warmup, 'predict_batch', failing)
+    report = warm_up({'advanced': {'model': 1}}, rounds=1)
+    assert report['errors'] == 1 and report['paths'] == []
+    assert 'warm-up failed: model broken' in capsys.readouterr().err
+
+
+def test_warm_up_without_models():
+    report = warm_up({'standard': None, 'advanced': None})
+    assert report == {'requests': 0, 'rounds': 2, 'paths': [], 'errors': 0,
+                      'duration_ms': 0.0, 'first_round_ms': None, 'last_round_ms': None}
@@ -0,0 +1,87 @@
+"""Что если: ранжирование изменений по приросту прогноза (what_if.py)"""
+
+import pytest
+
+import what_if
+from what_if import MIN_GAIN, grid_axes
+
+
+def popularity(variant):
+    """Ступенчатый прогноз, как у деревьев: длина описания влияет меньше MIN_GAIN"""
+    score = 2.0
+    score += 1.0 if variant['is_downloadable'] else 0.0
+    score += 0.8 if variant['face_count'] >= 5000 else 0.0
+    score += 0.5 if variant['tag_count'] >= 10 else 0.0
+    score += MIN_GAIN / 2 if variant['description_length'] >= 500 else 0.0
+    return score
+
+
+@pytest.fixture
+def batches(monkeypatch):
+    batches = []
+
+    def predict_scores(variants, models, timer=None):
+        batches.append(variants)
+        return [(popularity(variant), 'advanced') for variant in variants]
+
+    monkeypatch.setattr(what_if, 'predict_scores', predict_scores)
+    return batches
+
+
+REQUEST = {'tags': ['car'], 'description': 'red car', 'face_count': 1000, 'tag_count': 3,
+           'description_length': 50, 'is_downloadable': False, 'explain': True, 'latency_budget_ms': 1}
+
+
+def test_current_values_are_part_of_the_grid():
+    axes = dict((feature, (values, current)) for feature, values, current in grid_axes(REQUEST))
+    values, current = axes['face_count']
+    assert values[current] == 1000 and values == sorted(values)
+    values, current = axes['is_downloadable']
+    assert values == [False, True] and current == 0
+
+
+def test_all_variants_are_one_batch_without_response_options(batches):
+    result = what_if.what_if(REQUEST, {}, top_k=5)
+    assert len(batches) == 1 and len(batches[0]) == result['variants'] == 7 * 6 * 6 * 2
+    assert all(variant['cascade'] is False for variant in batches[0])
+    assert not any(key in variant for variant in batches[0] for key in ('explain', 'latency_budget_ms'))
+    assert result['base']['popularity_score'] == 2.0
+
+
+def test_best_combinations_ranked_by_gain_with_smallest_changes(batches):
+    best = what_if.what_if(REQUEST, {}, top_k=3)['best']
+    assert [option['gain'] for option in best] == [2.3, 1.8, 1.5]
+    # Из равных по прогнозу ячеек - наименьшее изменение, без изменений с приростом < MIN_GAIN
+    assert best[0]['changes'] == {
+        'face_count': {'from': 1000, 'to': 5000},
+        'tag_count': {'from': 3, 'to': 10},
+        'is_downloadable': {'from': False, 'to': True}
+    }
+    assert set(best[1]['changes']) == {'face_count', 'is_downloadable'}
+    assert set(best[2]['changes']) == {'tag_count', 'is_downloadable'}
+    assert all('description_length' not in option['changes'] for option in best)
+    assert best[0]['popularity_category'] == 'low'
+
+
+def test_by_feature_shows_best_single_change(batches, monkeypatch):
+    # Одинаковый рейтинг качества: из равных по приросту значений - ближайшее к текущему
+    monkeypatch.setattr(what_if, 'calculate_quality', lambda input_data: {'total_score': 5.0})
+    by_feature = what_if.what_if(REQUEST, {}, top_k=3)['by_feature']
+    assert [(option['feature'], option['to'], option['gain']) for option in by_feature[:3]] == [
+        ('is_downloadable', True, 1.0), ('face_count', 5000, 0.8), ('tag_count', 10, 0.5)
+    ]
+    assert by_feature[3]['feature'] == 'description_length' and by_feature[3]['gain'] == MIN_GAIN / 2
+
+
+def test_nothing_to_improve(batches, monkeypatch):
+    monkeypatch.setattr(what_if, 'predict_scores',
+                        lambda variants, models, timer=None: [(5.0, 'standard')] * len(variants))
+    result = what_if.what_if(REQUEST, {})
+    assert result['best'] == [] and result['model_used'] == 'standard'
+    assert {flag['feature'] for flag in result['quality_flags']} == set(what_if.QUALITY_FLAGS)
+
+
+def test_no_models(monkeypatch):
+    monkeypatch.setattr(what_if, 'predict_scores',
+                        lambda variants, models, timer=None: [(None, None)] * len(variants))
+    assert what_if.what_if(REQUEST, {}) == {'error': 'No models available'}